@@ -236,6 +236,82 @@ const getOverviewStats = async (filters = {}) => {
   return stats;
 };
 
+/**
+ * Fetch pre-aggregated monthly statistics maintained by scripts/stats_aggregates.py
+ * Rows are keyed by (year, month, branch, batch) of the rebate start date
+ */
+const fetchMonthlyStatsAggregates = async (filters = {}) => {
+  const { year, branch, batch } = filters;
+  
+  let query = `
+    SELECT year, month, branch, batch,
+           rebate_count AS totalRebates,
+           total_days AS totalDays,
+           distinct_students AS uniqueStudents
+    FROM rebate_stats_monthly
+    WHERE 1=1
+  `;
+  
+  const params = [];
+  
+  // Apply filters
+  if (year) {
+    query += ` AND year = ?`;
+    params.push(year);
+  }
+  
+  if (branch) {
+    query += ` AND branch = ?`;
+    params.push(branch);
+  }
+  
+  if (batch) {
+    query += ` AND batch = ?`;
+    params.push(batch);
+  }
+  
+  query += ` ORDER BY year, month, branch, batch`;
+  
+  return await executeQuery(query, params);
+};
+
+/**
+ * Check whether rebate_stats_changes holds entries stats_aggregates.py has not applied yet
+ * Applied entries are deleted, so any matching row means the summary is behind for these filters
+ */
+const hasPendingStatsChanges = async (filters = {}) => {
+  const { year, branch, batch } = filters;
+  
+  let query = `
+    SELECT 1
+    FROM rebate_stats_changes
+    WHERE 1=1
+  `;
+  
+  const params = [];
+  
+  // Apply filters
+  if (year) {
+    query += ` AND year = ?`;
+    params.push(year);
+  }
+  
+  if (branch) {
+    query += ` AND branch = ?`;
+    params.push(branch);
+  }
+  
+  if (batch) {
+    query += ` AND batch = ?`;
+    params.push(batch);
+  }
+  
+  query += ` LIMIT 1`;
+  
+  const result = await executeQuery(query, params);
+  return result.length > 0;
+};
+
 /**
  * Fetch rebates for a specific student
  */
@@ -651,6 +727,8 @@ export {
   fetchFilteredRebates,
   fetchAllFilteredRebates,
   getOverviewStats,
+  fetchMonthlyStatsAggregates,
+  hasPendingStatsChanges,
   fetchStudentRebates,
   getRebateById,
   updateRebate,
@@ -0,0 +1,170 @@
+import csv
+import glob
+import gzip
+import io
+import os
+import zlib
+from datetime import date, datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet archives are optional; gzip CSV always works
+    pa = pq = None
+
+from bulk_loader import bulk_insert
+
+# Archived rows live next to the imported data files
+ARCHIVE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "archives"))
+
+FORMATS = ("csv", "parquet")
+
+
+def archive_path(name, format="csv"):
+    extension = ".parquet" if format == "parquet" else ".csv.gz"
+    return os.path.join(ARCHIVE_DIR, f"{name}{extension}")
+
+
+def archive_format(path):
+    return "parquet" if path.endswith(".parquet") else "csv"
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+class ArchiveWriter:
+    """Append rows to a gzip CSV or Parquet archive one chunk at a time.
+
+    Every write_rows() call is flushed before it returns, so a chunk is on
+    disk before the caller deletes it from the database. The format follows
+    the file extension (.csv.gz or .parquet). A Parquet file is unreadable
+    until its footer is written on close, so a .parquet archive is a
+    directory with one complete part file per chunk instead. Writing to an
+    existing archive adds to it in both formats, so a resumed purge never
+    loses the chunks it archived before.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = tuple(columns)
+        self.format = archive_format(path)
+        self.rows = 0
+        self._handle = None
+        self._gzip = None
+        self._writer = None
+        self._schema = None
+        self._parts = 0
+        if self.format == "parquet" and pq is None:
+            raise RuntimeError("Parquet archives need pyarrow; use a .csv.gz path instead")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        if self.format == "parquet":
+            self._write_parquet(rows)
+        else:
+            self._write_csv(rows)
+        self.rows += len(rows)
+
+    def _write_csv(self, rows):
+        if self._handle is None:
+            resumed = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+            # Appending adds a gzip member, so a resumed purge keeps the chunks archived before
+            self._gzip = gzip.open(self.path, "ab")
+            self._handle = io.TextIOWrapper(self._gzip, encoding="utf-8", newline="")
+            self._writer = csv.writer(self._handle)
+            if not resumed:
+                self._writer.writerow(self.columns)
+        self._writer.writerows([_csv_value(value) for value in row] for row in rows)
+        self._handle.flush()
+        # Sync flush ends the deflate block so everything written so far can be read back
+        self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        os.fsync(self._gzip.fileobj.fileno())
+
+    def _write_parquet(self, rows):
+        table = pa.table({
+            column: [row[i] for row in rows] for i, column in enumerate(self.columns)
+        })
+        if self._schema is None:
+            # Columns that are all NULL in the first chunk are stored as strings
+            self._schema = pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ])
+            os.makedirs(self.path, exist_ok=True)
+            # Continue the numbering when an interrupted run is resumed into the same archive
+            self._parts = len(_parquet_parts(self.path))
+        part = os.path.join(self.path, f"part-{self._parts:05d}.parquet")
+        # Readers skip dot files, so a part only appears once it is complete
+        partial = os.path.join(self.path, f".part-{self._parts:05d}.parquet.tmp")
+        pq.write_table(table.cast(self._schema), partial)
+        with open(partial, "rb") as handle:
+            os.fsync(handle.fileno())
+        os.replace(partial, part)
+        self._parts += 1
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+        self._writer = self._handle = self._gzip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _parquet_parts(path):
+    return sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+
+
+def read_archive(path, chunk_size=10000):
+    """Return (columns, chunks) for an archive; chunks yields lists of row tuples"""
+    if archive_format(path) == "parquet":
+        if pq is None:
+            raise RuntimeError("Reading Parquet archives needs pyarrow")
+        # Archives written before the part-per-chunk layout are single files
+        parts = _parquet_parts(path) if os.path.isdir(path) else [path]
+        if not parts:
+            raise ValueError(f"{path} holds no archived chunks")
+        columns = tuple(pq.ParquetFile(parts[0]).schema_arrow.names)
+
+        def parquet_chunks():
+            for part in parts:
+                for batch in pq.ParquetFile(part).iter_batches(batch_size=chunk_size):
+                    yield list(zip(*(batch.column(i).to_pylist() for i in range(batch.num_columns))))
+
+        return columns, parquet_chunks()
+
+    handle = gzip.open(path, "rt", encoding="utf-8", newline="")
+    reader = csv.reader(handle)
+    columns = tuple(next(reader))
+
+    def csv_chunks():
+        with handle:
+            chunk = []
+            for row in reader:
+                # Empty fields were NULLs when archived
+                chunk.append(tuple(value if value != "" else None for value in row))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    return columns, csv_chunks()
+
+
+def restore_archive(conn, table, path, chunk_size=1000):
+    """Insert archived rows back into table, skipping rows that already exist"""
+    columns, chunks = read_archive(path)
+    rows = (row for chunk in chunks for row in chunk)
+    return bulk_insert(conn, table, columns, rows, chunk_size=chunk_size, mode="ignore")
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from bulk_loader import REBATE_COLUMNS, build_insert_query
+from db import get_async_pool
+from interval_index import RebateIntervalIndex
+
+async def _validate(candidates, accepted, accepted_index, stats):
+    """Check candidates against rows accepted earlier in this run"""
+    while True:
+        row = await candidates.get()
+        if row is None:
+            return
+        stats['checked'] += 1
+        if accepted_index.add_if_free(*row[:3]):
+            stats['accepted'] += 1
+            await accepted.put(row)
+        else:
+            stats['rejected'] += 1
+
+
+async def _write(pool, accepted, chunk_size, stats):
+    """Insert accepted rows in multi-row INSERT IGNORE chunks, one transaction each"""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            chunk = []
+            done = False
+            while not done:
+                row = await accepted.get()
+                if row is None:
+                    done = True
+                else:
+                    chunk.append(row)
+                if chunk and (done or len(chunk) >= chunk_size):
+                    await conn.begin()
+                    try:
+                        await cursor.execute(
+                            build_insert_query("rebates", REBATE_COLUMNS, len(chunk), "ignore"),
+                            [value for row in chunk for value in row]
+                        )
+                        await conn.commit()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+                    stats['inserted'] += cursor.rowcount
+                    stats['duplicates'] += len(chunk) - cursor.rowcount
+                    stats['chunks'] += 1
+                    chunk = []
+
+
+async def validate_and_insert(rows, writers=1, chunk_size=1000, queue_size=None):
+    """Validate (roll_no, start_date, end_date, rebate_days) rows and insert the ones that fit.
+
+    Meant for an empty table (e.g. right after a TRUNCATE): the only rows a
+    candidate can clash with are the ones accepted in this run, so overlap
+    checks run against the in-memory interval index while the writers insert
+    accepted rows in chunks on their own connections. Both queues are
+    bounded, so the producer stops pulling rows when the database falls
+    behind. At most queue_size candidates, 2 * chunk_size queued accepted
+    rows and one chunk per writer are held in memory. Returns a stats dict.
+    """
+    started = time.perf_counter()
+    candidates = asyncio.Queue(maxsize=queue_size or 4)
+    accepted = asyncio.Queue(maxsize=chunk_size * 2)
+    accepted_index = RebateIntervalIndex()
+    stats = {'checked': 0, 'accepted': 0, 'rejected': 0, 'inserted': 0, 'duplicates': 0, 'chunks': 0}
+
+    pool = await get_async_pool(writers)
+
+    async def produce():
+        for row in rows:
+            await candidates.put(row)
+        await candidates.put(None)
+
+    async def validate_all():
+        await _validate(candidates, accepted, accepted_index, stats)
+        for _ in range(writers):
+            await accepted.put(None)
+
+    tasks = [asyncio.ensure_future(produce()), asyncio.ensure_future(validate_all())]
+    tasks += [asyncio.ensure_future(_write(pool, accepted, chunk_size, stats)) for _ in range(writers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # A failed stage would leave the others waiting on their queues
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        pool.close()
+        await pool.wait_closed()
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def run_validate_and_insert(rows, **options):
+    return asyncio.run(validate_and_insert(rows, **options))
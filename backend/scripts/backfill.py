@@ -0,0 +1,96 @@
+import time
+from datetime import datetime
+
+from checkpoint import checkpoint_path, clear_checkpoint, load_checkpoint, save_checkpoint
+from db import get_db_connection
+
+MIN_CHUNK_SIZE = 10
+
+
+def _key_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def fetch_page(cursor, where, params, columns, last_key, limit):
+    """Fetch the next page of rebates after last_key, ordered by (roll_no, start_date)"""
+    query = f"SELECT roll_no, start_date{''.join(', ' + column for column in columns)} FROM rebates WHERE ({where})"
+    page_params = list(params)
+    if last_key is not None:
+        # Expanded row comparison so both MySQL and SQLite use the primary key range
+        query += " AND (roll_no > %s OR (roll_no = %s AND start_date > %s))"
+        page_params += [last_key[0], last_key[0], last_key[1]]
+    query += " ORDER BY roll_no, start_date LIMIT %s"
+    cursor.execute(query, page_params + [limit])
+    return cursor.fetchall()
+
+
+def run_backfill(name, process_chunk, where="1=1", params=(), columns=(), chunk_size=1000,
+                 sleep_seconds=0.0, max_chunk_seconds=None, checkpoint_file=None, restart=False):
+    """Run a resumable migration over rebates in primary key order.
+
+    Rows matching `where` are read with keyset pagination on
+    (roll_no, start_date) and passed to process_chunk(conn, rows), where each
+    row is (roll_no, start_date, *columns). The connection is committed after
+    every chunk and the last key is saved to a checkpoint, so an interrupted
+    run picks up where it stopped.
+
+    sleep_seconds pauses between chunks to give other sessions the table. If
+    a chunk takes longer than max_chunk_seconds the chunk size is halved, and
+    it grows back while chunks stay well under the limit, which bounds how
+    long each transaction holds row locks.
+    """
+    checkpoint_file = checkpoint_file or checkpoint_path(f"backfill_{name}")
+    if restart:
+        clear_checkpoint(checkpoint_file)
+    state = load_checkpoint(checkpoint_file) or {
+        'name': name,
+        'last_key': None,
+        'rows': 0,
+        'chunks': 0,
+        'started_at': datetime.now().isoformat(timespec="seconds")
+    }
+    if state['last_key'] is not None:
+        print(f"[{name}] Resuming after key {tuple(state['last_key'])} ({state['rows']} rows done)")
+
+    target_chunk_size = chunk_size
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        while True:
+            chunk_started = time.perf_counter()
+            rows = fetch_page(cursor, where, params, columns, state['last_key'], chunk_size)
+            if not rows:
+                break
+
+            try:
+                process_chunk(conn, rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"[{name}] Chunk failed; progress up to {state['last_key']} is saved, run again to resume")
+                raise
+
+            state['last_key'] = [rows[-1][0], _key_value(rows[-1][1])]
+            state['rows'] += len(rows)
+            state['chunks'] += 1
+            state['updated_at'] = datetime.now().isoformat(timespec="seconds")
+            save_checkpoint(checkpoint_file, state)
+
+            elapsed = time.perf_counter() - chunk_started
+            print(f"[{name}] chunk {state['chunks']}: {len(rows)} rows in {elapsed:.2f}s ({state['rows']} total)")
+
+            if max_chunk_seconds:
+                if elapsed > max_chunk_seconds:
+                    chunk_size = max(MIN_CHUNK_SIZE, chunk_size // 2)
+                elif elapsed < max_chunk_seconds / 2:
+                    chunk_size = min(target_chunk_size, chunk_size * 2)
+
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+    finally:
+        cursor.close()
+        conn.close()
+
+    clear_checkpoint(checkpoint_file)
+    print(f"[{name}] Backfill complete: {state['rows']} rows in {state['chunks']} chunks")
+    return state
@@ -0,0 +1,179 @@
+import numpy as np
+
+from date_utils import EPOCH, epoch_days_to_dates
+
+# Shifts each student's days into its own range so cumulative max/min
+# operations over the flat arrays never leak across students
+_GROUP_STRIDE = np.int64(1) << 32
+
+
+def _shift(values, owners):
+    return values + owners * _GROUP_STRIDE
+
+
+def _group_previous_max(shifted):
+    # Largest value strictly before each position (in shifted space)
+    running = np.maximum.accumulate(shifted)
+    previous = np.empty_like(running)
+    previous[0] = np.iinfo(np.int64).min
+    previous[1:] = running[:-1]
+    return previous
+
+
+def _group_next_min(shifted, present):
+    # Smallest value at or after each position, among positions where present is True
+    masked = np.where(present, shifted, np.iinfo(np.int64).max)
+    return np.minimum.accumulate(masked[::-1])[::-1]
+
+
+def generate_batched_entries(targets, window_starts, window_ends, max_duration,
+                             rng=None, existing=None, clip_to_window=True, oversample=3):
+    """Generate non-overlapping rebate periods for many students at once.
+
+    targets, window_starts and window_ends are per-student arrays; windows
+    are epoch days and start dates are drawn from [start, end - 1).
+    existing is an optional (owners, starts, ends) tuple of periods that
+    candidates must not overlap. Candidates that overlap an existing period
+    are dropped, then each student's remaining candidates are accepted
+    greedily against the ones already accepted, earliest end first, which
+    fits as many as possible. All students advance together, one accepted
+    period per step, so there is no per-row Python loop.
+
+    Returns a dict of int arrays: student (index into targets), start_day,
+    end_day and rebate_days, sorted by student and start_day.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    targets = np.asarray(targets, dtype=np.int64)
+    window_starts = np.asarray(window_starts, dtype=np.int64)
+    window_ends = np.asarray(window_ends, dtype=np.int64)
+
+    # Draw every candidate for every student in one go
+    owners = np.repeat(np.arange(len(targets), dtype=np.int64), targets * oversample)
+    spans = np.maximum(window_ends - 1 - window_starts, 1)
+    starts = window_starts[owners] + (rng.random(len(owners)) * spans[owners]).astype(np.int64)
+    ends = starts + rng.integers(1, max_duration + 1, size=len(owners))
+    if clip_to_window:
+        ends = np.minimum(ends, window_ends[owners])
+    priority = rng.random(len(owners))
+
+    if existing is not None:
+        ex_owners, ex_starts, ex_ends = (np.asarray(a, dtype=np.int64) for a in existing)
+    else:
+        ex_owners = ex_starts = ex_ends = np.empty(0, dtype=np.int64)
+
+    all_owners = np.concatenate([ex_owners, owners])
+    all_starts = np.concatenate([ex_starts, starts])
+    all_ends = np.concatenate([ex_ends, ends])
+    is_candidate = np.concatenate([np.zeros(len(ex_owners), bool), np.ones(len(owners), bool)])
+    all_priority = np.concatenate([np.zeros(len(ex_owners)), priority])
+    if len(all_owners) == 0:
+        return _empty_result()
+
+    # Existing periods sort ahead of candidates that start on the same day
+    order = np.lexsort((is_candidate, all_starts, all_owners))
+    all_owners = all_owners[order]
+    all_starts = all_starts[order]
+    all_ends = all_ends[order]
+    is_candidate = is_candidate[order]
+    all_priority = all_priority[order]
+
+    shifted_starts = _shift(all_starts, all_owners)
+    shifted_ends = _shift(all_ends, all_owners)
+    existing_ends = np.where(is_candidate, np.iinfo(np.int64).min, shifted_ends)
+    overlaps_earlier_existing = shifted_starts <= _group_previous_max(existing_ends)
+    overlaps_later_existing = shifted_ends >= _group_next_min(shifted_starts, ~is_candidate)
+    free = np.flatnonzero(is_candidate & ~overlaps_earlier_existing & ~overlaps_later_existing)
+
+    accepted = free[_accept_greedily(all_owners[free], shifted_starts[free], shifted_ends[free])]
+
+    acc_owners = all_owners[accepted]
+    acc_starts = all_starts[accepted]
+    acc_ends = all_ends[accepted]
+
+    # Keep a random subset of up to `target` accepted periods per student
+    pick_order = np.lexsort((all_priority[accepted], acc_owners))
+    sorted_owners = acc_owners[pick_order]
+    group_first = np.searchsorted(sorted_owners, sorted_owners, side="left")
+    rank = np.arange(len(sorted_owners)) - group_first
+    keep = pick_order[rank < targets[sorted_owners]]
+    keep.sort()
+
+    start_day = acc_starts[keep]
+    end_day = acc_ends[keep]
+    return {
+        'student': acc_owners[keep],
+        'start_day': start_day,
+        'end_day': end_day,
+        'rebate_days': end_day - start_day + 1,
+    }
+
+
+def _accept_greedily(owners, shifted_starts, shifted_ends):
+    """Mask of the candidates kept by earliest-end-first interval scheduling, per student.
+
+    Candidates are sorted by student and start. Each step keeps, for every
+    student at once, the candidate that ends first among those starting
+    after the last kept one ends, which keeps as many as fit.
+    """
+    kept = np.zeros(len(owners), dtype=bool)
+    if not len(owners):
+        return kept
+    positions = np.arange(len(owners))
+    # Earliest end among candidates at or after each position (shifting keeps students apart)
+    suffix_min = np.minimum.accumulate(shifted_ends[::-1])[::-1]
+    # ... and the candidate holding it: the nearest position at or after where a new minimum starts
+    holds_min = np.where(shifted_ends == suffix_min, positions, len(owners))
+    earliest_end = np.minimum.accumulate(holds_min[::-1])[::-1]
+
+    def first_ending(after, student):
+        # Candidate of `student` ending first among those starting at or after `after`
+        found = np.full(len(after), -1)
+        in_range = after < len(owners)
+        candidates = earliest_end[after[in_range]]
+        found[in_range] = np.where(owners[candidates] == student[in_range], candidates, -1)
+        return found
+
+    heads = np.flatnonzero(np.concatenate([[True], owners[1:] != owners[:-1]]))
+    current = first_ending(heads, owners[heads])
+    current = current[current >= 0]
+    while len(current):
+        kept[current] = True
+        current = first_ending(np.searchsorted(shifted_starts, shifted_ends[current], side="right"), owners[current])
+        current = current[current >= 0]
+    return kept
+
+
+def _empty_result():
+    empty = np.empty(0, dtype=np.int64)
+    return {'student': empty, 'start_day': empty, 'end_day': empty, 'rebate_days': empty}
+
+
+def existing_periods(index, roll_nos):
+    """Flatten a RebateIntervalIndex into (owners, starts, ends) epoch-day arrays"""
+    owners, starts, ends = [], [], []
+    for position, roll_no in enumerate(roll_nos):
+        for start, end in index.periods(roll_no):
+            owners.append(position)
+            starts.append(start)
+            ends.append(end)
+    # The index stores date ordinals; shift them to epoch days
+    offset = -EPOCH.toordinal()
+    return (
+        np.asarray(owners, dtype=np.int64),
+        np.asarray(starts, dtype=np.int64) + offset,
+        np.asarray(ends, dtype=np.int64) + offset,
+    )
+
+
+def iter_entry_rows(entries, roll_nos, chunk_size=100000):
+    """Yield (roll_no, start_date, end_date, rebate_days) tuples ready for insert"""
+    roll_nos = np.asarray(roll_nos, dtype=object)
+    total = len(entries['student'])
+    for offset in range(0, total, chunk_size):
+        chunk = slice(offset, offset + chunk_size)
+        yield from zip(
+            roll_nos[entries['student'][chunk]].tolist(),
+            epoch_days_to_dates(entries['start_day'][chunk]),
+            epoch_days_to_dates(entries['end_day'][chunk]),
+            entries['rebate_days'][chunk].tolist(),
+        )
@@ -0,0 +1,266 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+import db
+from batched_generation import generate_batched_entries, iter_entry_rows
+from bulk_loader import REBATE_COLUMNS, bulk_insert
+from check_overlapping_rebates import find_overlap_chains
+from date_utils import to_epoch_day
+from new_row import backfill_gate_passes
+from remove_future_entries import purge_in_chunks
+from students import CSV_COLUMNS, import_rosters
+
+# name -> (students, rebates)
+SCALES = {
+    "1k": (1000, 10000),
+    "5k": (5000, 100000),
+    "10k": (10000, 500000),
+    "20k": (20000, 2000000),
+}
+
+BRANCHES = ("CSE", "ECE", "EE", "ME", "CHE", "PE")
+BATCHES = (2021, 2022, 2023, 2024)
+
+# Rebates are spread over this window; everything after the cutoff is purged
+WINDOW_START = date(2022, 1, 1)
+WINDOW_END = date(2025, 12, 31)
+PURGE_CUTOFF = date(2025, 8, 31)
+
+BENCHMARK_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "benchmarks"))
+DEFAULT_SQLITE_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "benchmark.sqlite3")
+)
+
+# Query shapes issued by backend/repositories/rebateRepository.js
+REPOSITORY_QUERIES = {
+    "filtered_list": ("""
+    SELECT r.roll_no, s.name, s.branch, s.batch,
+           r.start_date, r.end_date, r.rebate_days, r.gate_pass_no
+    FROM rebates r
+    JOIN students s ON r.roll_no = s.roll_no
+    WHERE 1=1 AND YEAR(r.start_date) = %s AND s.branch = %s AND s.batch = %s
+    ORDER BY r.start_date DESC
+    """, (2024, "CSE", 2023)),
+    "overview_stats": ("""
+    SELECT
+      COUNT(*) as totalRebates,
+      SUM(r.rebate_days) as totalDays,
+      COUNT(DISTINCT r.roll_no) as uniqueStudents
+    FROM rebates r
+    JOIN students s ON r.roll_no = s.roll_no
+    WHERE 1=1 AND YEAR(r.start_date) = %s
+    """, (2024,)),
+    "month_fetch": ("""
+    SELECT r.roll_no, s.name, s.branch, s.batch,
+           r.start_date,
+           DATE_FORMAT(r.start_date, '%Y-%m-%d') AS start_date_str,
+           r.end_date,
+           DATE_FORMAT(r.end_date, '%Y-%m-%d') AS end_date_str,
+           r.rebate_days, r.gate_pass_no
+    FROM rebates r
+    JOIN students s ON r.roll_no = s.roll_no
+    WHERE YEAR(r.start_date) = %s AND MONTH(r.start_date) = %s
+    ORDER BY r.start_date DESC
+    """, (2024, 3)),
+}
+
+
+@contextlib.contextmanager
+def quiet():
+    # Stage output would drown the timings at the larger scales
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class StageTimer:
+    """Collects wall-clock seconds and row counts per stage"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = {'rows': None}
+        started = time.perf_counter()
+        yield record
+        seconds = time.perf_counter() - started
+        record['seconds'] = round(seconds, 4)
+        if record['rows'] is not None and seconds > 0:
+            record['rows_per_sec'] = round(record['rows'] / seconds, 1)
+        self.stages[name] = record
+        print(f"  {name:<20} {seconds:8.3f}s" + (f"  {record['rows']} rows" if record['rows'] is not None else ""))
+
+
+def reset_database():
+    """Start every scale from empty tables"""
+    if db.is_sqlite():
+        path = os.environ["SQLITE_PATH"]
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM rebates")
+    cursor.execute("DELETE FROM students")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def write_rosters(directory, student_count, files=4):
+    """Write synthetic roster CSVs split across several files"""
+    roll_nos = [f"{BATCHES[i % len(BATCHES)]}{i:05d}" for i in range(student_count)]
+    frame = pd.DataFrame({
+        "Roll No": roll_nos,
+        "Name": [f"Student {i}" for i in range(student_count)],
+        "Phone Number": [f"9{i:09d}" for i in range(student_count)],
+        "Email": [f"{roll_no.lower()}@example.edu" for roll_no in roll_nos],
+        "Branch": [BRANCHES[i % len(BRANCHES)] for i in range(student_count)],
+        "Batch": [BATCHES[i % len(BATCHES)] for i in range(student_count)],
+    })[list(CSV_COLUMNS)]
+    paths = []
+    for i, part in enumerate(np.array_split(np.arange(student_count), files)):
+        path = os.path.join(directory, f"roster_{i}.csv")
+        frame.iloc[part].to_csv(path, index=False)
+        paths.append(path)
+    return roll_nos, paths
+
+
+def seed_database(student_count, rebate_count, seed, workers, work_dir, timer):
+    """Empty the database and load a synthetic scale, timing each stage on timer"""
+    reset_database()
+    rng = np.random.default_rng(seed)
+
+    roll_nos, paths = write_rosters(work_dir, student_count)
+    with timer.stage("roster_import") as record, quiet():
+        conn = db.get_db_connection()
+        report = import_rosters(conn, paths, workers=workers)
+        conn.close()
+        record['rows'] = report['added']
+
+    with timer.stage("generation") as record:
+        targets = np.full(student_count, rebate_count // student_count, dtype=np.int64)
+        targets[:rebate_count % student_count] += 1
+        entries = generate_batched_entries(
+            targets,
+            np.full(student_count, to_epoch_day(WINDOW_START)),
+            np.full(student_count, to_epoch_day(WINDOW_END)),
+            max_duration=10,
+            rng=rng
+        )
+        record['rows'] = len(entries['student'])
+
+    with timer.stage("bulk_insert") as record, quiet():
+        conn = db.get_db_connection()
+        load = bulk_insert(conn, "rebates", REBATE_COLUMNS, iter_entry_rows(entries, roll_nos), chunk_size=1000)
+        conn.close()
+        record['rows'] = load['inserted']
+
+
+def run_scale(name, student_count, rebate_count, seed, workers, work_dir):
+    print(f"\nScale {name}: {student_count} students, {rebate_count} rebates")
+    timer = StageTimer()
+    seed_database(student_count, rebate_count, seed, workers, work_dir, timer)
+
+    with timer.stage("overlap_detection") as record:
+        record['rows'] = len(find_overlap_chains())
+
+    for query_name, (query, params) in REPOSITORY_QUERIES.items():
+        with timer.stage(f"query_{query_name}") as record:
+            conn = db.get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            record['rows'] = len(cursor.fetchall())
+            cursor.close()
+            conn.close()
+
+    with timer.stage("gate_pass_backfill") as record, quiet():
+        conn = db.get_db_connection()
+        cursor = conn.cursor()
+        state = backfill_gate_passes(
+            cursor, chunk_size=5000, checkpoint_file=os.path.join(work_dir, "backfill.json"), restart=True
+        )
+        cursor.close()
+        conn.close()
+        record['rows'] = state['rows']
+
+    with timer.stage("purge") as record, quiet():
+        record['rows'] = purge_in_chunks(
+            PURGE_CUTOFF.isoformat(), 5000, 0.0, os.path.join(work_dir, "purge.csv.gz"),
+            checkpoint_file=os.path.join(work_dir, "purge.json"), restart=True
+        )
+
+    return {'students': student_count, 'rebates': rebate_count, 'stages': timer.stages}
+
+
+def compare(results, baseline_path):
+    """Print per-stage time ratios against an earlier results file"""
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    print(f"\nCompared with {baseline_path} (ratio > 1 is slower):")
+    for scale, result in results['scales'].items():
+        previous = baseline['scales'].get(scale)
+        if previous is None:
+            continue
+        for stage, record in result['stages'].items():
+            before = previous['stages'].get(stage, {}).get('seconds')
+            if before:
+                ratio = record['seconds'] / before
+                # Ignore jitter on stages that only take milliseconds
+                flag = "  <-- regression" if ratio > 1.2 and record['seconds'] - before > 0.05 else ""
+                print(f"  {scale:<4} {stage:<20} {before:8.3f}s -> {record['seconds']:8.3f}s  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the scripts and repository queries at fixed data scales")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["1k"], help="Scales to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for the roster import")
+    parser.add_argument("--output", help="Results file (default: backend/data/benchmarks/benchmark_<time>.json)")
+    parser.add_argument("--compare", metavar="RESULTS", help="Earlier results file to compare against")
+    parser.add_argument("--allow-mysql", action="store_true",
+                        help="Run against the configured MySQL database; it is emptied for every scale")
+    args = parser.parse_args()
+
+    if db.is_sqlite():
+        os.environ["SQLITE_PATH"] = os.getenv("BENCHMARK_SQLITE_PATH") or DEFAULT_SQLITE_PATH
+    elif not args.allow_mysql:
+        parser.error("the benchmark deletes every student and rebate; use DB_BACKEND=sqlite "
+                     "or point DB_NAME at a scratch database and pass --allow-mysql")
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec="seconds"),
+        'backend': db.BACKEND,
+        'python': platform.python_version(),
+        'seed': args.seed,
+        'scales': {}
+    }
+    for name in args.scales:
+        student_count, rebate_count = SCALES[name]
+        with tempfile.TemporaryDirectory() as work_dir:
+            results['scales'][name] = run_scale(name, student_count, rebate_count, args.seed, args.workers, work_dir)
+
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import calendar
+import csv
+import json
+import os
+import sys
+from datetime import date
+
+import numpy as np
+
+import instrumentation
+from db import get_db_connection
+from date_utils import epoch_days_to_dates, to_epoch_day
+from rebate_records import RebateRecords
+from snapshot import SNAPSHOT_DIR, Snapshot
+
+GST_RATE = 0.05
+
+BILL_COLUMNS = (
+    "roll_no", "name", "branch", "periods", "rebate_days", "feast_day_presence",
+    "total_days", "feast_amount", "amount", "gst", "total_amount"
+)
+
+
+def _env_price(name):
+    # Same fallback as parseFloat(...) || 0 in backend/config/priceConfig.js
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return 0.0
+
+
+def get_prices():
+    """Read the prices the backend serves from PRICE_PER_DAY and GALA_DINNER_COST"""
+    return {
+        'price_per_day': _env_price("PRICE_PER_DAY"),
+        'gala_dinner_cost': _env_price("GALA_DINNER_COST")
+    }
+
+
+def month_bounds(year, month):
+    """Return (first day, last day, days in month) as epoch days"""
+    days_in_month = calendar.monthrange(year, month)[1]
+    first = to_epoch_day(date(year, month, 1))
+    return first, first + days_in_month - 1, days_in_month
+
+
+def load_month(cursor, year, month, batch):
+    """Load a batch's students and the rebates that start in the month.
+
+    Returns (students, rebates): students as (roll_no, name, branch) ordered
+    by branch and roll number, rebates as (roll_no, start_date, end_date,
+    rebate_days) ordered by student and start date.
+    """
+    cursor.execute(
+        "SELECT roll_no, name, branch FROM students WHERE batch = %s ORDER BY branch, roll_no",
+        (batch,)
+    )
+    students = cursor.fetchall()
+
+    # A start_date range instead of YEAR()/MONTH() so the primary key index can be used
+    month_start = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    cursor.execute("""
+    SELECT r.roll_no, r.start_date, r.end_date, r.rebate_days
+    FROM rebates r
+    JOIN students s ON r.roll_no = s.roll_no
+    WHERE s.batch = %s AND r.start_date >= %s AND r.start_date < %s
+    ORDER BY r.roll_no, r.start_date
+    """, (batch, month_start, next_month))
+    rebates = cursor.fetchall()
+    return students, rebates
+
+
+def compute_bills(student_index, start_days, end_days, student_count, year, month,
+                  feast_date=None, prices=None):
+    """Compute the monthly bill for every student at once.
+
+    student_index gives the student row of each rebate, and start_days and
+    end_days are its dates as epoch days. Rebates are clipped to the month and
+    accumulated into a student x day matrix of rebate counts, which reduces
+    to rebate days and feast-day absence. The rules match the export in
+    ViewRebates.jsx: each rebate counts its clipped days (end - start + 1),
+    a student misses the feast if any rebate covers feast_date, and with a
+    feast date the feast day is billed as the gala dinner instead of a
+    regular day. Pass feast_date=None for a month without a feast.
+
+    Returns a dict of arrays, one entry per student.
+    """
+    prices = prices or get_prices()
+    first, last, days_in_month = month_bounds(year, month)
+    student_index = np.asarray(student_index, dtype=np.int64)
+
+    # Difference array per student: +1 on the first rebate day, -1 after the last
+    starts = np.clip(np.asarray(start_days, dtype=np.int64), first, last) - first
+    ends = np.clip(np.asarray(end_days, dtype=np.int64), first, last) - first
+    diff = np.zeros((student_count, days_in_month + 1), dtype=np.int32)
+    np.add.at(diff, (student_index, starts), 1)
+    np.add.at(diff, (student_index, ends + 1), -1)
+    on_rebate = np.cumsum(diff[:, :days_in_month], axis=1)
+
+    # Summing counts rather than flags keeps the per-rebate totals of the spreadsheet
+    rebate_days = on_rebate.sum(axis=1)
+
+    has_feast = feast_date is not None
+    if has_feast:
+        feast_offset = to_epoch_day(feast_date) - first
+        if 0 <= feast_offset < days_in_month:
+            absent = on_rebate[:, feast_offset] > 0
+        else:
+            absent = np.zeros(student_count, dtype=bool)
+        feast_day_presence = (~absent).astype(np.int64)
+    else:
+        feast_day_presence = np.zeros(student_count, dtype=np.int64)
+
+    total_days = days_in_month - rebate_days - (1 if has_feast else 0)
+    feast_amount = feast_day_presence * prices['gala_dinner_cost']
+    amount = total_days * prices['price_per_day']
+    gst = amount * GST_RATE
+    return {
+        'rebate_days': rebate_days,
+        'feast_day_presence': feast_day_presence,
+        'total_days': total_days,
+        'feast_amount': feast_amount,
+        'amount': amount,
+        'gst': gst,
+        'total_amount': amount + gst + feast_amount
+    }
+
+
+def monthly_bills(conn, year, month, batch, feast_date=None, prices=None):
+    """Return one bill dict per student of the batch for the month"""
+    cursor = conn.cursor()
+    students, rebates = load_month(cursor, year, month, batch)
+    cursor.close()
+
+    # The batch's students are the roll number dictionary, so record positions are bill rows
+    records = RebateRecords.from_rows(rebates, roll_nos=[roll_no for roll_no, _, _ in students])
+    return build_bills(
+        students, records.student, records.start_day.astype(np.int64), records.end_day.astype(np.int64),
+        year, month, feast_date, prices
+    )
+
+
+def monthly_bills_snapshot(snapshot, year, month, batch, feast_date=None, prices=None):
+    """monthly_bills computed from a snapshot.Snapshot instead of the database"""
+    positions = snapshot.batch_students(batch)
+    first, last, _ = month_bounds(year, month)
+    records = snapshot.records().starting_between(first, last)
+
+    # Map snapshot student positions to rows of this batch, dropping other batches
+    rows = np.full(len(snapshot.students['roll_no']), -1, dtype=np.int64)
+    rows[positions] = np.arange(len(positions))
+    student_index = rows[records.student]
+    keep = student_index >= 0
+    records, student_index = records[keep], student_index[keep]
+    # Bills list periods in start date order per student, like the ORDER BY of load_month
+    order = np.lexsort((records.start_day, student_index))
+    records, student_index = records[order], student_index[order]
+
+    students = list(zip(
+        snapshot.students['roll_no'][positions].tolist(),
+        snapshot.students['name'][positions].tolist(),
+        snapshot.students['branch_names'][snapshot.students['branch'][positions]].tolist()
+    ))
+    return build_bills(
+        students, student_index, records.start_day.astype(np.int64), records.end_day.astype(np.int64),
+        year, month, feast_date, prices
+    )
+
+
+def build_bills(students, student_index, start_days, end_days, year, month, feast_date=None, prices=None):
+    """Turn (roll_no, name, branch) students and their rebates into bill dicts"""
+    result = compute_bills(
+        student_index, start_days, end_days, len(students), year, month, feast_date, prices
+    )
+
+    # Clipped periods for display, in start date order per student
+    first, last, _ = month_bounds(year, month)
+    period_starts = epoch_days_to_dates(np.clip(start_days, first, last))
+    period_ends = epoch_days_to_dates(np.clip(end_days, first, last))
+    periods = [[] for _ in students]
+    for i, start, end in zip(np.asarray(student_index, dtype=np.int64).tolist(), period_starts, period_ends):
+        periods[i].append((start, end))
+
+    columns = {name: values.tolist() for name, values in result.items()}
+    return [
+        {
+            'roll_no': roll_no,
+            'name': name,
+            'branch': branch,
+            'periods': periods[i],
+            **{column: values[i] for column, values in columns.items()}
+        }
+        for i, (roll_no, name, branch) in enumerate(students)
+    ]
+
+
+def _format_periods(periods):
+    return "; ".join(f"{start} to {end}" for start, end in periods)
+
+
+def write_bills(bills, output_format, handle):
+    if output_format == "json":
+        json.dump(bills, handle, indent=2, default=str)
+        handle.write("\n")
+        return
+
+    rows = [
+        [_format_periods(bill[column]) if column == "periods" else bill[column] for column in BILL_COLUMNS]
+        for bill in bills
+    ]
+    if output_format == "csv":
+        writer = csv.writer(handle)
+        writer.writerow(BILL_COLUMNS)
+        writer.writerows(rows)
+        return
+
+    current_branch = None
+    for bill in bills:
+        if bill['branch'] != current_branch:
+            current_branch = bill['branch']
+            print(f"\n{current_branch}", file=handle)
+            print("-" * 100, file=handle)
+        print(
+            f"{bill['roll_no']:<12} {bill['name'][:28]:<28} rebate {bill['rebate_days']:>3}  "
+            f"feast {bill['feast_day_presence']}  days {bill['total_days']:>3}  "
+            f"amount {bill['amount']:>9.2f}  gst {bill['gst']:>7.2f}  total {bill['total_amount']:>9.2f}",
+            file=handle
+        )
+
+
+def run_billing(args, run):
+    prices = get_prices()
+    if args.price_per_day is not None:
+        prices['price_per_day'] = args.price_per_day
+    if args.gala_dinner_cost is not None:
+        prices['gala_dinner_cost'] = args.gala_dinner_cost
+
+    if args.snapshot:
+        with run.phase("compute") as phase:
+            snapshot = Snapshot(args.snapshot)
+            print(f"Using snapshot taken at {snapshot.created_at}", file=sys.stderr)
+            bills = monthly_bills_snapshot(snapshot, args.year, args.month, args.batch, args.feast_date, prices)
+            phase.rows = len(bills)
+    else:
+        conn = get_db_connection()
+        try:
+            with run.phase("compute") as phase:
+                bills = monthly_bills(conn, args.year, args.month, args.batch, args.feast_date, prices)
+                phase.rows = len(bills)
+        finally:
+            conn.close()
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as handle:
+            write_bills(bills, args.format, handle)
+        print(f"Wrote {len(bills)} bills to {args.output}")
+    else:
+        write_bills(bills, args.format, sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute monthly mess bills for a batch")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--month", type=int, required=True, choices=range(1, 13), metavar="MONTH")
+    parser.add_argument("--batch", type=int, required=True)
+    feast = parser.add_mutually_exclusive_group(required=True)
+    feast.add_argument("--feast-date", type=date.fromisoformat, help="Feast day (YYYY-MM-DD)")
+    feast.add_argument("--no-feast", action="store_true", help="No feast this month")
+    parser.add_argument("--price-per-day", type=float, help="Override PRICE_PER_DAY")
+    parser.add_argument("--gala-dinner-cost", type=float, help="Override GALA_DINNER_COST")
+    parser.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    parser.add_argument("--output", help="Write the bills to this file instead of stdout")
+    parser.add_argument("--snapshot", nargs="?", const=SNAPSHOT_DIR, metavar="DIR",
+                        help="Bill from a snapshot from snapshot.py instead of querying the database")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("billing", args) as run:
+        run_billing(args, run)
+
+
+if __name__ == "__main__":
+    main()
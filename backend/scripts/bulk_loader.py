@@ -0,0 +1,190 @@
+import os
+import tempfile
+import time
+from datetime import date, datetime
+from itertools import islice
+
+from db import is_sqlite
+
+MODES = ("insert", "ignore", "upsert")
+METHODS = ("values", "load_data")
+
+REBATE_COLUMNS = ("roll_no", "start_date", "end_date", "rebate_days")
+STUDENT_COLUMNS = ("roll_no", "name", "mobile_no", "email", "branch", "batch")
+
+
+def iter_chunks(rows, chunk_size):
+    """Yield lists of at most chunk_size rows from any iterable"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def build_insert_query(table, columns, row_count, mode="insert", update_columns=None):
+    """Build a multi-row INSERT statement with %s placeholders"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown insert mode: {mode}")
+
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    query = "INSERT IGNORE INTO" if mode == "ignore" else "INSERT INTO"
+    query += f" {table} ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * row_count)
+
+    if mode == "upsert":
+        update_columns = update_columns or columns
+        query += " ON DUPLICATE KEY UPDATE " + ", ".join(
+            f"{column} = VALUES({column})" for column in update_columns
+        )
+    return query
+
+
+def _csv_field(value):
+    # Encoded for LOAD DATA with FIELDS ENCLOSED BY '"' and the default '\' escape
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    text = str(value).replace("\\", "\\\\").replace('"', '""')
+    return f'"{text}"'
+
+
+def _write_chunk_csv(chunk):
+    handle = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="", encoding="utf-8")
+    with handle:
+        for row in chunk:
+            handle.write(",".join(_csv_field(value) for value in row))
+            handle.write("\n")
+    return handle.name
+
+
+def _load_chunk(cursor, table, columns, chunk, mode):
+    if mode == "upsert":
+        # REPLACE would delete and re-insert rows, cascading to dependent tables
+        raise ValueError("LOAD DATA does not support upsert mode; use method='values'")
+
+    path = _write_chunk_csv(chunk)
+    try:
+        query = (
+            "LOAD DATA LOCAL INFILE %s "
+            + ("IGNORE " if mode == "ignore" else "")
+            + f"INTO TABLE {table} CHARACTER SET utf8mb4 "
+            + "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            + "LINES TERMINATED BY '\\n' "
+            + f"({', '.join(columns)})"
+        )
+        cursor.execute(query, (path,))
+        return cursor.rowcount
+    finally:
+        os.remove(path)
+
+
+def _counts(stats):
+    if stats['inserted'] is None:
+        return f"{stats['affected']} rows affected"
+    return f"{stats['inserted']} inserted, {stats['duplicates']} duplicates"
+
+
+def bulk_insert(conn, table, columns, rows, chunk_size=1000, mode="insert",
+                update_columns=None, method="values", commit_per_chunk=True, verbose=True):
+    """Stream rows into a table using one statement per chunk.
+
+    rows can be any iterable of tuples in `columns` order; it is consumed
+    lazily so generators never need to be materialised. mode is "insert",
+    "ignore" (INSERT IGNORE) or "upsert" (ON DUPLICATE KEY UPDATE). method
+    "load_data" writes each chunk to a temporary CSV and uses LOAD DATA
+    LOCAL INFILE, which needs allow_local_infile on the connection.
+
+    For ignore mode duplicates are rows the server skipped. Upsert mode
+    reports only 'affected', the server's row count: MySQL counts 1 per
+    inserted row, 2 per updated row and 0 per unchanged one, while SQLite
+    counts 1 per row, so inserted and duplicates are None there.
+    Returns a summary dict with totals and per-chunk statistics.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown bulk insert method: {method}")
+    if method == "load_data" and is_sqlite():
+        raise ValueError("LOAD DATA is only available with the MySQL backend")
+
+    cursor = conn.cursor()
+    summary = {
+        'table': table,
+        'rows': 0,
+        'inserted': None if mode == "upsert" else 0,
+        'duplicates': None if mode == "upsert" else 0,
+        'affected': 0,
+        'seconds': 0.0,
+        'rows_per_sec': 0.0,
+        'chunks': []
+    }
+    queries = {}
+    started = time.perf_counter()
+
+    try:
+        for number, chunk in enumerate(iter_chunks(rows, chunk_size), start=1):
+            chunk_started = time.perf_counter()
+
+            if method == "load_data":
+                affected = _load_chunk(cursor, table, columns, chunk, mode)
+            else:
+                # Only the final, shorter chunk needs a statement of its own
+                if len(chunk) not in queries:
+                    queries[len(chunk)] = build_insert_query(table, columns, len(chunk), mode, update_columns)
+                cursor.execute(queries[len(chunk)], [value for row in chunk for value in row])
+                affected = cursor.rowcount
+
+            if commit_per_chunk:
+                conn.commit()
+
+            if mode == "upsert":
+                inserted = duplicates = None
+            else:
+                inserted = affected
+                duplicates = len(chunk) - affected
+
+            elapsed = time.perf_counter() - chunk_started
+            stats = {
+                'chunk': number,
+                'rows': len(chunk),
+                'inserted': inserted,
+                'duplicates': duplicates,
+                'affected': affected,
+                'seconds': elapsed,
+                'rows_per_sec': len(chunk) / elapsed if elapsed > 0 else 0.0
+            }
+            summary['chunks'].append(stats)
+            summary['rows'] += len(chunk)
+            summary['affected'] += affected
+            if mode != "upsert":
+                summary['inserted'] += inserted
+                summary['duplicates'] += duplicates
+
+            if verbose:
+                print(
+                    f"[{table}] chunk {number}: {len(chunk)} rows, {_counts(stats)}, "
+                    f"{stats['rows_per_sec']:.0f} rows/sec"
+                )
+
+        if not commit_per_chunk:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    summary['seconds'] = time.perf_counter() - started
+    if summary['seconds'] > 0:
+        summary['rows_per_sec'] = summary['rows'] / summary['seconds']
+
+    if verbose:
+        print(
+            f"[{table}] loaded {summary['rows']} rows in {summary['seconds']:.2f}s "
+            f"({summary['rows_per_sec']:.0f} rows/sec): {_counts(summary)}"
+        )
+    return summary
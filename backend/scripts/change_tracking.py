@@ -0,0 +1,219 @@
+from db import column_exists, is_sqlite
+
+
+def ensure_updated_at(conn, table):
+    """Add an indexed updated_at column maintained on every insert and update.
+
+    MySQL maintains it with DEFAULT / ON UPDATE CURRENT_TIMESTAMP; SQLite
+    cannot add such a column, so triggers keep it current instead. Existing
+    rows are stamped with the time the column is added.
+    """
+    cursor = conn.cursor()
+    try:
+        if column_exists(cursor, table, "updated_at"):
+            return False
+
+        if is_sqlite():
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP")
+            cursor.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_updated_at
+            AFTER INSERT ON {table}
+            BEGIN
+                UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+            END
+            """)
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_updated_at
+            AFTER UPDATE ON {table}
+            WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+            END
+            """)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table} (updated_at)")
+        else:
+            cursor.execute(f"""
+            ALTER TABLE {table}
+            ADD COLUMN updated_at TIMESTAMP NOT NULL
+                DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            ADD INDEX idx_{table}_updated_at (updated_at)
+            """)
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+def max_updated_at(cursor, table):
+    """Return the latest updated_at as a 'YYYY-MM-DD HH:MM:SS' string usable as a watermark"""
+    cursor.execute(f"SELECT MAX(updated_at) FROM {table}")
+    value = cursor.fetchone()[0]
+    return str(value) if value is not None else None
+
+
+# Change log of (year, month, branch, batch) groups whose rebate statistics are stale
+STATS_CHANGE_LOG = "rebate_stats_changes"
+
+# Every trigger writes the groups touched by a row; MySQL does not fire triggers
+# for foreign key cascades, so student deletes log their rebates' groups themselves
+_STATS_TRIGGERS = {
+    "trg_rebates_stats_insert": ("AFTER INSERT", "rebates", None, ["rebate:NEW"]),
+    "trg_rebates_stats_update": ("AFTER UPDATE", "rebates", None, ["rebate:OLD", "rebate:NEW"]),
+    "trg_rebates_stats_delete": ("AFTER DELETE", "rebates", None, ["rebate:OLD"]),
+    "trg_students_stats_delete": ("BEFORE DELETE", "students", None, ["student:OLD"]),
+    "trg_students_stats_update": (
+        "AFTER UPDATE", "students",
+        "NOT (OLD.branch <=> NEW.branch AND OLD.batch <=> NEW.batch)",
+        ["student:OLD", "student:NEW"]
+    ),
+}
+
+
+def _log_groups_statement(source):
+    kind, row = source.split(":")
+    insert = f"INSERT INTO {STATS_CHANGE_LOG} (year, month, branch, batch)"
+    if kind == "rebate":
+        return (
+            f"{insert} SELECT YEAR({row}.start_date), MONTH({row}.start_date), s.branch, s.batch "
+            f"FROM students s WHERE s.roll_no = {row}.roll_no;"
+        )
+    return (
+        f"{insert} SELECT DISTINCT YEAR(r.start_date), MONTH(r.start_date), {row}.branch, {row}.batch "
+        f"FROM rebates r WHERE r.roll_no = {row}.roll_no;"
+    )
+
+
+def _trigger_exists(cursor, name):
+    if is_sqlite():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", (name,))
+    else:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s",
+            (name,)
+        )
+    return cursor.fetchone() is not None
+
+
+def _id_column():
+    if is_sqlite():
+        return "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    return "id BIGINT AUTO_INCREMENT PRIMARY KEY"
+
+
+def _create_triggers(cursor, triggers):
+    """Create missing triggers given as name -> (timing, table, condition, body statements)"""
+    created = False
+    for name, (timing, table, condition, statements) in triggers.items():
+        if _trigger_exists(cursor, name):
+            continue
+        body = "\n".join(statements)
+        if is_sqlite():
+            when = f"WHEN {condition.replace('<=>', 'IS')}" if condition else ""
+            cursor.execute(f"CREATE TRIGGER {name} {timing} ON {table} FOR EACH ROW {when}\nBEGIN\n{body}\nEND")
+        else:
+            if condition:
+                body = f"IF {condition} THEN\n{body}\nEND IF;"
+            cursor.execute(f"CREATE TRIGGER {name} {timing} ON {table} FOR EACH ROW\nBEGIN\n{body}\nEND")
+        created = True
+    return created
+
+
+def ensure_stats_change_log(conn):
+    """Create the statistics change log and the triggers that fill it.
+
+    Inserts, updates and deletes on rebates, and branch/batch changes or
+    deletes on students, record the affected (year, month, branch, batch)
+    groups so stats_aggregates can recompute just those. Returns True if
+    anything was created.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_CHANGE_LOG} (
+            {_id_column()},
+            year INT,
+            month INT,
+            branch VARCHAR(50),
+            batch INT
+        )
+        """)
+
+        created = _create_triggers(cursor, {
+            name: (timing, table, condition, [_log_groups_statement(source) for source in sources])
+            for name, (timing, table, condition, sources) in _STATS_TRIGGERS.items()
+        })
+        conn.commit()
+        return created
+    finally:
+        cursor.close()
+
+
+# Change log of inserted, updated and deleted keys for the export feed
+EXPORT_CHANGE_LOG = "export_change_log"
+
+_REBATE_KEY_SAME = "OLD.roll_no <=> NEW.roll_no AND OLD.start_date <=> NEW.start_date"
+
+
+def _log_change_statement(table, operation, row):
+    start_date = f"{row}.start_date" if table == "rebates" else "NULL"
+    return (
+        f"INSERT INTO {EXPORT_CHANGE_LOG} (table_name, operation, roll_no, start_date) "
+        f"VALUES ('{table}', '{operation}', {row}.roll_no, {start_date});"
+    )
+
+
+# A changed primary key is logged as a delete of the old key and an insert of the new one
+_EXPORT_TRIGGERS = {
+    "trg_rebates_export_insert": ("AFTER INSERT", "rebates", None, [("rebates", "insert", "NEW")]),
+    "trg_rebates_export_update": ("AFTER UPDATE", "rebates", _REBATE_KEY_SAME, [("rebates", "update", "NEW")]),
+    "trg_rebates_export_rekey": (
+        "AFTER UPDATE", "rebates", f"NOT ({_REBATE_KEY_SAME})",
+        [("rebates", "delete", "OLD"), ("rebates", "insert", "NEW")]
+    ),
+    "trg_rebates_export_delete": ("AFTER DELETE", "rebates", None, [("rebates", "delete", "OLD")]),
+    "trg_students_export_insert": ("AFTER INSERT", "students", None, [("students", "insert", "NEW")]),
+    "trg_students_export_update": (
+        "AFTER UPDATE", "students", "OLD.roll_no <=> NEW.roll_no", [("students", "update", "NEW")]
+    ),
+    "trg_students_export_rekey": (
+        "AFTER UPDATE", "students", "NOT (OLD.roll_no <=> NEW.roll_no)",
+        [("students", "delete", "OLD"), ("students", "insert", "NEW")]
+    ),
+    "trg_students_export_delete": ("BEFORE DELETE", "students", None, [("students", "delete", "OLD")]),
+}
+
+
+def ensure_export_change_log(conn):
+    """Create the export change log and the triggers that fill it.
+
+    Every insert, update and delete on rebates and students records the
+    operation and the row's key, so export_changes can write just the rows
+    changed since its last run. MySQL does not fire triggers for foreign key
+    cascades, so a student delete also logs the deletes of their rebates.
+    Returns True if anything was created.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {EXPORT_CHANGE_LOG} (
+            {_id_column()},
+            table_name VARCHAR(20) NOT NULL,
+            operation VARCHAR(6) NOT NULL,
+            roll_no VARCHAR(10) NOT NULL,
+            start_date DATE
+        )
+        """)
+        triggers = {
+            name: (timing, table, condition, [_log_change_statement(*change) for change in changes])
+            for name, (timing, table, condition, changes) in _EXPORT_TRIGGERS.items()
+        }
+        triggers["trg_students_export_delete"][3].insert(0, (
+            f"INSERT INTO {EXPORT_CHANGE_LOG} (table_name, operation, roll_no, start_date) "
+            f"SELECT 'rebates', 'delete', roll_no, start_date FROM rebates WHERE roll_no = OLD.roll_no;"
+        ))
+        created = _create_triggers(cursor, triggers)
+        conn.commit()
+        return created
+    finally:
+        cursor.close()
@@ -1,19 +1,11 @@
-import mysql.connector
-import os
-from datetime import datetime
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=3306,
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
+import argparse
+from datetime import datetime, timedelta
+import instrumentation
+from db import get_db_connection
+from change_tracking import ensure_updated_at, max_updated_at
+from checkpoint import checkpoint_path, load_checkpoint, save_checkpoint
+from rebate_records import RebateRecords
+from snapshot import SNAPSHOT_DIR, Snapshot
 
 def find_overlapping_rebates():
     conn = get_db_connection()
@@ -64,27 +56,166 @@ def display_conflicts(conflicts):
         print(f"  Period: {conflict['start2']} to {conflict['end2']}")
         print("-" * 100)
 
-def delete_conflicts(conflicts):
-    if not conflicts:
+def stream_rebates(cursor, fetch_size=10000):
+    """Stream rebates ordered by student and start date without buffering the result"""
+    cursor.execute("""
+    SELECT roll_no, start_date, end_date
+    FROM rebates
+    ORDER BY roll_no, start_date
+    """)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        yield from rows
+
+def iter_overlap_chains(rows):
+    """Single-pass sweep over rows sorted by (roll_no, start_date).
+
+    Yields every maximal chain of two or more rebates of the same student
+    that are linked by overlaps. Only the current chain is held in memory.
+    """
+    current_roll_no = None
+    chain = []
+    chain_end = None
+
+    for roll_no, start_date, end_date in rows:
+        if roll_no == current_roll_no and start_date <= chain_end:
+            chain.append((start_date, end_date))
+            chain_end = max(chain_end, end_date)
+            continue
+
+        if len(chain) > 1:
+            yield {'roll_no': current_roll_no, 'rebates': chain}
+        current_roll_no = roll_no
+        chain = [(start_date, end_date)]
+        chain_end = end_date
+
+    if len(chain) > 1:
+        yield {'roll_no': current_roll_no, 'rebates': chain}
+
+def find_overlap_chains():
+    conn = get_db_connection()
+    # Default (unbuffered) cursor: rows are read from the server as we sweep
+    cursor = conn.cursor()
+
+    chains = list(iter_overlap_chains(stream_rebates(cursor)))
+
+    cursor.close()
+    conn.close()
+
+    return chains
+
+def find_overlap_chains_records():
+    """Load all rebates into compact records and find chains with array operations"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    records = RebateRecords.fetch(cursor)
+    cursor.close()
+    conn.close()
+    # Dictionary positions follow the order rows arrived in; report by roll number like the sweep
+    return sorted(records.sorted().overlap_chains(), key=lambda chain: chain['roll_no'])
+
+def find_overlap_chains_snapshot(directory):
+    """Same chains as find_overlap_chains, computed from a snapshot without the database"""
+    snapshot = Snapshot(directory)
+    print(f"Using snapshot taken at {snapshot.created_at}")
+    # Snapshot rebates are already ordered by student and start date
+    return snapshot.records().overlap_chains()
+
+def stream_student_rebates(cursor, roll_nos, students_per_query=500):
+    """Stream the rebates of the given students, ordered like stream_rebates"""
+    roll_nos = sorted(roll_nos)
+    for i in range(0, len(roll_nos), students_per_query):
+        batch = roll_nos[i:i + students_per_query]
+        cursor.execute(f"""
+        SELECT roll_no, start_date, end_date
+        FROM rebates
+        WHERE roll_no IN ({', '.join(['%s'] * len(batch))})
+        ORDER BY roll_no, start_date
+        """, batch)
+        yield from cursor.fetchall()
+
+def find_overlap_chains_incremental(watermark_path, lag_seconds=60):
+    """Re-check only students with rebates added or modified since the last run.
+
+    updated_at is stamped when a statement runs, not when its transaction
+    commits, so students are re-checked from lag_seconds before the last
+    watermark to catch rows that became visible late. Returns the chains
+    found and the new watermark, which the caller saves once the conflicts
+    have been dealt with.
+    """
+    conn = get_db_connection()
+    if ensure_updated_at(conn, "rebates"):
+        print("Added updated_at column to rebates for change tracking")
+
+    cursor = conn.cursor()
+    # Rows changed after this point are picked up by the next run
+    new_watermark = max_updated_at(cursor, "rebates")
+    checkpoint = load_checkpoint(watermark_path, {})
+    watermark = checkpoint.get('updated_at')
+
+    if watermark is None:
+        print("No watermark found, checking all students")
+        chains = list(iter_overlap_chains(stream_rebates(cursor)))
+    else:
+        since = datetime.fromisoformat(watermark) - timedelta(seconds=lag_seconds)
+        cursor.execute(
+            "SELECT DISTINCT roll_no FROM rebates WHERE updated_at >= %s",
+            (since.strftime("%Y-%m-%d %H:%M:%S"),)
+        )
+        changed_roll_nos = [row[0] for row in cursor.fetchall()]
+        print(f"{len(changed_roll_nos)} students have rebates changed since {watermark}")
+        chains = list(iter_overlap_chains(stream_student_rebates(cursor, changed_roll_nos)))
+
+    cursor.close()
+    conn.close()
+
+    return chains, new_watermark
+
+def display_chains(chains):
+    if not chains:
+        print("\nNo overlapping rebate entries found!")
         return
+
+    total = sum(len(chain['rebates']) for chain in chains)
+    print(f"\nFound {len(chains)} chains of overlapping rebate entries ({total} entries):")
+    print("-" * 100)
+
+    for chain in chains:
+        print(f"\nRoll No: {chain['roll_no']}")
+        for number, (start_date, end_date) in enumerate(chain['rebates'], start=1):
+            print(f"Conflict {number}:")
+            print(f"  Period: {start_date} to {end_date}")
+        print("-" * 100)
+
+def pair_keys(conflicts):
+    keys = []
+    for conflict in conflicts:
+        keys.append((conflict['roll_no'], conflict['start1']))
+        keys.append((conflict['roll_no'], conflict['start2']))
+    return list(dict.fromkeys(keys))
+
+def chain_keys(chains):
+    return [
+        (chain['roll_no'], start_date)
+        for chain in chains
+        for start_date, _ in chain['rebates']
+    ]
+
+def delete_conflicts(keys, batch_size=1000):
+    if not keys:
+        return 0
     
     conn = get_db_connection()
     cursor = conn.cursor()
     
     # Delete the rebates using the composite primary key
-    for conflict in conflicts:
-        # Delete both overlapping entries
-        delete_query = """
-        DELETE FROM rebates 
-        WHERE (roll_no = %s AND start_date = %s)
-           OR (roll_no = %s AND start_date = %s)
-        """
-        cursor.execute(delete_query, (
-            conflict['roll_no'], conflict['start1'],
-            conflict['roll_no'], conflict['start2']
-        ))
-    
-    rows_deleted = cursor.rowcount
+    delete_query = "DELETE FROM rebates WHERE roll_no = %s AND start_date = %s"
+    rows_deleted = 0
+    for i in range(0, len(keys), batch_size):
+        cursor.executemany(delete_query, keys[i:i + batch_size])
+        rows_deleted += cursor.rowcount
     conn.commit()
     
     cursor.close()
@@ -93,23 +224,72 @@ def delete_conflicts(conflicts):
     return rows_deleted
 
 def main():
-    print("Checking for overlapping rebate entries...")
-    conflicts = find_overlapping_rebates()
-    
-    display_conflicts(conflicts)
-    
-    if conflicts:
-        while True:
-            response = input("\nDo you want to delete these overlapping entries? (yes/no): ").lower()
-            if response in ['yes', 'no']:
-                break
-            print("Please enter 'yes' or 'no'")
-        
-        if response == 'yes':
-            rows_deleted = delete_conflicts(conflicts)
-            print(f"\nSuccessfully deleted {rows_deleted} overlapping rebate entries!")
+    parser = argparse.ArgumentParser(description="Find and optionally delete overlapping rebates")
+    parser.add_argument("--mode", choices=["sweep", "records", "join"], default="sweep",
+                        help="Streaming sweep-line over sorted rows, array sweep over compact "
+                             "in-memory records, or the legacy self-join")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-check students with rebates changed since the last incremental run")
+    parser.add_argument("--watermark-file", default=checkpoint_path("overlap_check"),
+                        help="Where the incremental watermark is stored")
+    parser.add_argument("--lag-seconds", type=int, default=60,
+                        help="Re-check rows stamped this long before the watermark, for transactions that commit late")
+    parser.add_argument("--skip-conflicts", action="store_true",
+                        help="Move the incremental watermark on even when overlapping entries are kept")
+    parser.add_argument("--snapshot", nargs="?", const=SNAPSHOT_DIR, metavar="DIR",
+                        help="Check a snapshot from snapshot.py instead of querying the database")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("check_overlapping_rebates", args) as run:
+        print("Checking for overlapping rebate entries...")
+        new_watermark = None
+        with run.phase("detect") as phase:
+            conflicts = None
+            if args.snapshot:
+                chains = find_overlap_chains_snapshot(args.snapshot)
+            elif args.incremental:
+                chains, new_watermark = find_overlap_chains_incremental(args.watermark_file, args.lag_seconds)
+            elif args.mode == "join":
+                conflicts = find_overlapping_rebates()
+            elif args.mode == "records":
+                chains = find_overlap_chains_records()
+            else:
+                chains = find_overlap_chains()
+            phase.rows = len(chains if conflicts is None else conflicts)
+
+        if conflicts is not None:
+            display_conflicts(conflicts)
+            keys = pair_keys(conflicts)
         else:
-            print("\nNo entries were deleted.")
+            display_chains(chains)
+            keys = chain_keys(chains)
+
+        resolved = True
+        if keys:
+            while True:
+                response = input("\nDo you want to delete these overlapping entries? (yes/no): ").lower()
+                if response in ['yes', 'no']:
+                    break
+                print("Please enter 'yes' or 'no'")
+
+            if response == 'yes':
+                with run.phase("delete") as phase:
+                    rows_deleted = delete_conflicts(keys)
+                    phase.rows = rows_deleted
+                print(f"\nSuccessfully deleted {rows_deleted} overlapping rebate entries!")
+            else:
+                print("\nNo entries were deleted.")
+                resolved = args.skip_conflicts
+
+        if new_watermark is not None:
+            if resolved:
+                save_checkpoint(args.watermark_file, {'updated_at': new_watermark})
+                print(f"Watermark saved: {new_watermark}")
+            else:
+                # Otherwise the kept conflicts would never be reported again
+                print("Watermark not moved, so these students are checked again next run "
+                      "(use --skip-conflicts to move past them)")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,31 @@
+import json
+import os
+
+# Checkpoints and watermarks live next to the imported data files
+CHECKPOINT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "checkpoints"))
+
+
+def checkpoint_path(name):
+    return os.path.join(CHECKPOINT_DIR, f"{name}.json")
+
+
+def load_checkpoint(path, default=None):
+    """Return the saved checkpoint dict, or default if none was saved yet"""
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_checkpoint(path, data):
+    """Write the checkpoint atomically so an interrupted run never leaves a partial file"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, indent=2, default=str)
+    os.replace(temp_path, path)
+
+
+def clear_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,23 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+EPOCH = date(1970, 1, 1)
+
+
+def to_epoch_day(value):
+    """Convert a date, datetime or ISO string to days since 1970-01-01"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def from_epoch_day(day):
+    return EPOCH + timedelta(days=int(day))
+
+
+def epoch_days_to_dates(days):
+    """Convert an array of epoch days to a list of datetime.date objects"""
+    return np.asarray(days, dtype=np.int64).astype("datetime64[D]").tolist()
@@ -0,0 +1,351 @@
+import asyncio
+import os
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+import mysql.connector
+from mysql.connector import pooling
+from dotenv import load_dotenv
+
+try:
+    import aiomysql
+except ImportError:  # Only needed for the asyncio modes against MySQL
+    aiomysql = None
+
+# Load environment variables from backend/.env
+load_dotenv()
+
+# "mysql" (default) or "sqlite" for running the scripts without a MySQL server
+BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+
+DEFAULT_SQLITE_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "mess_rebate.sqlite3")
+)
+
+# Schema from the README, plus the gate_pass_no column the app relies on
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mess_managers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS students (
+    roll_no VARCHAR(10) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    mobile_no VARCHAR(15) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    branch VARCHAR(50) NOT NULL,
+    batch INT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rebates (
+    roll_no VARCHAR(10),
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    rebate_days INT NOT NULL,
+    gate_pass_no VARCHAR(10) UNIQUE,
+    PRIMARY KEY (roll_no, start_date),
+    FOREIGN KEY (roll_no) REFERENCES students(roll_no) ON DELETE CASCADE
+);
+"""
+
+_pool = None
+
+# Optional callable applied to every new connection (see instrumentation.py)
+_connection_wrapper = None
+
+
+def get_db_config():
+    return {
+        'host': os.getenv("DB_HOST"),
+        'port': int(os.getenv("DB_PORT", "3306")),
+        'user': os.getenv("DB_USER"),
+        'password': os.getenv("DB_PASS"),
+        'database': os.getenv("DB_NAME"),
+        # Needed for LOAD DATA LOCAL INFILE in bulk_loader
+        'allow_local_infile': os.getenv("DB_LOCAL_INFILE", "false").lower() == "true"
+    }
+
+
+def get_pool():
+    """Create the MySQL connection pool on first use (one pool per process)"""
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(
+            pool_name="mess_rebate_scripts",
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            pool_reset_session=True,
+            **get_db_config()
+        )
+    return _pool
+
+
+def get_db_connection():
+    """Return a connection for the configured backend.
+
+    MySQL connections come from the shared pool and go back to it on
+    close(). Cursors accept prepared=True to reuse server-side prepared
+    statements across repeated executes of the same query.
+    """
+    if is_sqlite():
+        conn = SQLiteConnection(os.getenv("SQLITE_PATH") or DEFAULT_SQLITE_PATH)
+    else:
+        conn = get_pool().get_connection()
+    return _connection_wrapper(conn) if _connection_wrapper else conn
+
+
+async def get_async_pool(size=None):
+    """Create a connection pool for the asyncio modes.
+
+    MySQL uses aiomysql. SQLite runs the usual wrappers on worker threads
+    behind the same acquire()/cursor() interface. Connections autocommit,
+    so reads see rows other connections have committed; writers group
+    statements with begin() and commit(). Close with close() and
+    wait_closed().
+    """
+    size = size or int(os.getenv("DB_POOL_SIZE", "5"))
+    if is_sqlite():
+        return AsyncSQLitePool(os.getenv("SQLITE_PATH") or DEFAULT_SQLITE_PATH, size)
+    if aiomysql is None:
+        raise RuntimeError("The asyncio modes need aiomysql (pip install aiomysql)")
+    config = get_db_config()
+    return await aiomysql.create_pool(
+        host=config['host'],
+        port=config['port'],
+        user=config['user'],
+        password=config['password'],
+        db=config['database'],
+        minsize=1,
+        maxsize=size,
+        autocommit=True
+    )
+
+
+def set_connection_wrapper(wrapper):
+    """Wrap every connection returned by get_db_connection(); None removes the wrapper"""
+    global _connection_wrapper
+    _connection_wrapper = wrapper
+
+
+def is_sqlite():
+    return BACKEND == "sqlite"
+
+
+def column_exists(cursor, table, column):
+    if is_sqlite():
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cursor.fetchall())
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    return cursor.fetchone() is not None
+
+
+# DB-API error base class for the configured backend
+Error = sqlite3.Error if is_sqlite() else mysql.connector.Error
+
+
+def _adapt_datetime(value):
+    # The scripts pass midnight datetimes for DATE columns; store those as plain dates
+    if value.hour == value.minute == value.second == value.microsecond == 0:
+        return value.date().isoformat()
+    return value.isoformat(sep=" ")
+
+
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()[:10]))
+sqlite3.register_converter("TIMESTAMP", lambda raw: datetime.fromisoformat(raw.decode()))
+
+
+@lru_cache(maxsize=256)
+def translate_query(query):
+    """Rewrite the MySQL dialect used by the scripts into SQLite"""
+    query = query.replace("%s", "?")
+    query = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bTRUNCATE\s+TABLE\b", "DELETE FROM", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", "ON CONFLICT DO UPDATE SET", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", query)
+    query = re.sub(r"\bYEAR\(([\w.]+)\)", r"CAST(strftime('%Y', \1) AS INTEGER)", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bMONTH\(([\w.]+)\)", r"CAST(strftime('%m', \1) AS INTEGER)", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bDATE_FORMAT\(([\w.]+),\s*('[^']*')\)", r"strftime(\2, \1)", query, flags=re.IGNORECASE)
+    return query
+
+
+class SQLiteCursor:
+    """Cursor wrapper that accepts the MySQL-style queries used by the scripts"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def execute(self, query, params=()):
+        self._cursor.execute(translate_query(query), tuple(params or ()))
+        return self
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(translate_query(query), (tuple(params) for params in seq_of_params))
+        return self
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size or self._cursor.arraysize)
+        return [self._convert(row) for row in rows]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._convert(row) for row in self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Stand-in for a MySQL connection backed by a local SQLite file"""
+
+    def __init__(self, path, check_same_thread=True):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=check_same_thread
+        )
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def cursor(self, dictionary=False, prepared=False, buffered=False):
+        # SQLite caches compiled statements itself, so prepared is accepted and ignored
+        return SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conn.close()
+
+
+class AsyncSQLiteCursor:
+    """Awaitable SQLiteCursor mirroring the aiomysql cursor methods the scripts use.
+
+    Results are buffered like aiomysql's default cursor, which also ends the
+    statement so the connection does not keep other writers locked out.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._rows = []
+
+    def _execute(self, query, params):
+        self._cursor.execute(query, params)
+        return self._cursor.fetchall() if self._cursor.description else []
+
+    async def execute(self, query, params=()):
+        self._rows = await asyncio.to_thread(self._execute, query, params)
+
+    async def executemany(self, query, seq_of_params):
+        await asyncio.to_thread(self._cursor.executemany, query, list(seq_of_params))
+        self._rows = []
+
+    async def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def close(self):
+        self._cursor.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncSQLiteConnection:
+    """SQLiteConnection whose blocking calls run on a worker thread"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return AsyncSQLiteCursor(self._conn.cursor())
+
+    async def begin(self):
+        # sqlite3 opens a transaction at the first write by itself
+        pass
+
+    async def commit(self):
+        await asyncio.to_thread(self._conn.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self._conn.rollback)
+
+    def close(self):
+        self._conn.close()
+
+
+class AsyncSQLitePool:
+    """Fixed-size pool of AsyncSQLiteConnection with the aiomysql pool interface"""
+
+    def __init__(self, path, size):
+        self._path = path
+        self._idle = []
+        self._available = asyncio.Semaphore(size)
+
+    @asynccontextmanager
+    async def acquire(self):
+        await self._available.acquire()
+        try:
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = AsyncSQLiteConnection(
+                    await asyncio.to_thread(SQLiteConnection, self._path, False)
+                )
+            try:
+                yield conn
+            finally:
+                self._idle.append(conn)
+        finally:
+            self._available.release()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    async def wait_closed(self):
+        pass
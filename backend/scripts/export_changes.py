@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import instrumentation
+from archive import FORMATS, ArchiveWriter
+from change_tracking import EXPORT_CHANGE_LOG, ensure_export_change_log
+from checkpoint import checkpoint_path, load_checkpoint, save_checkpoint
+from db import column_exists, get_db_connection
+
+# Delta files are only ever added here, one per table and run
+EXPORT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "exports"))
+MANIFEST = "manifest.jsonl"
+
+# Columns accounting receives; contact details stay out of the feed
+EXPORT_COLUMNS = {
+    'students': ("roll_no", "name", "branch", "batch"),
+    'rebates': ("roll_no", "start_date", "end_date", "rebate_days", "gate_pass_no"),
+}
+KEY_COLUMNS = {
+    'students': ("roll_no",),
+    'rebates': ("roll_no", "start_date"),
+}
+
+
+def _key(table, values):
+    # Dates come back as date objects from MySQL and strings from SQLite
+    return tuple(str(value)[:10] if column == "start_date" else value
+                 for column, value in zip(KEY_COLUMNS[table], values))
+
+
+def collapse_changes(rows):
+    """Reduce (table_name, operation, roll_no, start_date) log rows, in id order, to one operation per key.
+
+    A key inserted and deleted again within the window is dropped, a key
+    whose last change is a delete is a delete, one that did not exist before
+    the window is an insert, and anything else is an update. Returns
+    {table: {key: operation}}.
+    """
+    first_last = {}
+    for table, operation, roll_no, start_date in rows:
+        key = (table, _key(table, (roll_no, start_date)))
+        first, _ = first_last.get(key, (operation, None))
+        first_last[key] = (first, operation)
+
+    changes = {table: {} for table in EXPORT_COLUMNS}
+    for (table, key), (first, last) in first_last.items():
+        if first == "insert" and last == "delete":
+            continue
+        if last == "delete":
+            changes[table][key] = "delete"
+        else:
+            changes[table][key] = "insert" if first == "insert" else "update"
+    return changes
+
+
+def export_columns(cursor, table):
+    columns = EXPORT_COLUMNS[table]
+    # gate_pass_no is added by update_rebates_schema.js and may be missing on old databases
+    return tuple(column for column in columns if column != "gate_pass_no" or column_exists(cursor, table, column))
+
+
+def write_table_changes(cursor, table, writer, changes, last_id, fetch_size=10000):
+    """Write the current row of every inserted or updated key, then the deleted keys.
+
+    Current rows are read with one join against the change log, so the
+    export reads only changed rows whatever the table size. Returns counts
+    per operation.
+    """
+    columns = writer.columns[1:]
+    keys = KEY_COLUMNS[table]
+    counts = {'insert': 0, 'update': 0, 'delete': 0}
+
+    cursor.execute(f"""
+    SELECT {', '.join('t.' + column for column in columns)}
+    FROM {table} t
+    JOIN (
+        SELECT DISTINCT {', '.join(keys)} FROM {EXPORT_CHANGE_LOG}
+        WHERE table_name = %s AND id <= %s
+    ) c ON {' AND '.join(f't.{key} = c.{key}' for key in keys)}
+    """, (table, last_id))
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        chunk = []
+        for row in rows:
+            # Keys only in entries that became visible after the log was read are left for the next run
+            operation = changes.get(_key(table, row[:len(keys)]))
+            if operation in ("insert", "update"):
+                chunk.append((operation,) + tuple(row))
+                counts[operation] += 1
+        writer.write_rows(chunk)
+
+    padding = (None,) * (len(columns) - len(keys))
+    deletes = [("delete",) + key + padding for key, operation in changes.items() if operation == "delete"]
+    writer.write_rows(deletes)
+    counts['delete'] = len(deletes)
+    return counts
+
+
+def write_table_full(cursor, table, writer, fetch_size=10000):
+    """Write every row as an insert, the baseline later deltas apply to"""
+    cursor.execute(f"SELECT {', '.join(writer.columns[1:])} FROM {table}")
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        writer.write_rows(("insert",) + tuple(row) for row in rows)
+    return {'insert': writer.rows, 'update': 0, 'delete': 0}
+
+
+def _delete_entries(cursor, ids, batch_size=1000):
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
+        cursor.execute(f"DELETE FROM {EXPORT_CHANGE_LOG} WHERE id IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def export_changes(conn, output_dir=EXPORT_DIR, format="csv", state_path=None, full=False):
+    """Write the rows changed since the last run to new compressed files, one per table.
+
+    The change log works as a queue: every entry visible when the run starts
+    is exported, then exactly those entries are deleted. There is no id
+    watermark, because an id can be handed out before its transaction
+    commits. An entry that becomes visible late, below ids already exported,
+    stays in the log and goes out with the next run. Changes to one key are
+    serialized by its row lock, so entries for the same key keep their order.
+    Without a saved state (or with full=True) every row is exported as the
+    baseline. Returns the manifest entry appended to manifest.jsonl.
+    """
+    state_path = state_path or checkpoint_path("export_changes")
+    if ensure_export_change_log(conn):
+        print(f"Created {EXPORT_CHANGE_LOG} and its triggers")
+
+    cursor = conn.cursor()
+    try:
+        state = load_checkpoint(state_path, {})
+        if not state and not full:
+            print("No previous export found, exporting every row")
+            full = True
+
+        # Read before the tables, so changes made while the export runs are written again next run
+        cursor.execute(f"SELECT id, table_name, operation, roll_no, start_date FROM {EXPORT_CHANGE_LOG} ORDER BY id")
+        entries = cursor.fetchall()
+        ids = [entry[0] for entry in entries]
+        last_id = ids[-1] if ids else 0
+        changes = None if full else collapse_changes(entry[1:] for entry in entries)
+
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        extension = ".parquet" if format == "parquet" else ".csv.gz"
+        entry = {
+            'exported_at': datetime.now().isoformat(timespec="seconds"),
+            'full': full,
+            'change_entries': len(ids),
+            'files': {},
+        }
+        for table in EXPORT_COLUMNS:
+            if changes is not None and not changes[table]:
+                continue
+            path = os.path.join(output_dir, table, f"{table}_{'full' if full else 'changes'}_{stamp}{extension}")
+            if os.path.exists(path):
+                raise FileExistsError(f"{path} already exists; exports are never overwritten")
+            with ArchiveWriter(path, ("change_op",) + export_columns(cursor, table)) as writer:
+                if full:
+                    counts = write_table_full(cursor, table, writer)
+                else:
+                    counts = write_table_changes(cursor, table, writer, changes[table], last_id)
+            if writer.rows:
+                entry['files'][table] = {'path': os.path.relpath(path, output_dir), **counts}
+
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, MANIFEST), "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry) + "\n")
+        save_checkpoint(state_path, {'exported_at': entry['exported_at']})
+
+        _delete_entries(cursor, ids)
+        conn.commit()
+        return entry
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export rebates and students changed since the last run")
+    parser.add_argument("--output", default=EXPORT_DIR, help="Directory the delta files and manifest.jsonl go to")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="gzip CSV, or Parquet (needs pyarrow)")
+    parser.add_argument("--full", action="store_true", help="Export every row instead of the changes")
+    parser.add_argument("--state-file", default=checkpoint_path("export_changes"),
+                        help="Where the last export is recorded; without it the next run writes a baseline")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("export_changes", args) as run:
+        conn = get_db_connection()
+        try:
+            with run.phase("export") as phase:
+                entry = export_changes(conn, args.output, args.format, args.state_file, args.full)
+                phase.rows = sum(
+                    counts['insert'] + counts['update'] + counts['delete'] for counts in entry['files'].values()
+                )
+        finally:
+            conn.close()
+
+        if not entry['files']:
+            print("No changes since the last export")
+        for table, counts in entry['files'].items():
+            print(f"{table}: {counts['insert']} inserted, {counts['update']} updated, "
+                  f"{counts['delete']} deleted -> {os.path.join(args.output, counts['path'])}")
+        print(f"Processed {entry['change_entries']} change log entries")
+
+
+if __name__ == "__main__":
+    main()
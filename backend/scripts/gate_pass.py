@@ -0,0 +1,132 @@
+import re
+import string
+
+import numpy as np
+
+from bulk_loader import bulk_insert
+from db import is_sqlite
+
+PREFIXES = string.ascii_uppercase
+# Sequence numbers run 0001-9999; slot 0 of every prefix is never handed out
+SEQUENCE_SPACE = 10000
+
+GATE_PASS_PATTERN = re.compile(r"^([A-Z])-(\d{4})$")
+
+
+def encode_gate_pass(value):
+    """Encode 'B-0042' as prefix index * 10000 + sequence, or None if not in that format"""
+    match = GATE_PASS_PATTERN.match(value or "")
+    if match is None:
+        return None
+    return PREFIXES.index(match.group(1)) * SEQUENCE_SPACE + int(match.group(2))
+
+
+def decode_gate_pass(code):
+    prefix, sequence = divmod(int(code), SEQUENCE_SPACE)
+    return f"{PREFIXES[prefix]}-{sequence:04d}"
+
+
+class GatePassAllocator:
+    """Bitmap of used gate pass numbers that hands out the lowest free ones.
+
+    Prefix B is used first (the format the office already issues), then the
+    remaining letters alphabetically, so new passes come from contiguous
+    free ranges.
+    """
+
+    def __init__(self, first_prefix="B"):
+        self.used = np.zeros(len(PREFIXES) * SEQUENCE_SPACE, dtype=bool)
+        self.used[::SEQUENCE_SPACE] = True
+        order = [first_prefix] + [prefix for prefix in PREFIXES if prefix != first_prefix]
+        prefix_indexes = np.array([PREFIXES.index(prefix) for prefix in order])
+        # Every code in allocation order: all of B, then A, C, D, ...
+        self._order = (prefix_indexes[:, None] * SEQUENCE_SPACE + np.arange(SEQUENCE_SPACE)).ravel()
+        # Codes are never freed, so everything before this position is already used
+        self._next = 0
+
+    def mark_used(self, values):
+        codes = [code for code in map(encode_gate_pass, values) if code is not None]
+        if codes:
+            self.used[np.asarray(codes)] = True
+
+    def load(self, cursor, fetch_size=10000):
+        """Mark every gate pass already stored in rebates as used"""
+        cursor.execute("SELECT gate_pass_no FROM rebates WHERE gate_pass_no IS NOT NULL")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            self.mark_used(row[0] for row in rows)
+        return self
+
+    def available(self):
+        return int((~self.used).sum())
+
+    def allocate(self, count):
+        """Reserve up to count free codes, lowest first in prefix order"""
+        candidates = self._order[self._next:]
+        positions = np.flatnonzero(~self.used[candidates])[:count]
+        free = candidates[positions]
+        self.used[free] = True
+        if len(positions):
+            self._next += int(positions[-1]) + 1
+        return free
+
+    def allocate_strings(self, count):
+        return [decode_gate_pass(code) for code in self.allocate(count)]
+
+
+def apply_assignments(conn, assignments, chunk_size=5000):
+    """Set gate_pass_no for (roll_no, start_date, gate_pass_no) rows in one UPDATE.
+
+    The assignments are bulk loaded into a temporary table and joined
+    against rebates; rows that already have a gate pass are left alone.
+    Returns the number of rebates updated.
+    """
+    drop_query = (
+        "DROP TABLE IF EXISTS temp.gate_pass_assignments" if is_sqlite()
+        else "DROP TEMPORARY TABLE IF EXISTS gate_pass_assignments"
+    )
+    cursor = conn.cursor()
+    try:
+        cursor.execute(drop_query)
+        cursor.execute("""
+        CREATE TEMPORARY TABLE gate_pass_assignments (
+            roll_no VARCHAR(10) NOT NULL,
+            start_date DATE NOT NULL,
+            gate_pass_no VARCHAR(10) NOT NULL,
+            PRIMARY KEY (roll_no, start_date)
+        )
+        """)
+        bulk_insert(
+            conn, "gate_pass_assignments", ("roll_no", "start_date", "gate_pass_no"), assignments,
+            chunk_size=chunk_size, commit_per_chunk=False, verbose=False
+        )
+
+        if is_sqlite():
+            cursor.execute("""
+            UPDATE rebates
+            SET gate_pass_no = a.gate_pass_no
+            FROM gate_pass_assignments a
+            WHERE rebates.roll_no = a.roll_no
+              AND rebates.start_date = a.start_date
+              AND rebates.gate_pass_no IS NULL
+            """)
+        else:
+            cursor.execute("""
+            UPDATE rebates r
+            JOIN gate_pass_assignments a
+              ON r.roll_no = a.roll_no AND r.start_date = a.start_date
+            SET r.gate_pass_no = a.gate_pass_no
+            WHERE r.gate_pass_no IS NULL
+            """)
+        updated = cursor.rowcount
+        conn.commit()
+
+        cursor.execute(drop_query)
+        return updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -1,22 +1,35 @@
-import mysql.connector
-import random
+import argparse
 import os
+import random
+from functools import partial
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 from tqdm import tqdm
 import numpy as np
+import instrumentation
+from db import get_db_connection
+from interval_index import RebateIntervalIndex, build_roll_no_batch_map
+from batched_generation import generate_batched_entries
+from date_utils import to_epoch_day
+from rebate_records import RebateRecords
+from bulk_loader import METHODS, REBATE_COLUMNS
+from streaming import background_insert, counted
+from sharded_generation import DEFAULT_SHARD_COUNT, SHARD_MODES, generate_sharded_entries, iter_sharded_rows
 
-# Load environment variables properly
-load_dotenv()
-
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=3306,
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
+# Define date ranges for each batch
+DATE_RANGES = {
+    2022: {
+        'start': datetime(2022, 12, 1),  # December 2022 for 2022 batch
+        'end': datetime(2025, 12, 31)
+    },
+    2023: {
+        'start': datetime(2023, 11, 1),  # November 2023 for 2023 batch
+        'end': datetime(2025, 12, 31)
+    },
+    2024: {
+        'start': datetime(2024, 11, 1),  # November 2024 for 2024 batch
+        'end': datetime(2025, 12, 31)
+    }
+}
 
 def get_students():
     conn = get_db_connection()
@@ -46,79 +59,58 @@ def generate_random_date(start_date, end_date):
     random_days = random.randrange(days_between)
     return start_date + timedelta(days=random_days)
 
-def has_overlapping_rebate(roll_no, start_date, end_date):
+def load_rebate_index():
+    """Load existing rebates once so overlap checks never hit the database"""
     conn = get_db_connection()
     cursor = conn.cursor()
-
-    # Check for overlapping rebates
-    query = """
-    SELECT COUNT(*) FROM rebates 
-    WHERE roll_no = %s 
-    AND (
-        (start_date <= %s AND end_date >= %s) OR
-        (start_date <= %s AND end_date >= %s) OR
-        (start_date >= %s AND end_date <= %s)
-    )
-    """
-    cursor.execute(query, (roll_no, start_date, start_date, end_date, end_date, start_date, end_date))
-    count = cursor.fetchone()[0]
-
+    index = RebateIntervalIndex().load(cursor)
     cursor.close()
     conn.close()
+    return index
 
-    return count > 0
-
-def generate_rebate_entries(target_entries=10000):
-    students_by_batch = get_students()
-    
-    # Define date ranges for each batch
-    date_ranges = {
-        2022: {
-            'start': datetime(2022, 12, 1),  # December 2022 for 2022 batch
-            'end': datetime(2025, 12, 31)
-        },
-        2023: {
-            'start': datetime(2023, 11, 1),  # November 2023 for 2023 batch
-            'end': datetime(2025, 12, 31)
-        },
-        2024: {
-            'start': datetime(2024, 11, 1),  # November 2024 for 2024 batch
-            'end': datetime(2025, 12, 31)
-        }
-    }
+def load_existing_records(roll_nos):
+    """Load existing rebates as compact records whose dictionary is roll_nos"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    records = RebateRecords.fetch(cursor, roll_nos=roll_nos)
+    cursor.close()
+    conn.close()
+    return records
 
-    # Get all students
-    all_students = [roll_no for batch in students_by_batch.values() for roll_no in batch]
-    total_students = len(all_students)
-    
+def pareto_frequencies(total_students, max_entries=200, rng=None):
     # Create a realistic distribution of rebate frequencies
     # Using a power law distribution (Pareto distribution) to model rebate frequency
     # This will create a few students with many rebates and many students with few rebates
     alpha = 2.5  # Shape parameter - higher means more extreme distribution
     min_entries = 0
-    max_entries = 200  # Maximum entries per student
     
     # Generate rebate frequencies for each student
-    frequencies = np.random.pareto(alpha, total_students)
+    frequencies = (rng or np.random).pareto(alpha, total_students)
     # Scale frequencies to desired range
     frequencies = frequencies / frequencies.max() * (max_entries - min_entries) + min_entries
     frequencies = frequencies.astype(int)
     
+    return frequencies
+
+def iter_student_targets(students_by_batch, max_entries=200):
+    """Yield (roll_no, batch, target) per student, most rebates first"""
+    batch_by_roll_no = build_roll_no_batch_map(students_by_batch)
+
+    # Get all students
+    all_students = [roll_no for batch in students_by_batch.values() for roll_no in batch]
+    frequencies = pareto_frequencies(len(all_students), max_entries)
+
     # Sort students by frequency (descending)
     student_frequencies = list(zip(all_students, frequencies))
     student_frequencies.sort(key=lambda x: x[1], reverse=True)
-    
-    rebate_entries = []
-    seen_entries = set()  # Track (roll_no, start_date) pairs
-    
-    print(f"Generating rebate entries for {total_students} students...")
-    print("Distribution: Some students will have many rebates, others few or none")
-    
+
     # Progress bar for students
     for roll_no, target_entries in tqdm(student_frequencies, desc="Processing students"):
-        # Get student's batch
-        batch = next(b for b, students in students_by_batch.items() if roll_no in students)
-        
+        yield roll_no, batch_by_roll_no[roll_no], target_entries
+
+def iter_student_rebates(student_targets, rebate_index):
+    """Draw rebates for each student and yield the insert-ready rows that fit"""
+    for roll_no, batch, target_entries in student_targets:
         # Generate entries for this student
         entries_generated = 0
         max_attempts = target_entries * 3  # Limit attempts to avoid infinite loops
@@ -129,8 +121,8 @@ def generate_rebate_entries(target_entries=10000):
                 
             # Generate random dates
             start_date = generate_random_date(
-                date_ranges[batch]['start'],
-                date_ranges[batch]['end'] - timedelta(days=1)
+                DATE_RANGES[batch]['start'],
+                DATE_RANGES[batch]['end'] - timedelta(days=1)
             )
             
             # Random duration between 1 and 30 days
@@ -138,63 +130,138 @@ def generate_rebate_entries(target_entries=10000):
             end_date = start_date + timedelta(days=duration)
             
             # Ensure end_date doesn't exceed batch end date
-            if end_date > date_ranges[batch]['end']:
-                end_date = date_ranges[batch]['end']
-            
-            key = (roll_no, start_date.date())
+            if end_date > DATE_RANGES[batch]['end']:
+                end_date = DATE_RANGES[batch]['end']
             
-            if key in seen_entries:
-                continue
-                
-            if not has_overlapping_rebate(roll_no, start_date, end_date):
-                seen_entries.add(key)
-                rebate_entries.append({
-                    'roll_no': roll_no,
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'rebate_days': (end_date - start_date).days + 1
-                })
+            # Same-day starts overlap too, so the index also rules out duplicate keys
+            if rebate_index.add_if_free(roll_no, start_date, end_date):
+                yield roll_no, start_date, end_date, (end_date - start_date).days + 1
                 entries_generated += 1
-    
-    return rebate_entries
 
-def insert_rebate_entries(entries):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+        # Students are visited once, so their periods are not needed any more
+        rebate_index.discard(roll_no)
 
-    # Use INSERT IGNORE to skip duplicates
-    insert_query = """
-    INSERT IGNORE INTO rebates (roll_no, start_date, end_date, rebate_days)
-    VALUES (%s, %s, %s, %s)
-    """
-
-    # Insert entries in batches of 1000
-    batch_size = 1000
-    for i in tqdm(range(0, len(entries), batch_size), desc="Inserting entries"):
-        batch = entries[i:i + batch_size]
-        for entry in batch:
-            cursor.execute(insert_query, (
-                entry['roll_no'],
-                entry['start_date'],
-                entry['end_date'],
-                entry['rebate_days']
-            ))
-        conn.commit()
+def iter_rebate_rows(max_entries=200):
+    """Lazily generate and validate rebates: nothing is drawn until rows are pulled"""
+    students_by_batch = get_students()
+    rebate_index = load_rebate_index()
 
-    cursor.close()
-    conn.close()
+    total_students = sum(len(students) for students in students_by_batch.values())
+    print(f"Generating rebate entries for {total_students} students...")
+    print("Distribution: Some students will have many rebates, others few or none")
+
+    return iter_student_rebates(iter_student_targets(students_by_batch, max_entries), rebate_index)
+
+def generate_rebate_rows_batched(max_entries=200, seed=None):
+    """Vectorized variant of iter_rebate_rows returning insert-ready rows"""
+    students_by_batch = get_students()
+    rng = np.random.default_rng(seed)
+
+    roll_nos = [roll_no for batch in students_by_batch.values() for roll_no in batch]
+    batches = [batch for batch, students in students_by_batch.items() for _ in students]
+    window_starts = [to_epoch_day(DATE_RANGES[batch]['start']) for batch in batches]
+    window_ends = [to_epoch_day(DATE_RANGES[batch]['end']) for batch in batches]
+    existing = load_existing_records(roll_nos)
+
+    print(f"Generating rebate entries for {len(roll_nos)} students (batched)...")
+    entries = generate_batched_entries(
+        pareto_frequencies(len(roll_nos), max_entries, rng),
+        window_starts,
+        window_ends,
+        max_duration=30,
+        rng=rng,
+        existing=existing.periods()
+    )
+    records = RebateRecords.from_entries(entries, roll_nos)
+    return len(records), records.to_rows()
+
+def generate_rebate_rows_sharded(max_entries=200, seed=None, shard_by="hash",
+                                 shard_count=DEFAULT_SHARD_COUNT, workers=None):
+    """Batched generation split into independently seeded shards run in a process pool"""
+    students_by_batch = get_students()
+
+    roll_nos = [roll_no for batch in students_by_batch.values() for roll_no in batch]
+    batches = [batch for batch, students in students_by_batch.items() for _ in students]
+    window_starts = [to_epoch_day(DATE_RANGES[batch]['start']) for batch in batches]
+    window_ends = [to_epoch_day(DATE_RANGES[batch]['end']) for batch in batches]
+    existing = load_existing_records(roll_nos)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Generating rebate entries for {len(roll_nos)} students "
+          f"({shard_by} shards, {workers} workers)...")
+    shards, entropy = generate_sharded_entries(
+        roll_nos,
+        batches,
+        partial(pareto_frequencies, max_entries=max_entries),
+        window_starts,
+        window_ends,
+        max_duration=30,
+        seed=seed,
+        shard_by=shard_by,
+        shard_count=shard_count,
+        workers=workers,
+        existing=existing.periods()
+    )
+    print(f"Master seed: {entropy} (pass --seed {entropy} to regenerate this dataset)")
+    count = sum(len(entries['student']) for _, entries in shards)
+    return count, iter_sharded_rows(shards)
+
+def insert_rebate_entries(rows, chunk_size=1000, method="values"):
+    # Use INSERT IGNORE to skip duplicates, committing after every chunk; the
+    # writer thread inserts while rows are still being generated
+    return background_insert(
+        rows, "rebates", REBATE_COLUMNS, chunk_size=chunk_size, mode="ignore", method=method
+    )
 
 def main():
-    print("Starting rebate generation...")
-    
-    # Generate entries
-    entries = generate_rebate_entries()
-    print(f"\nGenerated {len(entries)} rebate entries")
-    
-    # Insert entries
-    print("\nInserting entries into database...")
-    insert_rebate_entries(entries)
-    print("\nDone!")
+    parser = argparse.ArgumentParser(description="Generate synthetic rebate entries")
+    parser.add_argument("--batched", action="store_true",
+                        help="Generate all entries with vectorized NumPy operations")
+    parser.add_argument("--max-entries", type=int, default=200,
+                        help="Maximum rebates per student")
+    parser.add_argument("--sharded", action="store_true",
+                        help="Batched generation split into seeded shards across worker processes")
+    parser.add_argument("--shard-by", choices=SHARD_MODES, default="hash",
+                        help="Shard students by roll number hash or by batch")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARD_COUNT,
+                        help="Number of hash shards; keep it fixed to reproduce a seed")
+    parser.add_argument("--workers", type=int, help="Worker processes for sharded mode (default: all cores)")
+    parser.add_argument("--seed", type=int, help="Random seed for batched and sharded modes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per INSERT statement")
+    parser.add_argument("--method", choices=METHODS, default="values",
+                        help="Multi-row VALUES statements or LOAD DATA LOCAL INFILE")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("generate_mass_rebates", args) as run:
+        print("Starting rebate generation...")
+
+        if not (args.sharded or args.batched):
+            # Generation, validation and inserts run as one streaming pipeline
+            counts = {}
+            with run.phase("generate_insert") as phase:
+                rows = counted(iter_rebate_rows(args.max_entries), counts)
+                phase.rows = insert_rebate_entries(rows, args.chunk_size, args.method)['inserted']
+            print(f"\nGenerated {counts['rows']} rebate entries")
+            print("\nDone!")
+            return
+
+        # Generate entries
+        with run.phase("generate") as phase:
+            if args.sharded:
+                count, rows = generate_rebate_rows_sharded(
+                    args.max_entries, args.seed, args.shard_by, args.shards, args.workers
+                )
+            else:
+                count, rows = generate_rebate_rows_batched(args.max_entries, args.seed)
+            phase.rows = count
+        print(f"\nGenerated {count} rebate entries")
+
+        # Insert entries
+        print("\nInserting entries into database...")
+        with run.phase("insert") as phase:
+            phase.rows = insert_rebate_entries(rows, args.chunk_size, args.method)['inserted']
+        print("\nDone!")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
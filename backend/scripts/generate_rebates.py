@@ -1,20 +1,26 @@
-import mysql.connector
+import argparse
 import random
-import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-
-# Load environment variables properly
-load_dotenv()
-
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=3306,
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
+import numpy as np
+import instrumentation
+from db import get_db_connection
+from batched_generation import generate_batched_entries
+from date_utils import to_epoch_day
+from rebate_records import RebateRecords
+from bulk_loader import METHODS, REBATE_COLUMNS, bulk_insert
+from async_pipeline import run_validate_and_insert
+
+# Define date ranges for each batch
+DATE_RANGES = {
+    2022: {
+        'start': datetime(2022, 12, 1),
+        'end': datetime(2025, 4, 1)
+    },
+    2023: {
+        'start': datetime(2023, 11, 1),
+        'end': datetime(2025, 4, 1)
+    }
+}
 
 def get_students():
     conn = get_db_connection()
@@ -44,52 +50,31 @@ def generate_random_date(start_date, end_date):
     random_days = random.randrange(days_between)
     return start_date + timedelta(days=random_days)
 
-def has_overlapping_rebate(roll_no, start_date, end_date):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
+OVERLAP_QUERY = """
+SELECT COUNT(*) FROM rebates 
+WHERE roll_no = %s 
+AND (
+    (start_date <= %s AND end_date >= %s) OR
+    (start_date <= %s AND end_date >= %s) OR
+    (start_date >= %s AND end_date <= %s)
+)
+"""
+
+def has_overlapping_rebate(cursor, roll_no, start_date, end_date):
     # Check for overlapping rebates
-    query = """
-    SELECT COUNT(*) FROM rebates 
-    WHERE roll_no = %s 
-    AND (
-        (start_date <= %s AND end_date >= %s) OR
-        (start_date <= %s AND end_date >= %s) OR
-        (start_date >= %s AND end_date <= %s)
-    )
-    """
-    cursor.execute(query, (roll_no, start_date, start_date, end_date, end_date, start_date, end_date))
+    cursor.execute(OVERLAP_QUERY, (roll_no, start_date, start_date, end_date, end_date, start_date, end_date))
     count = cursor.fetchone()[0]
 
-    cursor.close()
-    conn.close()
-
     return count > 0
 
-def generate_rebate_entries():
-    students_by_batch = get_students()
-
-    # Define date ranges for each batch
-    date_ranges = {
-        2022: {
-            'start': datetime(2022, 12, 1),
-            'end': datetime(2025, 4, 1)
-        },
-        2023: {
-            'start': datetime(2023, 11, 1),
-            'end': datetime(2025, 4, 1)
-        }
-    }
-
+def iter_candidate_entries(students_by_batch, target_entries=4000):
+    """Yield (roll_no, start_date, end_date, rebate_days) candidates before any overlap check"""
     total_students = sum(len(students) for students in students_by_batch.values())
     students_without_entries_count = int(total_students * 0.1)
 
     all_students = [roll_no for batch in students_by_batch.values() for roll_no in batch]
-    students_without_entries = random.sample(all_students, students_without_entries_count)
-
-    rebate_entries = []
-    total_entries = 0
-    seen_entries = set()  # Track (roll_no, start_date) pairs
+    students_without_entries = set(random.sample(all_students, students_without_entries_count))
+    batch_of = {roll_no: batch for batch, students in students_by_batch.items() for roll_no in students}
 
     # Create a list of eligible students (those who should have entries)
     eligible_students = [roll_no for roll_no in all_students if roll_no not in students_without_entries]
@@ -97,87 +82,179 @@ def generate_rebate_entries():
     # Shuffle the eligible students to ensure random distribution
     random.shuffle(eligible_students)
     
-    # Calculate target entries per student (4000 total entries)
-    target_entries = 4000
+    # Calculate target entries per student
     entries_per_student = target_entries // len(eligible_students)
     remaining_entries = target_entries % len(eligible_students)
 
     # Distribute entries among eligible students
     for roll_no in eligible_students:
-        if total_entries >= target_entries:
-            break
-
         # Calculate number of entries for this student
         num_entries = entries_per_student
         if remaining_entries > 0:
             num_entries += 1
             remaining_entries -= 1
 
-        # Get student's batch
-        batch = next(b for b, students in students_by_batch.items() if roll_no in students)
-
+        batch = batch_of[roll_no]
+        # Track start dates per student; a student's candidates are drawn together
+        seen_entries = set()
         for _ in range(num_entries):
-            if total_entries >= target_entries:
-                break
-
             start_date = generate_random_date(
-                date_ranges[batch]['start'],
-                date_ranges[batch]['end'] - timedelta(days=1)
+                DATE_RANGES[batch]['start'],
+                DATE_RANGES[batch]['end'] - timedelta(days=1)
             )
 
             end_date = start_date + timedelta(days=random.randint(1, 15))
             rebate_days = (end_date - start_date).days + 1
 
-            key = (roll_no, start_date.date())
+            key = start_date.date()
 
             if key in seen_entries:
                 continue
+            seen_entries.add(key)
+            yield roll_no, start_date, end_date, rebate_days
 
-            if not has_overlapping_rebate(roll_no, start_date, end_date):
-                seen_entries.add(key)
-                rebate_entries.append({
-                    'roll_no': roll_no,
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'rebate_days': rebate_days
-                })
-                total_entries += 1
+def generate_rebate_entries(target_entries=4000):
+    students_by_batch = get_students()
+    rebate_entries = []
+
+    # One pooled connection and prepared statement for every overlap check
+    conn = get_db_connection()
+    cursor = conn.cursor(prepared=True)
+
+    for roll_no, start_date, end_date, rebate_days in iter_candidate_entries(students_by_batch, target_entries):
+        if not has_overlapping_rebate(cursor, roll_no, start_date, end_date):
+            rebate_entries.append({
+                'roll_no': roll_no,
+                'start_date': start_date,
+                'end_date': end_date,
+                'rebate_days': rebate_days
+            })
+
+    cursor.close()
+    conn.close()
 
     return rebate_entries
 
-def insert_rebate_entries(entries):
+def generate_and_insert_async(target_entries=4000, pool_size=8, chunk_size=1000, queue_size=None):
+    """Generate, validate and insert concurrently through the asyncio pipeline.
+
+    The table is cleared first, so candidates are checked in memory
+    against the rows accepted so far in this run, without querying the
+    database.
+    """
+    students_by_batch = get_students()
+
     conn = get_db_connection()
     cursor = conn.cursor()
-
-    # Clear existing rebate entries
     cursor.execute("TRUNCATE TABLE rebates")
+    conn.commit()
+    cursor.close()
+    conn.close()
 
-    # Use INSERT IGNORE to skip duplicates
-    insert_query = """
-    INSERT IGNORE INTO rebates (roll_no, start_date, end_date, rebate_days)
-    VALUES (%s, %s, %s, %s)
-    """
+    return run_validate_and_insert(
+        iter_candidate_entries(students_by_batch, target_entries),
+        writers=pool_size,
+        chunk_size=chunk_size,
+        queue_size=queue_size
+    )
 
-    for entry in entries:
-        cursor.execute(insert_query, (
-            entry['roll_no'],
-            entry['start_date'],
-            entry['end_date'],
-            entry['rebate_days']
-        ))
+def generate_rebate_rows_batched(target_entries=4000, seed=None):
+    """Vectorized variant of generate_rebate_entries returning insert-ready rows"""
+    students_by_batch = get_students()
+    rng = np.random.default_rng(seed)
+
+    roll_nos = [roll_no for batch in students_by_batch.values() for roll_no in batch]
+    batches = np.array([batch for batch, students in students_by_batch.items() for _ in students])
+
+    # Same distribution as the loop version: 10% of students get no entries and
+    # the target is split evenly across the rest
+    eligible = rng.permutation(len(roll_nos))[int(len(roll_nos) * 0.1):]
+    targets = np.zeros(len(roll_nos), dtype=np.int64)
+    if len(eligible):
+        targets[eligible] = target_entries // len(eligible)
+        targets[eligible[:target_entries % len(eligible)]] += 1
+
+    window_starts = [to_epoch_day(DATE_RANGES[batch]['start']) for batch in batches]
+    window_ends = [to_epoch_day(DATE_RANGES[batch]['end']) for batch in batches]
+
+    # The table is truncated before inserting, so only new entries need checking
+    entries = generate_batched_entries(
+        targets,
+        window_starts,
+        window_ends,
+        max_duration=15,
+        rng=rng,
+        clip_to_window=False
+    )
+    records = RebateRecords.from_entries(entries, roll_nos)
+    return len(records), records.to_rows()
 
-    conn.commit()
+def insert_rebate_entries(rows, chunk_size=1000, method="values"):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Clear existing rebate entries
+    cursor.execute("TRUNCATE TABLE rebates")
     cursor.close()
-    conn.close()
 
-def main():
-    print("Generating rebate entries...")
-    entries = generate_rebate_entries()
-    print(f"Generated {len(entries)} rebate entries")
+    try:
+        # Use INSERT IGNORE to skip duplicates and commit once at the end
+        return bulk_insert(
+            conn, "rebates", REBATE_COLUMNS, rows,
+            chunk_size=chunk_size, mode="ignore", method=method, commit_per_chunk=False
+        )
+    finally:
+        conn.close()
 
-    print("Inserting entries into database...")
-    insert_rebate_entries(entries)
-    print("Done!")
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the rebates table with sample entries")
+    parser.add_argument("--batched", action="store_true",
+                        help="Generate all entries with vectorized NumPy operations")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Clear the table, then check overlaps in memory and insert chunks concurrently with asyncio")
+    parser.add_argument("--pool-size", type=int, default=8,
+                        help="Connections the asyncio pipeline inserts on")
+    parser.add_argument("--queue-size", type=int,
+                        help="Candidates waiting for validation before generation pauses (asyncio mode)")
+    parser.add_argument("--target", type=int, default=4000,
+                        help="Number of entries to generate")
+    parser.add_argument("--seed", type=int, help="Random seed for batched mode")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per INSERT statement")
+    parser.add_argument("--method", choices=METHODS, default="values",
+                        help="Multi-row VALUES statements or LOAD DATA LOCAL INFILE")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("generate_rebates", args) as run:
+        if args.use_async:
+            print("Generating, validating and inserting rebate entries...")
+            with run.phase("pipeline") as phase:
+                stats = generate_and_insert_async(args.target, args.pool_size, args.chunk_size, args.queue_size)
+                phase.rows = stats['inserted']
+            print(f"Checked {stats['checked']} candidates: {stats['accepted']} accepted, "
+                  f"{stats['rejected']} overlapping; inserted {stats['inserted']} rows in "
+                  f"{stats['chunks']} chunks ({stats['checked'] / max(stats['seconds'], 1e-9):.0f} checks/sec)")
+            print("Done!")
+            return
+
+        print("Generating rebate entries...")
+        with run.phase("generate") as phase:
+            if args.batched:
+                count, rows = generate_rebate_rows_batched(args.target, args.seed)
+            else:
+                entries = generate_rebate_entries(args.target)
+                count = len(entries)
+                rows = (
+                    (entry['roll_no'], entry['start_date'], entry['end_date'], entry['rebate_days'])
+                    for entry in entries
+                )
+            phase.rows = count
+        print(f"Generated {count} rebate entries")
+
+        print("Inserting entries into database...")
+        with run.phase("insert") as phase:
+            phase.rows = insert_rebate_entries(rows, args.chunk_size, args.method)['inserted']
+        print("Done!")
 
 if __name__ == "__main__":
     main()
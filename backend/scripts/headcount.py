@@ -0,0 +1,258 @@
+import argparse
+import csv
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+import instrumentation
+from db import get_db_connection
+from date_utils import from_epoch_day, to_epoch_day
+from snapshot import SNAPSHOT_DIR, Snapshot
+
+# Set bits in every byte value, for counting students straight from packed rows
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+GROUPINGS = ("branch", "batch", "both")
+
+
+class HeadcountIndex:
+    """Packed day x student bitset of who is on rebate over a date window.
+
+    Row d holds one bit per student (numpy.packbits order, big-endian within
+    each byte) that is set while the student is on rebate that day. Days
+    outside the window are not tracked. Each student's clipped periods are
+    kept, so add_rebate, remove_rebate and edit_rebate update the index in
+    place by setting or clearing only that student's bits, without a
+    rebuild.
+    """
+
+    def __init__(self, roll_nos, branches, batches, first_day, last_day):
+        self.roll_nos = list(roll_nos)
+        self.branches = np.asarray(branches, dtype=object)
+        self.batches = np.asarray(batches, dtype=np.int64)
+        self.positions = {roll_no: i for i, roll_no in enumerate(self.roll_nos)}
+        self.first_day = to_epoch_day(first_day)
+        self.last_day = to_epoch_day(last_day)
+        if self.last_day < self.first_day:
+            raise ValueError("last_day must not be before first_day")
+        self.bits = np.zeros(
+            (self.last_day - self.first_day + 1, (len(self.roll_nos) + 7) // 8), dtype=np.uint8
+        )
+        self.periods = {}
+
+    @classmethod
+    def load(cls, cursor, first_day, last_day, fetch_size=10000):
+        """Build the index from the students table and the rebates overlapping the window"""
+        cursor.execute("SELECT roll_no, branch, batch FROM students ORDER BY roll_no")
+        students = cursor.fetchall()
+        index = cls(
+            [row[0] for row in students], [row[1] for row in students], [row[2] for row in students],
+            first_day, last_day
+        )
+
+        cursor.execute(
+            "SELECT roll_no, start_date, end_date FROM rebates WHERE end_date >= %s AND start_date <= %s",
+            (from_epoch_day(index.first_day), from_epoch_day(index.last_day))
+        )
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            rows = [row for row in rows if row[0] in index.positions]
+            index.add_many(
+                [index.positions[row[0]] for row in rows],
+                [to_epoch_day(row[1]) for row in rows],
+                [to_epoch_day(row[2]) for row in rows]
+            )
+        return index
+
+    @classmethod
+    def from_snapshot(cls, snapshot, first_day, last_day):
+        """Build the index from a snapshot.Snapshot instead of the database"""
+        students = snapshot.students
+        index = cls(
+            students['roll_no'].tolist(),
+            students['branch_names'][students['branch']].tolist(),
+            students['batch'],
+            first_day, last_day
+        )
+        rebates = snapshot.rebates
+        overlapping = np.flatnonzero(
+            (rebates['end_day'] >= index.first_day) & (rebates['start_day'] <= index.last_day)
+        )
+        index.add_many(
+            rebates['student'][overlapping], rebates['start_day'][overlapping], rebates['end_day'][overlapping]
+        )
+        return index
+
+    def _set_bits(self, students, starts, ends, value=True):
+        """Set or clear bits for (student, start..end) ranges already clipped to the window"""
+        lengths = ends - starts + 1
+        keep = lengths > 0
+        students, starts, lengths = students[keep], starts[keep], lengths[keep]
+        if not len(students):
+            return
+
+        # One (row, student) pair per covered day
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.repeat(starts - self.first_day, lengths) + offsets
+        columns = np.repeat(students, lengths)
+        masks = (0x80 >> (columns & 7)).astype(np.uint8)
+        if value:
+            np.bitwise_or.at(self.bits, (rows, columns >> 3), masks)
+        else:
+            np.bitwise_and.at(self.bits, (rows, columns >> 3), ~masks)
+
+    def _clip(self, starts, ends):
+        return np.maximum(starts, self.first_day), np.minimum(ends, self.last_day)
+
+    def add_many(self, students, start_days, end_days):
+        """Add rebates given as student positions and epoch-day ranges"""
+        students = np.asarray(students, dtype=np.int64)
+        starts, ends = self._clip(
+            np.asarray(start_days, dtype=np.int64), np.asarray(end_days, dtype=np.int64)
+        )
+        for student, start, end in zip(students.tolist(), starts.tolist(), ends.tolist()):
+            if start <= end:
+                self.periods.setdefault(student, []).append((start, end))
+        self._set_bits(students, starts, ends)
+
+    def add_rebate(self, roll_no, start_date, end_date):
+        self.add_many([self._student(roll_no)], [to_epoch_day(start_date)], [to_epoch_day(end_date)])
+
+    def remove_rebate(self, roll_no, start_date, end_date):
+        """Remove one rebate, keeping days still covered by the student's other rebates"""
+        student = self._student(roll_no)
+        start, end = self._clip(to_epoch_day(start_date), to_epoch_day(end_date))
+        if start > end:
+            # Entirely outside the window, so it never set any bits
+            return
+        periods = self.periods.get(student, [])
+        if (start, end) not in periods:
+            raise KeyError(f"{roll_no} has no rebate from {start_date} to {end_date} in the index")
+        periods.remove((start, end))
+
+        self._set_bits(np.array([student], dtype=np.int64), np.array([start]), np.array([end]), False)
+        if periods:
+            self._set_bits(
+                np.full(len(periods), student, dtype=np.int64),
+                np.array([period[0] for period in periods]),
+                np.array([period[1] for period in periods])
+            )
+
+    def edit_rebate(self, roll_no, old_start, old_end, new_start, new_end):
+        self.remove_rebate(roll_no, old_start, old_end)
+        self.add_rebate(roll_no, new_start, new_end)
+
+    def _row(self, day):
+        row = to_epoch_day(day) - self.first_day
+        if not 0 <= row < len(self.bits):
+            raise KeyError(f"{day} is outside the indexed window")
+        return row
+
+    def _student(self, roll_no):
+        if roll_no not in self.positions:
+            raise KeyError(f"{roll_no} is not a student in the index")
+        return self.positions[roll_no]
+
+    def is_on_rebate(self, roll_no, day):
+        student = self._student(roll_no)
+        return bool(self.bits[self._row(day), student >> 3] & (0x80 >> (student & 7)))
+
+    def who_on_rebate(self, day):
+        """Roll numbers of every student on rebate on the given date"""
+        row = self.bits[self._row(day)]
+        # Unpack only the bytes with a bit set; most students are eating on any given day
+        occupied = np.flatnonzero(row)
+        flags = np.unpackbits(row[occupied]).reshape(-1, 8).astype(bool)
+        students = (occupied[:, None] * 8 + np.arange(8))[flags]
+        return [self.roll_nos[i] for i in students.tolist()]
+
+    def group_masks(self, by="branch"):
+        """Return (group labels, packed student mask per group)"""
+        if by == "branch":
+            keys = self.branches
+        elif by == "batch":
+            keys = self.batches
+        else:
+            keys = np.array([f"{branch}/{batch}" for branch, batch in zip(self.branches, self.batches)], dtype=object)
+        labels, codes = np.unique(keys.astype(str), return_inverse=True)
+        membership = np.zeros((len(labels), len(self.roll_nos)), dtype=bool)
+        membership[codes, np.arange(len(self.roll_nos))] = True
+        return labels.tolist(), np.packbits(membership, axis=1)
+
+    def daily_headcount(self, start_date, end_date, by="branch"):
+        """Students eating each day, per group, as (days, labels, counts[day, group])"""
+        first, last = self._row(start_date), self._row(end_date)
+        labels, masks = self.group_masks(by)
+        group_sizes = POPCOUNT[masks].sum(axis=1)
+
+        # AND each day row with each group mask and count bits without unpacking
+        rows = self.bits[first:last + 1]
+        on_rebate = np.stack([POPCOUNT[rows & mask].sum(axis=1) for mask in masks], axis=1)
+        days = [from_epoch_day(self.first_day + row) for row in range(first, last + 1)]
+        return days, labels, group_sizes - on_rebate
+
+
+def write_report(days, labels, counts, output_format, handle):
+    if output_format == "csv":
+        writer = csv.writer(handle)
+        writer.writerow(["date", *labels, "total"])
+        for day, row in zip(days, counts.tolist()):
+            writer.writerow([day.isoformat(), *row, sum(row)])
+        return
+
+    width = max([10] + [len(label) for label in labels])
+    print("date        " + " ".join(f"{label:>{width}}" for label in labels) + f" {'total':>{width}}", file=handle)
+    for day, row in zip(days, counts.tolist()):
+        print(f"{day.isoformat()}  " + " ".join(f"{value:>{width}}" for value in row) + f" {sum(row):>{width}}", file=handle)
+
+
+def report_headcount(args, run):
+    first_day = args.who or args.start
+    last_day = first_day if args.who else args.start + timedelta(days=args.days - 1)
+
+    with run.phase("build_index") as phase:
+        if args.snapshot:
+            snapshot = Snapshot(args.snapshot)
+            print(f"Using snapshot taken at {snapshot.created_at}", file=sys.stderr)
+            index = HeadcountIndex.from_snapshot(snapshot, first_day, last_day)
+        else:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            index = HeadcountIndex.load(cursor, first_day, last_day)
+            cursor.close()
+            conn.close()
+        phase.rows = len(index.roll_nos)
+
+    if args.who:
+        roll_nos = index.who_on_rebate(args.who)
+        print(f"{len(roll_nos)} students on rebate on {args.who}")
+        for roll_no in roll_nos:
+            print(roll_no)
+        return
+
+    days, labels, counts = index.daily_headcount(first_day, last_day, args.by)
+    write_report(days, labels, counts, args.format, sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily mess headcount forecast from rebates")
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today(), help="First day (default: today)")
+    parser.add_argument("--days", type=int, default=14, help="Number of days to report")
+    parser.add_argument("--by", choices=GROUPINGS, default="branch", help="Group headcounts by")
+    parser.add_argument("--who", type=date.fromisoformat, metavar="DATE",
+                        help="List students on rebate on this date instead")
+    parser.add_argument("--format", choices=("table", "csv"), default="table")
+    parser.add_argument("--snapshot", nargs="?", const=SNAPSHOT_DIR, metavar="DIR",
+                        help="Read a snapshot from snapshot.py instead of querying the database")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("headcount", args) as run:
+        report_headcount(args, run)
+
+
+if __name__ == "__main__":
+    main()
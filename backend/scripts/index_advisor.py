@@ -0,0 +1,402 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+from datetime import date, datetime
+
+import db
+from benchmark import BENCHMARK_DIR, DEFAULT_SQLITE_PATH, SCALES, StageTimer, seed_database
+from generate_rebates import OVERLAP_QUERY
+
+LIST_SELECT = """
+SELECT r.roll_no, s.name, s.branch, s.batch,
+       r.start_date, r.end_date, r.rebate_days, r.gate_pass_no
+FROM rebates r
+JOIN students s ON r.roll_no = s.roll_no
+"""
+
+# Sargable form of the overlap predicate: for periods with start <= end the
+# three-way OR is the same as "starts before the new end and ends after the new start"
+OVERLAP_REWRITE = """
+SELECT COUNT(*) FROM rebates
+WHERE roll_no = %s AND start_date <= %s AND end_date >= %s
+"""
+
+
+def _year_range(sample):
+    return date(sample['year'], 1, 1), date(sample['year'] + 1, 1, 1)
+
+
+# name -> (caller, query, params(sample), sargable rewrite or None, rewrite params(sample))
+QUERY_SHAPES = {
+    "all_rebates": (
+        "rebateRepository.fetchAllRebates",
+        LIST_SELECT + "ORDER BY r.start_date DESC",
+        lambda sample: (),
+        None, None
+    ),
+    "filtered_page": (
+        "rebateRepository.fetchFilteredRebates",
+        LIST_SELECT + "WHERE 1=1 AND YEAR(r.start_date) = %s AND s.branch = %s AND s.batch = %s "
+                      "ORDER BY r.start_date DESC LIMIT %s OFFSET %s",
+        lambda sample: (sample['year'], sample['branch'], sample['batch'], 1000, 0),
+        LIST_SELECT + "WHERE 1=1 AND r.start_date >= %s AND r.start_date < %s AND s.branch = %s AND s.batch = %s "
+                      "ORDER BY r.start_date DESC LIMIT %s OFFSET %s",
+        lambda sample: (*_year_range(sample), sample['branch'], sample['batch'], 1000, 0)
+    ),
+    "filtered_all": (
+        "rebateRepository.fetchAllFilteredRebates",
+        LIST_SELECT + "WHERE 1=1 AND YEAR(r.start_date) = %s ORDER BY r.start_date DESC",
+        lambda sample: (sample['year'],),
+        LIST_SELECT + "WHERE 1=1 AND r.start_date >= %s AND r.start_date < %s ORDER BY r.start_date DESC",
+        lambda sample: _year_range(sample)
+    ),
+    "overview_stats": (
+        "rebateRepository.getOverviewStats",
+        """
+        SELECT COUNT(*) as totalRebates, SUM(r.rebate_days) as totalDays,
+               COUNT(DISTINCT r.roll_no) as uniqueStudents
+        FROM rebates r
+        JOIN students s ON r.roll_no = s.roll_no
+        WHERE 1=1 AND YEAR(r.start_date) = %s
+        """,
+        lambda sample: (sample['year'],),
+        """
+        SELECT COUNT(*) as totalRebates, SUM(r.rebate_days) as totalDays,
+               COUNT(DISTINCT r.roll_no) as uniqueStudents
+        FROM rebates r
+        JOIN students s ON r.roll_no = s.roll_no
+        WHERE 1=1 AND r.start_date >= %s AND r.start_date < %s
+        """,
+        lambda sample: _year_range(sample)
+    ),
+    "overlap_check": (
+        "rebateRepository.checkOverlappingRebates, generate_rebates.has_overlapping_rebate",
+        OVERLAP_QUERY,
+        lambda sample: (
+            sample['roll_no'], sample['start'], sample['start'], sample['end'],
+            sample['end'], sample['start'], sample['end']
+        ),
+        OVERLAP_REWRITE,
+        lambda sample: (sample['roll_no'], sample['end'], sample['start'])
+    ),
+}
+
+# Schema changes the advisor can propose, with the query shapes each one serves
+PROPOSALS = {
+    "start_year": {
+        'reason': "YEAR(r.start_date) = ? hides start_date from every index; index the year itself",
+        'helps': ("filtered_page", "filtered_all", "overview_stats"),
+        'table': "rebates",
+        'index': "idx_rebates_start_year",
+        # MySQL matches YEAR(start_date) in queries to the generated column, so
+        # the repository queries use the index unchanged. Adding a STORED column
+        # rebuilds the table.
+        'mysql': [
+            "ALTER TABLE rebates ADD COLUMN start_year SMALLINT GENERATED ALWAYS AS (YEAR(start_date)) STORED",
+            "CREATE INDEX idx_rebates_start_year ON rebates (start_year, start_date)",
+        ],
+        'mysql_drop': [
+            "DROP INDEX idx_rebates_start_year ON rebates",
+            "ALTER TABLE rebates DROP COLUMN start_year",
+        ],
+        # Same expression db.translate_query produces for YEAR()
+        'sqlite': [
+            "CREATE INDEX idx_rebates_start_year ON rebates (CAST(strftime('%Y', start_date) AS INTEGER), start_date)",
+        ],
+        'sqlite_drop': ["DROP INDEX idx_rebates_start_year"],
+    },
+    "start_date": {
+        'reason': "ORDER BY r.start_date DESC sorts every row; an index on start_date returns them in order",
+        'helps': ("all_rebates", "filtered_all"),
+        'table': "rebates",
+        'index': "idx_rebates_start_date",
+        'mysql': ["CREATE INDEX idx_rebates_start_date ON rebates (start_date)"],
+        'mysql_drop': ["DROP INDEX idx_rebates_start_date ON rebates"],
+        'sqlite': ["CREATE INDEX idx_rebates_start_date ON rebates (start_date)"],
+        'sqlite_drop': ["DROP INDEX idx_rebates_start_date"],
+    },
+    "roll_no_end_date": {
+        'reason': "the overlap check filters each student's rebates on end_date as well as start_date",
+        'helps': ("overlap_check",),
+        'table': "rebates",
+        'index': "idx_rebates_roll_no_end_date",
+        'mysql': ["CREATE INDEX idx_rebates_roll_no_end_date ON rebates (roll_no, end_date)"],
+        'mysql_drop': ["DROP INDEX idx_rebates_roll_no_end_date ON rebates"],
+        'sqlite': ["CREATE INDEX idx_rebates_roll_no_end_date ON rebates (roll_no, end_date)"],
+        'sqlite_drop': ["DROP INDEX idx_rebates_roll_no_end_date"],
+    },
+    "students_batch_branch": {
+        'reason': "branch and batch filters scan the whole students table before the join",
+        'helps': ("filtered_page",),
+        'table': "students",
+        'index': "idx_students_batch_branch",
+        'mysql': ["CREATE INDEX idx_students_batch_branch ON students (batch, branch)"],
+        'mysql_drop': ["DROP INDEX idx_students_batch_branch ON students"],
+        'sqlite': ["CREATE INDEX idx_students_batch_branch ON students (batch, branch)"],
+        'sqlite_drop': ["DROP INDEX idx_students_batch_branch"],
+    },
+}
+
+_FUNCTION_ON_COLUMN = re.compile(
+    r"\b(YEAR|MONTH|DAY|DATE|DATE_FORMAT|LOWER|UPPER)\(\s*([\w.]+)[^)]*\)\s*(=|<|>|BETWEEN|IN)",
+    re.IGNORECASE
+)
+_OR_OF_GROUPS = re.compile(r"\)\s*OR\s*\(", re.IGNORECASE)
+
+
+def sargability_issues(query):
+    """Predicates in the WHERE clause that keep an index from being used"""
+    where = re.split(r"\bWHERE\b", query, maxsplit=1, flags=re.IGNORECASE)
+    if len(where) < 2:
+        return []
+    where = re.split(r"\b(ORDER|GROUP)\s+BY\b|\bLIMIT\b", where[1], maxsplit=1, flags=re.IGNORECASE)[0]
+    issues = [
+        f"{match.group(1).upper()}({match.group(2)}) hides {match.group(2)} from indexes; "
+        f"compare {match.group(2)} with a range instead"
+        for match in _FUNCTION_ON_COLUMN.finditer(where)
+    ]
+    if _OR_OF_GROUPS.search(where):
+        issues.append("OR of range conditions; rewrite as a single range so one index range can serve it")
+    return issues
+
+
+def explain(cursor, query, params):
+    """Return (plan lines, flags) for a query on the configured backend"""
+    if db.is_sqlite():
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        lines = [row[3] for row in cursor.fetchall()]
+        flags = []
+        for line in lines:
+            match = re.match(r"SCAN (\w+)", line)
+            if match:
+                flags.append(f"full {'index ' if 'INDEX' in line else ''}scan of {match.group(1)}")
+            if "TEMP B-TREE" in line:
+                flags.append("filesort" if "ORDER BY" in line else "temporary table")
+        return lines, flags
+
+    cursor.execute("EXPLAIN " + query, params)
+    columns = [column[0] for column in cursor.description]
+    lines, flags = [], []
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        extra = plan.get('Extra') or ""
+        lines.append(f"{plan['table']}: type={plan['type']} key={plan['key']} rows={plan['rows']} {extra}".strip())
+        if plan['type'] == "ALL":
+            flags.append(f"full scan of {plan['table']}")
+        elif plan['type'] == "index":
+            flags.append(f"full index scan of {plan['table']}")
+        if "Using filesort" in extra:
+            flags.append(f"filesort on {plan['table']}")
+        if "Using temporary" in extra:
+            flags.append(f"temporary table for {plan['table']}")
+    return lines, flags
+
+
+def time_query(cursor, query, params, repeat):
+    """Median wall-clock seconds over repeat runs, and the row count"""
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        rows = len(cursor.fetchall())
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), rows
+
+
+def sample_parameters(cursor):
+    """Pick filter values that match real rows: the busiest year and a student with rebates"""
+    cursor.execute("""
+    SELECT YEAR(start_date), COUNT(*) FROM rebates
+    GROUP BY YEAR(start_date) ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    row = cursor.fetchone()
+    year = row[0] if row else date.today().year
+
+    cursor.execute("""
+    SELECT r.roll_no, s.branch, s.batch, r.start_date, r.end_date
+    FROM rebates r JOIN students s ON r.roll_no = s.roll_no
+    LIMIT 1
+    """)
+    row = cursor.fetchone()
+    if row is None:
+        raise SystemExit("No rebates to audit; load some data or use --scales")
+    roll_no, branch, batch, start, end = row
+    return {'year': int(year), 'branch': branch, 'batch': batch, 'roll_no': roll_no, 'start': start, 'end': end}
+
+
+def audit(conn, repeat=5):
+    """EXPLAIN and time every query shape (and its sargable rewrite)"""
+    cursor = conn.cursor()
+    sample = sample_parameters(cursor)
+    results = {}
+    for name, (caller, query, params, rewrite, rewrite_params) in QUERY_SHAPES.items():
+        plan, flags = explain(cursor, query, params(sample))
+        seconds, rows = time_query(cursor, query, params(sample), repeat)
+        result = {
+            'caller': caller,
+            'seconds': seconds,
+            'rows': rows,
+            'plan': plan,
+            'flags': flags,
+            'sargability': sargability_issues(query),
+        }
+        if rewrite is not None:
+            result['rewrite_seconds'], _ = time_query(cursor, rewrite, rewrite_params(sample), repeat)
+        results[name] = result
+    cursor.close()
+    return results
+
+
+def print_audit(results):
+    for name, result in results.items():
+        print(f"\n{name} ({result['caller']}): {result['seconds'] * 1000:.2f} ms, {result['rows']} rows")
+        for line in result['plan']:
+            print(f"    {line}")
+        for flag in result['flags']:
+            print(f"  !! {flag}")
+        for issue in result['sargability']:
+            print(f"  sargability: {issue}")
+        if 'rewrite_seconds' in result:
+            print(f"  sargable rewrite: {result['rewrite_seconds'] * 1000:.2f} ms")
+
+
+def propose(results):
+    """Names of proposals that serve at least one flagged or non-sargable query shape"""
+    flagged = {name for name, result in results.items() if result['flags'] or result['sargability']}
+    return [name for name, proposal in PROPOSALS.items() if flagged.intersection(proposal['helps'])]
+
+
+def _index_exists(cursor, table, index):
+    if db.is_sqlite():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = %s", (index,))
+    else:
+        cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index,))
+    return bool(cursor.fetchall())
+
+
+def apply_proposals(conn, names, drop=False):
+    """Create (or with drop=True remove) the given proposals; returns the names changed"""
+    key = ("sqlite" if db.is_sqlite() else "mysql") + ("_drop" if drop else "")
+    cursor = conn.cursor()
+    changed = []
+    try:
+        for name in names:
+            proposal = PROPOSALS[name]
+            if _index_exists(cursor, proposal['table'], proposal['index']) == drop:
+                for statement in proposal[key]:
+                    cursor.execute(statement)
+                changed.append(name)
+        conn.commit()
+    finally:
+        cursor.close()
+    return changed
+
+
+def print_comparison(before, after):
+    print(f"\n{'query':<16} {'before':>10} {'after':>10} {'speedup':>8}")
+    for name, result in before.items():
+        after_seconds = after[name]['seconds']
+        speedup = result['seconds'] / after_seconds if after_seconds > 0 else float("inf")
+        print(f"{name:<16} {result['seconds'] * 1000:>8.2f}ms {after_seconds * 1000:>8.2f}ms {speedup:>7.1f}x")
+        for flag in after[name]['flags']:
+            print(f"  still: {flag}")
+
+
+def advise(conn, repeat, apply_names=None):
+    """Audit, print proposals, and optionally apply them and audit again"""
+    before = audit(conn, repeat)
+    print_audit(before)
+
+    names = propose(before)
+    print("\nProposed changes:" if names else "\nNo changes proposed")
+    dialect = "sqlite" if db.is_sqlite() else "mysql"
+    for name in names:
+        print(f"\n  {name}: {PROPOSALS[name]['reason']}")
+        for statement in PROPOSALS[name][dialect]:
+            print(f"    {statement};")
+
+    if apply_names is None:
+        return {'before': before, 'proposed': names}
+
+    changed = apply_proposals(conn, apply_names or names)
+    print(f"\nApplied: {', '.join(changed) or 'nothing (already present)'}")
+    after = audit(conn, repeat)
+    print_comparison(before, after)
+    return {'before': before, 'proposed': names, 'applied': changed, 'after': after}
+
+
+def run_scales(scales, seed, workers, repeat):
+    """Seed each scale into an empty database and report latency before and after the proposals"""
+    results = {}
+    for name in scales:
+        student_count, rebate_count = SCALES[name]
+        print(f"\nScale {name}: {student_count} students, {rebate_count} rebates")
+        if not db.is_sqlite():
+            # reset_database only deletes rows on MySQL, so the previous scale's
+            # indexes and columns would otherwise skew the "before" figures
+            conn = db.get_db_connection()
+            try:
+                apply_proposals(conn, list(PROPOSALS), drop=True)
+            finally:
+                conn.close()
+        with tempfile.TemporaryDirectory() as work_dir:
+            seed_database(student_count, rebate_count, seed, workers, work_dir, StageTimer())
+        conn = db.get_db_connection()
+        try:
+            results[name] = advise(conn, repeat, apply_names=[])
+        finally:
+            conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the repository query shapes and propose supporting indexes")
+    parser.add_argument("--apply", nargs="*", choices=list(PROPOSALS), metavar="PROPOSAL",
+                        help="Apply the proposed changes (or only those named) and time the queries again")
+    parser.add_argument("--drop", action="store_true", help="Remove every change this tool can apply and exit")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the median is reported")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES),
+                        help="Seed a scratch database at each scale and report before/after latency")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for the roster import")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--allow-mysql", action="store_true",
+                        help="With --scales, run against the configured MySQL database; it is emptied for every scale")
+    args = parser.parse_args()
+
+    if args.scales:
+        if db.is_sqlite():
+            os.environ["SQLITE_PATH"] = os.getenv("BENCHMARK_SQLITE_PATH") or DEFAULT_SQLITE_PATH
+        elif not args.allow_mysql:
+            parser.error("--scales deletes every student and rebate; use DB_BACKEND=sqlite "
+                         "or point DB_NAME at a scratch database and pass --allow-mysql")
+        results = {'scales': run_scales(args.scales, args.seed, args.workers, args.repeat)}
+        args.output = args.output or os.path.join(
+            BENCHMARK_DIR, f"index_advisor_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+    else:
+        conn = db.get_db_connection()
+        try:
+            if args.drop:
+                changed = apply_proposals(conn, list(PROPOSALS), drop=True)
+                print(f"Dropped: {', '.join(changed) or 'nothing'}")
+                return
+            results = advise(conn, args.repeat, args.apply)
+        finally:
+            conn.close()
+
+    results['backend'] = db.BACKEND
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, default=str)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import csv
+import os
+from datetime import date
+
+import pandas as pd
+
+import instrumentation
+from bulk_loader import REBATE_COLUMNS, bulk_insert
+from db import column_exists, get_db_connection
+from interval_index import RebateIntervalIndex
+
+# Log header -> rebates column; snake_case headers are accepted as they are
+LOG_COLUMNS = {
+    "Roll No": "roll_no",
+    "Start Date": "start_date",
+    "End Date": "end_date",
+    "Gate Pass No": "gate_pass_no",
+}
+
+INGEST_COLUMNS = REBATE_COLUMNS + ("gate_pass_no",)
+
+# Same rules as createRebateEntry in rebateController.js
+GATE_PASS_FORMAT = r"^[A-Z]-\d+$"
+GATE_PASS_MAX_LENGTH = 10
+
+REPORT_COLUMNS = ("line", "roll_no", "start_date", "end_date", "gate_pass_no", "reason")
+
+
+def read_gate_pass_log(path, dayfirst=False):
+    """Read a CSV or XLSX gate pass log into roll_no, start_date, end_date, gate_pass_no columns.
+
+    Dates become datetime.date (None where they cannot be parsed), identifiers
+    are stripped text, and a line column keeps the spreadsheet row number
+    (header = 1) for the reject report.
+    """
+    if path.lower().endswith((".xlsx", ".xls")):
+        # Needs openpyxl (xlsx) or xlrd (xls)
+        df = pd.read_excel(path, dtype=object)
+    else:
+        df = pd.read_csv(path, dtype=str, skipinitialspace=True)
+
+    df = df.rename(columns=lambda header: LOG_COLUMNS.get(str(header).strip(), str(header).strip()))
+    missing = [column for column in LOG_COLUMNS.values() if column not in df.columns]
+    if missing:
+        raise ValueError(f"{path} has no {', '.join(missing)} column (expected headers: {', '.join(LOG_COLUMNS)})")
+
+    df = df[list(LOG_COLUMNS.values())].copy()
+    df.insert(0, "line", df.index + 2)
+    for column in ("roll_no", "gate_pass_no"):
+        text = df[column].astype(str).str.strip().astype(object)
+        df[column] = text.mask(df[column].isna() | text.str.lower().isin(["", "nan"]), None)
+    df["gate_pass_no"] = df["gate_pass_no"].str.upper()
+    for column in ("start_date", "end_date"):
+        parsed = pd.to_datetime(df[column], errors="coerce", dayfirst=dayfirst, format="mixed")
+        df[column] = parsed.dt.date.astype(object).where(parsed.notna(), None)
+    return df
+
+
+def load_students(cursor, roll_nos, students_per_query=500):
+    """Map lower-cased roll numbers to the stored ones, for the students in the log"""
+    # MySQL's default collation already matches roll numbers case-insensitively
+    roll_nos = sorted(set(roll_nos))
+    students = {}
+    for i in range(0, len(roll_nos), students_per_query):
+        batch = roll_nos[i:i + students_per_query]
+        cursor.execute(
+            f"SELECT roll_no FROM students WHERE roll_no IN ({', '.join(['%s'] * len(batch))})",
+            batch
+        )
+        students.update((str(roll_no).lower(), roll_no) for (roll_no,) in cursor.fetchall())
+    return students
+
+
+def load_used_gate_passes(cursor, gate_passes, per_query=500):
+    gate_passes = sorted(set(gate_passes))
+    used = set()
+    for i in range(0, len(gate_passes), per_query):
+        batch = gate_passes[i:i + per_query]
+        cursor.execute(
+            f"SELECT gate_pass_no FROM rebates WHERE gate_pass_no IN ({', '.join(['%s'] * len(batch))})",
+            batch
+        )
+        used.update(str(gate_pass).upper() for (gate_pass,) in cursor.fetchall())
+    return used
+
+
+def load_rebates_between(cursor, first_day, last_day):
+    """Index every rebate that intersects [first_day, last_day] with one ranged query"""
+    index = RebateIntervalIndex()
+    cursor.execute(
+        "SELECT roll_no, start_date, end_date FROM rebates WHERE start_date <= %s AND end_date >= %s",
+        (last_day, first_day)
+    )
+    for roll_no, start_date, end_date in cursor:
+        index.add(roll_no, start_date, end_date)
+    return index
+
+
+def split_log(conn, df):
+    """Validate a gate pass log against the database and itself.
+
+    Field checks run on whole columns. Overlaps are then checked row by row
+    in file order against one in-memory index holding the stored rebates of
+    the log's date span plus the rows accepted so far, so the first of two
+    clashing rows in the file wins. Returns (rows, rejects): insert-ready
+    tuples in INGEST_COLUMNS order and report dicts with a reason.
+    """
+    cursor = conn.cursor()
+    if not column_exists(cursor, "rebates", "gate_pass_no"):
+        cursor.close()
+        raise RuntimeError("rebates has no gate_pass_no column; run update_rebates_schema.js first")
+
+    has_dates = df["start_date"].notna() & df["end_date"].notna()
+    students = load_students(cursor, df["roll_no"].dropna())
+    used = load_used_gate_passes(cursor, df["gate_pass_no"].dropna())
+    if has_dates.any():
+        index = load_rebates_between(cursor, df.loc[has_dates, "start_date"].min(), df.loc[has_dates, "end_date"].max())
+    else:
+        index = RebateIntervalIndex()
+    cursor.close()
+
+    gate_pass = df["gate_pass_no"].fillna("")
+    missing = df["roll_no"].isna() | df["gate_pass_no"].isna()
+    remaining = ~missing
+    checks = [(missing, "Missing roll_no or gate_pass_no")]
+    for mask, reason in (
+        (~has_dates, "Start or end date missing or not a date"),
+        (pd.to_datetime(df["end_date"]) <= pd.to_datetime(df["start_date"]), "End date must be after start date"),
+        (~gate_pass.str.match(GATE_PASS_FORMAT), "Gate Pass Number must be in the format A-31287"),
+        (gate_pass.str.len() > GATE_PASS_MAX_LENGTH,
+         f"Gate Pass Number must not exceed {GATE_PASS_MAX_LENGTH} characters"),
+        (~df["roll_no"].fillna("").str.lower().isin(students), "Student not found"),
+        (gate_pass.isin(used), "Gate Pass Number already exists"),
+    ):
+        mask = remaining & mask
+        remaining &= ~mask
+        checks.append((mask, reason))
+
+    reasons = pd.Series(None, index=df.index, dtype=object)
+    for mask, reason in checks:
+        reasons[mask] = reason
+
+    rows = []
+    accepted_lines = {}
+    gate_pass_lines = {}
+    for label, row in zip(df.index, df.itertuples(index=False)):
+        reason = reasons.at[label]
+        if pd.isna(reason):
+            roll_no = students[row.roll_no.lower()]
+            conflict = index.overlapping(roll_no, row.start_date, row.end_date)
+            if row.gate_pass_no in gate_pass_lines:
+                reason = f"Gate Pass Number repeats line {gate_pass_lines[row.gate_pass_no]}"
+            elif conflict is not None:
+                start, end = (date.fromordinal(day) for day in conflict)
+                line = accepted_lines.get((roll_no, start, end))
+                reason = (f"Overlaps line {line} of this file" if line is not None
+                          else f"Overlaps existing rebate {start} to {end}")
+            else:
+                index.add(roll_no, row.start_date, row.end_date)
+                accepted_lines[(roll_no, row.start_date, row.end_date)] = row.line
+                gate_pass_lines[row.gate_pass_no] = row.line
+                # Inclusive count, like calculateRebateDays in the frontend
+                rebate_days = (row.end_date - row.start_date).days + 1
+                rows.append((roll_no, row.start_date, row.end_date, rebate_days, row.gate_pass_no))
+                continue
+        reasons.at[label] = reason
+
+    rejected = reasons.notna()
+    rejects = df.loc[rejected].assign(reason=reasons[rejected])[list(REPORT_COLUMNS)].to_dict("records")
+    return rows, rejects
+
+
+def write_reject_report(path, rejects):
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rejects)
+
+
+def default_report_path(log_path):
+    return os.path.splitext(log_path)[0] + "_rejects.csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a day's gate pass log and insert the rebates in one transaction")
+    parser.add_argument("path", help="CSV or XLSX file with Roll No, Start Date, End Date and Gate Pass No columns")
+    parser.add_argument("--dayfirst", action="store_true", help="Read ambiguous dates like 03/04/2024 as 3 April")
+    parser.add_argument("--rejects", help="Reject report path (default: <log>_rejects.csv next to the log)")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and write the reject report without inserting")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per INSERT statement")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("ingest_gate_passes", args) as run:
+        with run.phase("read") as phase:
+            df = read_gate_pass_log(args.path, args.dayfirst)
+            phase.rows = len(df)
+        print(f"Read {len(df)} gate passes from {args.path}")
+
+        conn = get_db_connection()
+        try:
+            with run.phase("validate") as phase:
+                rows, rejects = split_log(conn, df)
+                phase.rows = len(df)
+
+            inserted = 0
+            if rows and not args.dry_run:
+                with run.phase("insert") as phase:
+                    # One transaction: either the whole log goes in or nothing does
+                    report = bulk_insert(
+                        conn, "rebates", INGEST_COLUMNS, rows,
+                        chunk_size=args.chunk_size, commit_per_chunk=False, verbose=False
+                    )
+                    inserted = phase.rows = report['inserted']
+        finally:
+            conn.close()
+
+        if args.dry_run:
+            print(f"Dry run: {len(rows)} rebates would be inserted")
+        else:
+            print(f"Inserted {inserted} rebates")
+
+        if rejects:
+            report_path = args.rejects or default_report_path(args.path)
+            write_reject_report(report_path, rejects)
+            print(f"Rejected {len(rejects)} rows, see {report_path}")
+            for reject in rejects[:5]:
+                print(f"- line {reject['line']} ({reject['roll_no']}): {reject['reason']}")
+        else:
+            print("No rows rejected")
+
+
+if __name__ == "__main__":
+    main()
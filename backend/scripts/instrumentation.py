@@ -0,0 +1,271 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import db
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory is reported as None
+    resource = None
+
+# Run reports live next to the imported data files
+REPORT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "reports"))
+
+# Statements are grouped by their first characters so multi-row INSERTs of any size share a key
+STATEMENT_KEY_LENGTH = 120
+
+
+def add_arguments(parser):
+    """Add the shared --profile / --report options to a script's parser"""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--profile", nargs="?", const=True, metavar="PSTATS",
+                       help="Run under cProfile, print the hottest functions and optionally save the stats")
+    group.add_argument("--report", help="JSON run report path (default: backend/data/reports/<script>_<time>.json)")
+    group.add_argument("--no-report", action="store_true", help="Do not write a JSON run report")
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def statement_key(query):
+    return re.sub(r"\s+", " ", query).strip()[:STATEMENT_KEY_LENGTH]
+
+
+class QueryStats:
+    """Counts and latency per statement shape"""
+
+    def __init__(self):
+        self.statements = {}
+        self.count = 0
+        self.seconds = 0.0
+
+    def record(self, key, seconds, executed=True):
+        entry = self.statements.setdefault(key, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        if executed:
+            entry['count'] += 1
+            self.count += 1
+        entry['seconds'] += seconds
+        entry['max_seconds'] = max(entry['max_seconds'], seconds)
+        self.seconds += seconds
+
+    def top(self, limit=20):
+        ranked = sorted(self.statements.items(), key=lambda item: item[1]['seconds'], reverse=True)
+        return [
+            {
+                'statement': key,
+                'count': entry['count'],
+                'seconds': round(entry['seconds'], 4),
+                'max_seconds': round(entry['max_seconds'], 4),
+                'avg_ms': round(entry['seconds'] / entry['count'] * 1000, 3) if entry['count'] else None
+            }
+            for key, entry in ranked[:limit]
+        ]
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute/executemany and the fetches that follow them"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._key = None
+
+    def _executed(self, query, started):
+        self._key = statement_key(query)
+        self._stats.record(self._key, time.perf_counter() - started)
+
+    def execute(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, *args, **kwargs)
+        finally:
+            self._executed(query, started)
+
+    def executemany(self, query, seq_of_params):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_of_params)
+        finally:
+            self._executed(query, started)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._key is not None:
+                # Streaming cursors do most of their work while fetching
+                self._stats.record(self._key, time.perf_counter() - started, executed=False)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, stats):
+        self._conn = conn
+        self._stats = stats
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._stats)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class Phase:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+
+    def add_rows(self, count):
+        self.rows = (self.rows or 0) + count
+
+
+class Run:
+    """Phase timers, query statistics and optional profiling for one script run.
+
+    While the run is active every connection from db.get_db_connection() is
+    wrapped so its queries are counted and timed. finish() prints a short
+    summary and writes the JSON report.
+    """
+
+    def __init__(self, name, profile=None, report_path=None, write_report=True):
+        self.name = name
+        self.profile = profile
+        self.report_path = report_path
+        self.write_report = write_report
+        self.queries = QueryStats()
+        self.phases = []
+        self._profiler = None
+        self._started = None
+        self._started_at = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._started_at = datetime.now().isoformat(timespec="seconds")
+        db.set_connection_wrapper(lambda conn: InstrumentedConnection(conn, self.queries))
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    @contextmanager
+    def phase(self, name):
+        """Time a named phase; set phase.rows or call add_rows() to get rows/sec"""
+        phase = Phase(name)
+        queries_before, query_seconds_before = self.queries.count, self.queries.seconds
+        started = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            seconds = time.perf_counter() - started
+            record = {
+                'name': name,
+                'seconds': round(seconds, 4),
+                'rows': phase.rows,
+                'rows_per_sec': round(phase.rows / seconds, 1) if phase.rows and seconds > 0 else None,
+                'queries': self.queries.count - queries_before,
+                'query_seconds': round(self.queries.seconds - query_seconds_before, 4),
+                'peak_memory_mb': peak_memory_mb()
+            }
+            self.phases.append(record)
+
+    def _profile_summary(self):
+        self._profiler.disable()
+        if isinstance(self.profile, str):
+            self._profiler.dump_stats(self.profile)
+        output = io.StringIO()
+        pstats.Stats(self._profiler, stream=output).sort_stats("cumulative").print_stats(25)
+        return output.getvalue()
+
+    def finish(self, status="ok"):
+        db.set_connection_wrapper(None)
+        seconds = time.perf_counter() - self._started
+        report = {
+            'script': self.name,
+            'argv': sys.argv[1:],
+            'backend': db.BACKEND,
+            'status': status,
+            'started_at': self._started_at,
+            'finished_at': datetime.now().isoformat(timespec="seconds"),
+            'seconds': round(seconds, 4),
+            'peak_memory_mb': peak_memory_mb(),
+            'phases': self.phases,
+            'queries': {
+                'count': self.queries.count,
+                'seconds': round(self.queries.seconds, 4),
+                'statements': self.queries.top()
+            },
+            'profile': self.profile if isinstance(self.profile, str) else None
+        }
+
+        # Diagnostics go to stderr so scripts that write CSV/JSON to stdout stay parseable
+        print(f"\n[{self.name}] {status} in {seconds:.2f}s, {self.queries.count} queries "
+              f"({self.queries.seconds:.2f}s), peak memory {report['peak_memory_mb']} MB", file=sys.stderr)
+        for phase in self.phases:
+            rate = f", {phase['rows_per_sec']:.0f} rows/sec" if phase['rows_per_sec'] else ""
+            print(f"  {phase['name']:<24} {phase['seconds']:8.2f}s  {phase['queries']} queries{rate}",
+                  file=sys.stderr)
+
+        if self._profiler is not None:
+            print(self._profile_summary(), file=sys.stderr)
+
+        if self.write_report:
+            path = self.report_path or os.path.join(
+                REPORT_DIR, f"{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            )
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump(report, handle, indent=2, default=str)
+            print(f"Run report written to {path}", file=sys.stderr)
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None or (exc_type is SystemExit and exc_value.code in (None, 0)):
+            status = "ok"
+        elif exc_type is KeyboardInterrupt:
+            status = "stopped"
+        else:
+            status = "error"
+        self.finish(status)
+        return False
+
+
+def start_run(name, args):
+    """Create a Run from the options added by add_arguments"""
+    return Run(
+        name,
+        profile=getattr(args, "profile", None),
+        report_path=getattr(args, "report", None),
+        write_report=not getattr(args, "no_report", False)
+    )
@@ -0,0 +1,110 @@
+from bisect import bisect_right
+
+
+class RebateIntervalIndex:
+    """In-memory index of rebate periods per student for fast overlap checks.
+
+    Periods are stored as closed [start, end] ranges of date ordinals, kept
+    sorted by start date. A running maximum of end dates makes the check
+    correct even if the loaded data already contains overlapping rows.
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._ends = {}
+        self._max_ends = {}
+
+    @staticmethod
+    def _ordinal(value):
+        return value if isinstance(value, int) else value.toordinal()
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+    def __contains__(self, roll_no):
+        return roll_no in self._starts
+
+    def load(self, cursor, roll_nos=None):
+        """Load existing rebates with one query, optionally limited to some students"""
+        query = "SELECT roll_no, start_date, end_date FROM rebates"
+        params = ()
+        if roll_nos is not None:
+            roll_nos = list(roll_nos)
+            if not roll_nos:
+                return self
+            query += " WHERE roll_no IN (" + ", ".join(["%s"] * len(roll_nos)) + ")"
+            params = tuple(roll_nos)
+        cursor.execute(query, params)
+        for roll_no, start_date, end_date in cursor:
+            self.add(roll_no, start_date, end_date)
+        return self
+
+    def add(self, roll_no, start_date, end_date):
+        start = self._ordinal(start_date)
+        end = self._ordinal(end_date)
+        starts = self._starts.setdefault(roll_no, [])
+        ends = self._ends.setdefault(roll_no, [])
+        max_ends = self._max_ends.setdefault(roll_no, [])
+
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        ends.insert(position, end)
+        max_ends.insert(position, end)
+
+        # Refresh the running maximum from the insertion point onwards
+        running = max_ends[position - 1] if position > 0 else end
+        for i in range(position, len(max_ends)):
+            running = max(running, ends[i])
+            if max_ends[i] == running and i > position:
+                break
+            max_ends[i] = running
+
+    def overlaps(self, roll_no, start_date, end_date):
+        """Return True if [start_date, end_date] intersects any indexed period"""
+        starts = self._starts.get(roll_no)
+        if not starts:
+            return False
+        start = self._ordinal(start_date)
+        end = self._ordinal(end_date)
+        # Last period that starts on or before the candidate's end date
+        position = bisect_right(starts, end) - 1
+        return position >= 0 and self._max_ends[roll_no][position] >= start
+
+    def overlapping(self, roll_no, start_date, end_date):
+        """Return the (start, end) ordinals of an indexed period that overlaps, or None"""
+        if not self.overlaps(roll_no, start_date, end_date):
+            return None
+        start = self._ordinal(start_date)
+        starts = self._starts[roll_no]
+        ends = self._ends[roll_no]
+        # The running maximum says one exists; walk back to the period that reaches start
+        position = bisect_right(starts, self._ordinal(end_date)) - 1
+        while ends[position] < start:
+            position -= 1
+        return starts[position], ends[position]
+
+    def add_if_free(self, roll_no, start_date, end_date):
+        """Add the period unless it overlaps; return whether it was added"""
+        if self.overlaps(roll_no, start_date, end_date):
+            return False
+        self.add(roll_no, start_date, end_date)
+        return True
+
+    def discard(self, roll_no):
+        """Drop every period of a student, e.g. once a generator is done with them"""
+        self._starts.pop(roll_no, None)
+        self._ends.pop(roll_no, None)
+        self._max_ends.pop(roll_no, None)
+
+    def periods(self, roll_no):
+        """Return the (start, end) ordinals indexed for a student, sorted by start"""
+        return list(zip(self._starts.get(roll_no, []), self._ends.get(roll_no, [])))
+
+
+def build_roll_no_batch_map(students_by_batch):
+    """Invert {batch: [roll_no, ...]} into {roll_no: batch}"""
+    return {
+        roll_no: batch
+        for batch, roll_nos in students_by_batch.items()
+        for roll_no in roll_nos
+    }
@@ -1,190 +1,162 @@
-import mysql.connector
-import random
-import string
-import time
+import argparse
 import sys
-
-# Connect to your MySQL database
-conn = mysql.connector.connect(
-    host="127.0.0.1",
-    user="root",
-    password="20122003@Nn",  # Enter your correct MySQL password here
-    database="mess_rebate"
-)
-cursor = conn.cursor()
-
-start_time = time.time()
-
-# Check if gate_pass_no column exists
-print("Checking if gate_pass_no column exists...")
-cursor.execute("SHOW COLUMNS FROM rebates LIKE 'gate_pass_no'")
-column_exists = cursor.fetchone() is not None
-
-if not column_exists:
-    print("Column doesn't exist, adding it now...")
-    try:
-        # First add without NOT NULL constraint to avoid issues with existing data
-        cursor.execute('ALTER TABLE rebates ADD COLUMN gate_pass_no VARCHAR(10) UNIQUE')
-        conn.commit()
-        print("Gate pass column added successfully with UNIQUE constraint")
-    except mysql.connector.Error as err:
-        print(f"Error adding column: {err}")
-        if "Duplicate entry" in str(err):
-            print("Column might exist but with a different definition")
-else:
-    print("gate_pass_no column already exists")
-
-# Check if the column was successfully added
-cursor.execute("SHOW COLUMNS FROM rebates LIKE 'gate_pass_no'")
-if cursor.fetchone() is None:
-    print("ERROR: Failed to add or find the gate_pass_no column")
-    cursor.close()
-    conn.close()
-    exit(1)
-
-# First check total number of records
-cursor.execute('SELECT COUNT(*) FROM rebates')
-total_records = cursor.fetchone()[0]
-print(f"Total records in rebates table: {total_records}")
-
-# Check records with gate_pass_no
-cursor.execute('SELECT COUNT(*) FROM rebates WHERE gate_pass_no IS NOT NULL')
-filled_records = cursor.fetchone()[0]
-print(f"Records with gate_pass_no: {filled_records}")
-
-# Check records without gate_pass_no
-cursor.execute('SELECT COUNT(*) FROM rebates WHERE gate_pass_no IS NULL')
-empty_records = cursor.fetchone()[0]
-print(f"Records without gate_pass_no: {empty_records}")
-
-print(f"Verification: {filled_records} + {empty_records} = {filled_records + empty_records} (should equal {total_records})")
-
-# Get all existing gate_pass_no values to avoid duplicates
-print("Loading existing gate pass numbers...")
-cursor.execute('SELECT gate_pass_no FROM rebates WHERE gate_pass_no IS NOT NULL')
-existing_gate_pass = set()
-for row in cursor.fetchall():
-    if row[0] is not None:
-        existing_gate_pass.add(row[0])
-
-print(f"Found {len(existing_gate_pass)} unique existing gate pass numbers")
-
-# Function to generate a new batch of gate pass numbers with a given prefix
-def generate_gate_pass_batch(prefix, existing_numbers):
-    new_numbers = []
-    for i in range(1, 10000):
-        gate_pass = f"{prefix}-{i:04d}"
-        if gate_pass not in existing_numbers:
-            new_numbers.append(gate_pass)
-    return new_numbers
-
-# Generate available gate pass numbers with different prefixes if needed
-available_numbers = []
-prefixes = list(string.ascii_uppercase)  # A-Z prefixes
-random.shuffle(prefixes)  # Randomize for better distribution
-
-# Start with B as the first prefix (since that's the example format)
-if 'B' in prefixes:
-    prefixes.remove('B')
-    prefixes.insert(0, 'B')
-
-# Generate numbers until we have enough for all empty records
-for prefix in prefixes:
-    if len(available_numbers) >= empty_records:
-        break
-    
-    prefix_numbers = generate_gate_pass_batch(prefix, existing_gate_pass)
-    available_numbers.extend(prefix_numbers)
-    print(f"Generated {len(prefix_numbers)} numbers with prefix {prefix}")
-    
-    # Add these to existing set to avoid duplicates in next batch
-    existing_gate_pass.update(prefix_numbers)
-
-# Shuffle the available numbers for randomness
-random.shuffle(available_numbers)
-print(f"Total available unique gate pass numbers: {len(available_numbers)}")
-
-if len(available_numbers) < empty_records:
-    print(f"WARNING: Not enough unique gate pass numbers available. Need {empty_records}, have {len(available_numbers)}.")
-    print("Consider using a different format or expanding the range.")
-
-# Get all roll_no and start_date where gate_pass_no is NULL
-batch_to_process = empty_records  # Process all records in one run
-cursor.execute(f'SELECT roll_no, start_date FROM rebates WHERE gate_pass_no IS NULL LIMIT {batch_to_process}')
-rebate_keys = cursor.fetchall()
-print(f"Found {len(rebate_keys)} records to update")
-
-if len(rebate_keys) == 0:
-    print("No records need updating. All records already have gate pass numbers.")
-    
-    # Now we can add the NOT NULL constraint if needed
-    if empty_records == 0:
+import db
+import instrumentation
+from backfill import run_backfill
+from gate_pass import GatePassAllocator, apply_assignments
+
+def ensure_gate_pass_column(conn, cursor):
+    # Check if gate_pass_no column exists
+    print("Checking if gate_pass_no column exists...")
+    if not db.column_exists(cursor, "rebates", "gate_pass_no"):
+        print("Column doesn't exist, adding it now...")
         try:
-            print("Adding NOT NULL constraint to gate_pass_no column...")
-            cursor.execute('ALTER TABLE rebates MODIFY COLUMN gate_pass_no VARCHAR(10) NOT NULL UNIQUE')
+            # First add without NOT NULL constraint to avoid issues with existing data
+            cursor.execute('ALTER TABLE rebates ADD COLUMN gate_pass_no VARCHAR(10) UNIQUE')
             conn.commit()
-            print("NOT NULL constraint added successfully")
-        except mysql.connector.Error as err:
-            print(f"Error adding NOT NULL constraint: {err}")
-    
-    cursor.close()
-    conn.close()
-    exit()
-
-# Prepare data for batch update
-batch_size = 100  # Increased batch size for efficiency
-updates = []
-
-print(f"Starting updates - this may take a few minutes...")
-sys.stdout.flush()
-
-try:
-    for i, (roll_no, start_date) in enumerate(rebate_keys):
-        # Print progress every 100 records
-        if i % 100 == 0:
-            print(f"Processing record {i+1}/{len(rebate_keys)} ({(i+1)/len(rebate_keys)*100:.1f}%)")
-            sys.stdout.flush()
-        
-        # Get the next available gate pass number
-        gate_pass_no = available_numbers[i]
-        
-        # Add to batch
-        updates.append((gate_pass_no, roll_no, start_date))
-        
-        # Commit in batches
-        if (i + 1) % batch_size == 0 or i == len(rebate_keys) - 1:
-            # Use executemany for better performance
-            cursor.executemany(
-                "UPDATE rebates SET gate_pass_no = %s WHERE roll_no = %s AND start_date = %s AND gate_pass_no IS NULL",
-                updates
-            )
-            conn.commit()
-            print(f"Committed batch of {len(updates)} updates")
-            updates = []  # Reset the batch
-            
-except Exception as e:
-    print(f"ERROR: Unexpected error occurred: {e}")
-    conn.rollback()  # Roll back any pending transactions
-
-# Check if there are more records to update
-cursor.execute('SELECT COUNT(*) FROM rebates WHERE gate_pass_no IS NULL')
-remaining = cursor.fetchone()[0]
-if remaining > 0:
-    print(f"There are still {remaining} records without gate pass numbers. Run the script again to update them.")
-else:
-    # Now we can add the NOT NULL constraint
+            print("Gate pass column added successfully with UNIQUE constraint")
+        except db.Error as err:
+            print(f"Error adding column: {err}")
+            if "Duplicate entry" in str(err):
+                print("Column might exist but with a different definition")
+    else:
+        print("gate_pass_no column already exists")
+
+    # Check if the column was successfully added
+    return db.column_exists(cursor, "rebates", "gate_pass_no")
+
+def add_not_null_constraint(conn, cursor):
+    if db.is_sqlite():
+        # SQLite cannot modify a column definition in place
+        print("SQLite backend: skipping NOT NULL constraint")
+        return
     try:
         print("Adding NOT NULL constraint to gate_pass_no column...")
         cursor.execute('ALTER TABLE rebates MODIFY COLUMN gate_pass_no VARCHAR(10) NOT NULL UNIQUE')
         conn.commit()
         print("NOT NULL constraint added successfully")
-    except mysql.connector.Error as err:
+    except db.Error as err:
         print(f"Error adding NOT NULL constraint: {err}")
 
-# Close connection
-cursor.close()
-conn.close()
-
-total_time = time.time() - start_time
-print(f"Script completed in {total_time:.2f} seconds")
-print("Script completed successfully")
\ No newline at end of file
+def print_counts(cursor):
+    # First check total number of records
+    cursor.execute('SELECT COUNT(*) FROM rebates')
+    total_records = cursor.fetchone()[0]
+    print(f"Total records in rebates table: {total_records}")
+
+    # Check records with gate_pass_no
+    cursor.execute('SELECT COUNT(*) FROM rebates WHERE gate_pass_no IS NOT NULL')
+    filled_records = cursor.fetchone()[0]
+    print(f"Records with gate_pass_no: {filled_records}")
+
+    # Check records without gate_pass_no
+    cursor.execute('SELECT COUNT(*) FROM rebates WHERE gate_pass_no IS NULL')
+    empty_records = cursor.fetchone()[0]
+    print(f"Records without gate_pass_no: {empty_records}")
+
+    print(f"Verification: {filled_records} + {empty_records} = {filled_records + empty_records} (should equal {total_records})")
+    return empty_records
+
+def backfill_gate_passes(cursor, chunk_size=1000, sleep_seconds=0.0, max_chunk_seconds=None,
+                         checkpoint_file=None, restart=False):
+    """Assign free gate pass numbers to every rebate without one; returns the backfill state"""
+    # Mark existing gate pass numbers in the bitmap to avoid duplicates
+    print("Loading existing gate pass numbers...")
+    allocator = GatePassAllocator().load(cursor)
+    print(f"Free gate pass numbers: {allocator.available()}")
+
+    cursor.execute('SELECT COUNT(*) FROM rebates WHERE gate_pass_no IS NULL')
+    empty_records = cursor.fetchone()[0]
+    if allocator.available() < empty_records:
+        print(f"WARNING: Not enough unique gate pass numbers available. Need {empty_records}, have {allocator.available()}.")
+        print("Consider using a different format or expanding the range.")
+
+    def assign_chunk(chunk_conn, rows):
+        gate_passes = allocator.allocate_strings(len(rows))
+        assignments = [
+            (roll_no, start_date, gate_pass_no)
+            for (roll_no, start_date), gate_pass_no in zip(rows, gate_passes)
+        ]
+        apply_assignments(chunk_conn, assignments)
+
+    # Page through rows without a gate pass, committing and checkpointing every chunk
+    return run_backfill(
+        "gate_pass_no",
+        assign_chunk,
+        where="gate_pass_no IS NULL",
+        chunk_size=chunk_size,
+        sleep_seconds=sleep_seconds,
+        max_chunk_seconds=max_chunk_seconds,
+        checkpoint_file=checkpoint_file,
+        restart=restart
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill gate_pass_no for existing rebates")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows updated per transaction")
+    parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between chunks")
+    parser.add_argument("--max-chunk-seconds", type=float,
+                        help="Shrink chunks that take longer than this to bound lock time")
+    parser.add_argument("--checkpoint-file", help="Where progress is saved for resuming")
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved progress")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("new_row", args) as run:
+        # Connect to the database configured in .env
+        conn = db.get_db_connection()
+        cursor = conn.cursor()
+
+        with run.phase("prepare_column"):
+            column_ready = ensure_gate_pass_column(conn, cursor)
+        if not column_ready:
+            print("ERROR: Failed to add or find the gate_pass_no column")
+            cursor.close()
+            conn.close()
+            sys.exit(1)
+
+        empty_records = print_counts(cursor)
+
+        if empty_records == 0:
+            print("No records need updating. All records already have gate pass numbers.")
+            add_not_null_constraint(conn, cursor)
+            cursor.close()
+            conn.close()
+            return
+
+        with run.phase("backfill") as phase:
+            try:
+                state = backfill_gate_passes(
+                    cursor,
+                    chunk_size=args.chunk_size,
+                    sleep_seconds=args.sleep,
+                    max_chunk_seconds=args.max_chunk_seconds,
+                    checkpoint_file=args.checkpoint_file,
+                    restart=args.restart
+                )
+                phase.rows = state['rows']
+            except db.Error as e:
+                print(f"ERROR: Unexpected error occurred: {e}")
+
+        # End the read transaction left open by the counts above: the backfill committed
+        # on other connections, which a REPEATABLE READ snapshot would not show
+        conn.rollback()
+
+        # Check if there are more records to update
+        cursor.execute('SELECT COUNT(*) FROM rebates WHERE gate_pass_no IS NULL')
+        remaining = cursor.fetchone()[0]
+        if remaining > 0:
+            print(f"There are still {remaining} records without gate pass numbers. Run the script again to resume.")
+        else:
+            # Now we can add the NOT NULL constraint
+            with run.phase("not_null_constraint"):
+                add_not_null_constraint(conn, cursor)
+
+        # Close connection
+        cursor.close()
+        conn.close()
+
+        print("Script completed successfully")
+
+if __name__ == "__main__":
+    main()
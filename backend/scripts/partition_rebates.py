@@ -0,0 +1,626 @@
+import argparse
+import sys
+import time
+from datetime import date, datetime
+
+import db
+import instrumentation
+from archive import FORMATS, ArchiveWriter, archive_path
+from backfill import run_backfill
+from change_tracking import ensure_updated_at, max_updated_at
+from checkpoint import checkpoint_path, clear_checkpoint, load_checkpoint, save_checkpoint
+
+# Partitioned copy built next to rebates, and the name the original keeps after the swap
+SHADOW_TABLE = "rebates_partitioned"
+OLD_TABLE = "rebates_unpartitioned"
+
+# Keys deleted (or re-keyed) while the copy runs; updated_at covers inserts and updates
+DELETE_LOG = "rebates_migration_deletes"
+_DELETE_LOG_TRIGGERS = {
+    "trg_rebates_migration_delete": (
+        "AFTER DELETE",
+        f"INSERT INTO {DELETE_LOG} (roll_no, start_date) VALUES (OLD.roll_no, OLD.start_date);"
+    ),
+    "trg_rebates_migration_rekey": (
+        "AFTER UPDATE",
+        "IF NOT (OLD.roll_no <=> NEW.roll_no AND OLD.start_date <=> NEW.start_date) THEN\n"
+        f"INSERT INTO {DELETE_LOG} (roll_no, start_date) VALUES (OLD.roll_no, OLD.start_date);\nEND IF;"
+    ),
+}
+
+# Partitioned tables cannot have foreign keys, so the ON DELETE CASCADE becomes a trigger
+CASCADE_TRIGGER = "trg_students_delete_rebates"
+
+# Unique keys without start_date cannot exist on the partitioned table; each one
+# moves to a side table of its own, kept in step by triggers on rebates
+UNIQUE_TABLE_PREFIX = "rebates_unique_"
+
+# Academic years run July to June; partition p2024 holds rebates starting 2024-07-01 to 2025-06-30
+ACADEMIC_YEAR_START_MONTH = 7
+FUTURE_PARTITION = "pfuture"
+
+STATE_FILE = checkpoint_path("partition_rebates")
+
+
+def academic_year(day):
+    return day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+
+
+def partition_bound(year):
+    """First start_date that no longer belongs to academic year `year`"""
+    return date(year + 1, ACADEMIC_YEAR_START_MONTH, 1)
+
+
+def _year_partitions(years):
+    return [f"PARTITION p{year} VALUES LESS THAN ('{partition_bound(year)}')" for year in years]
+
+
+def partition_clause(first_year, last_year):
+    """RANGE COLUMNS partitioning with one partition per academic year and a catch-all.
+
+    The first partition also takes anything older, and pfuture takes
+    anything newer, so inserts never fail for lack of a partition. Queries
+    prune on start_date comparisons (=, <, BETWEEN); YEAR(start_date) = ?
+    does not prune and needs the range rewrite from index_advisor.py.
+    """
+    partitions = _year_partitions(range(first_year, last_year + 1))
+    partitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return "PARTITION BY RANGE COLUMNS (start_date) (\n    " + ",\n    ".join(partitions) + "\n)"
+
+
+def list_partitions(cursor, table="rebates"):
+    """(name, upper bound, estimated rows) for every partition of a table, in order"""
+    cursor.execute("""
+    SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    return cursor.fetchall()
+
+
+def _year_of(partition_name):
+    return int(partition_name[1:]) if partition_name[1:].isdigit() else None
+
+
+def _table_exists(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def copy_columns(cursor, table="rebates"):
+    """Stored columns of a table; generated ones (e.g. start_year) cannot be inserted"""
+    cursor.execute("""
+    SELECT COLUMN_NAME FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND EXTRA NOT LIKE '%%GENERATED%%'
+    ORDER BY ORDINAL_POSITION
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _unique_keys_without_start_date(cursor, table):
+    cursor.execute("""
+    SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'
+    ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    keys = {}
+    for index_name, column in cursor.fetchall():
+        keys.setdefault(index_name, []).append(column)
+    return {name: columns for name, columns in keys.items() if "start_date" not in columns}
+
+
+def _table_triggers(cursor, table):
+    cursor.execute("""
+    SELECT TRIGGER_NAME, ACTION_TIMING, EVENT_MANIPULATION, ACTION_STATEMENT
+    FROM information_schema.TRIGGERS
+    WHERE TRIGGER_SCHEMA = DATABASE() AND EVENT_OBJECT_TABLE = %s
+    ORDER BY ACTION_TIMING, EVENT_MANIPULATION, ACTION_ORDER
+    """, (table,))
+    return cursor.fetchall()
+
+
+def _column_types(cursor, table, columns):
+    cursor.execute(f"""
+    SELECT COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME IN ({', '.join(['%s'] * len(columns))})
+    """, (table, *columns))
+    return dict(cursor.fetchall())
+
+
+def _unique_key_triggers(name, columns):
+    table = UNIQUE_TABLE_PREFIX + name
+    column_list = ", ".join(columns)
+
+    def insert(row):
+        # Like a UNIQUE index, keys with a NULL column are not checked
+        present = " AND ".join(f"{row}.{column} IS NOT NULL" for column in columns)
+        values = ", ".join(f"{row}.{column}" for column in columns)
+        return f"IF {present} THEN\nINSERT INTO {table} ({column_list}) VALUES ({values});\nEND IF;"
+
+    def delete(row):
+        match = " AND ".join(f"{column} = {row}.{column}" for column in columns)
+        return f"DELETE FROM {table} WHERE {match};"
+
+    unchanged = " AND ".join(f"OLD.{column} <=> NEW.{column}" for column in columns)
+    return {
+        f"trg_{table}_insert": ("AFTER INSERT", insert("NEW")),
+        f"trg_{table}_update": (
+            "AFTER UPDATE",
+            f"IF NOT ({unchanged}) THEN\n{delete('OLD')}\n{insert('NEW')}\nEND IF;"
+        ),
+        f"trg_{table}_delete": ("AFTER DELETE", delete("OLD")),
+    }
+
+
+def _unique_tables(cursor):
+    """{side table: key columns} for the unique keys install_unique_tables moved out of rebates"""
+    cursor.execute("""
+    SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE %s AND INDEX_NAME = 'PRIMARY'
+    ORDER BY TABLE_NAME, SEQ_IN_INDEX
+    """, (UNIQUE_TABLE_PREFIX.replace("_", "\\_") + "%",))
+    tables = {}
+    for table, column in cursor.fetchall():
+        tables.setdefault(table, []).append(column)
+    return tables
+
+
+def install_unique_tables(conn, keys):
+    """Mirror unique keys the partitioned table cannot hold into side tables.
+
+    Each side table has the key as its primary key, and triggers on rebates
+    insert, move and delete its entries in the same statement as the rebate
+    row, so a duplicate still fails with ER_DUP_ENTRY naming the key. The
+    triggers go on the current rebates now and move to the new table with
+    the others at the swap; the existing keys are copied in by copy_rows.
+    """
+    cursor = conn.cursor()
+    try:
+        for name, columns in keys.items():
+            table = UNIQUE_TABLE_PREFIX + name
+            types = _column_types(cursor, "rebates", columns)
+            triggers = _unique_key_triggers(name, columns)
+            for trigger in triggers:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(
+                f"CREATE TABLE {table} ("
+                + ", ".join(f"{column} {types[column]} NOT NULL" for column in columns)
+                + f", PRIMARY KEY ({', '.join(columns)}))"
+            )
+            for trigger, (timing, body) in triggers.items():
+                cursor.execute(f"CREATE TRIGGER {trigger} {timing} ON rebates FOR EACH ROW\nBEGIN\n{body}\nEND")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def install_delete_log(conn):
+    """Log every key that leaves rebates while the copy runs, so the catch-up can delete it"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DELETE_LOG} (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            roll_no VARCHAR(10) NOT NULL,
+            start_date DATE NOT NULL
+        )
+        """)
+        for name, (timing, body) in _DELETE_LOG_TRIGGERS.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {timing} ON rebates FOR EACH ROW\nBEGIN\n{body}\nEND")
+        # Entries left by an abandoned run describe rows the fresh copy already reflects
+        cursor.execute(f"DELETE FROM {DELETE_LOG}")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def create_shadow_table(conn, first_year, last_year):
+    """Create the empty partitioned copy of rebates.
+
+    CREATE TABLE ... LIKE copies the columns and indexes but not the foreign
+    key, which partitioned InnoDB tables cannot have. Every unique key must
+    include the partitioning column, so UNIQUE (gate_pass_no) becomes a plain
+    index here and is enforced through install_unique_tables instead.
+    Returns the keys that were relaxed.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"CREATE TABLE {SHADOW_TABLE} LIKE rebates")
+        relaxed = _unique_keys_without_start_date(cursor, SHADOW_TABLE)
+        for name, columns in relaxed.items():
+            cursor.execute(
+                f"ALTER TABLE {SHADOW_TABLE} DROP INDEX {name}, ADD INDEX {name} ({', '.join(columns)})"
+            )
+        cursor.execute(f"ALTER TABLE {SHADOW_TABLE} {partition_clause(first_year, last_year)}")
+        conn.commit()
+        return relaxed
+    finally:
+        cursor.close()
+
+
+def copy_rows(columns, unique_keys, chunk_size, pause, max_chunk_seconds, restart):
+    """Copy rebates into the shadow table in primary key order, one short transaction per chunk.
+
+    Each chunk is copied server side with INSERT ... SELECT over the key range
+    of the page, and REPLACE makes re-copying after a resume harmless. The
+    chunk's unique key values go into the side tables in the same
+    transaction; INSERT ... SELECT share-locks the rows it reads, so a
+    concurrent delete removes the entry only after it has been copied.
+    """
+    column_list = ", ".join(columns)
+    key_range = """
+        WHERE (roll_no > %s OR (roll_no = %s AND start_date >= %s))
+        AND (roll_no < %s OR (roll_no = %s AND start_date <= %s))
+    """
+
+    def copy_chunk(conn, rows):
+        cursor = conn.cursor()
+        (first_roll_no, first_start), (last_roll_no, last_start) = rows[0][:2], rows[-1][:2]
+        params = (first_roll_no, first_roll_no, first_start, last_roll_no, last_roll_no, last_start)
+        cursor.execute(
+            f"REPLACE INTO {SHADOW_TABLE} ({column_list}) SELECT {column_list} FROM rebates {key_range}", params
+        )
+        for name, key_columns in unique_keys.items():
+            key_list = ", ".join(key_columns)
+            present = " AND ".join(f"{column} IS NOT NULL" for column in key_columns)
+            # IGNORE: the triggers may already have added keys inserted since the migration started
+            cursor.execute(
+                f"INSERT IGNORE INTO {UNIQUE_TABLE_PREFIX + name} ({key_list}) "
+                f"SELECT {key_list} FROM rebates {key_range} AND {present}",
+                params
+            )
+        cursor.close()
+
+    return run_backfill(
+        "partition_rebates",
+        copy_chunk,
+        chunk_size=chunk_size,
+        sleep_seconds=pause,
+        max_chunk_seconds=max_chunk_seconds,
+        restart=restart
+    )
+
+
+def catch_up(cursor, columns, state, lag_seconds, batch_size=1000):
+    """Apply rows changed and keys deleted since the last pass to the shadow table.
+
+    Deletes go first, so a key that was deleted and inserted again is copied
+    back by the updated_at pass. The delete log is a queue: the entries
+    visible now are applied and then removed by id, so one that commits late
+    is applied by a later pass. updated_at is stamped when a statement runs,
+    not when it commits, so rows are copied from lag_seconds before the last
+    watermark; a row committed that late after being stamped is still
+    caught. Updates state in place and returns the rows touched.
+    """
+    new_watermark = max_updated_at(cursor, "rebates")
+    cursor.execute(f"SELECT id FROM {DELETE_LOG}")
+    ids = [log_id for (log_id,) in cursor.fetchall()]
+
+    deleted = 0
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
+        placeholders = ", ".join(["%s"] * len(batch))
+        # No aliases: under LOCK TABLES an alias would need a lock of its own
+        cursor.execute(f"""
+        DELETE {SHADOW_TABLE} FROM {SHADOW_TABLE}
+        JOIN {DELETE_LOG} ON {SHADOW_TABLE}.roll_no = {DELETE_LOG}.roll_no
+        AND {SHADOW_TABLE}.start_date = {DELETE_LOG}.start_date
+        WHERE {DELETE_LOG}.id IN ({placeholders})
+        """, batch)
+        deleted += cursor.rowcount
+        cursor.execute(f"DELETE FROM {DELETE_LOG} WHERE id IN ({placeholders})", batch)
+
+    column_list = ", ".join(columns)
+    cursor.execute(
+        f"REPLACE INTO {SHADOW_TABLE} ({column_list}) SELECT {column_list} FROM rebates "
+        f"WHERE updated_at >= %s - INTERVAL %s SECOND",
+        (state['watermark'], lag_seconds)
+    )
+    copied = cursor.rowcount
+
+    state['watermark'] = new_watermark or state['watermark']
+    return copied + deleted
+
+
+def swap_tables(conn, columns, state, lag_seconds):
+    """Final catch-up, atomic rename and trigger handover while writes are blocked.
+
+    The write lock covers the last catch-up pass, the RENAME (which needs
+    MySQL 8.0.13+ under LOCK TABLES) and the triggers. Triggers stay with the
+    renamed original, so the other rebates triggers (statistics, export and
+    unique key logs) are moved to the new table, and students gets a
+    trigger in place of the cascade, before any write can reach it.
+    students is locked too, since its trigger is created under the lock.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"LOCK TABLES rebates WRITE, {SHADOW_TABLE} WRITE, {DELETE_LOG} WRITE, students WRITE")
+        try:
+            final = catch_up(cursor, columns, state, lag_seconds)
+            conn.commit()
+            triggers = [
+                trigger for trigger in _table_triggers(cursor, "rebates")
+                if trigger[0] not in _DELETE_LOG_TRIGGERS
+            ]
+            cursor.execute(f"RENAME TABLE rebates TO {OLD_TABLE}, {SHADOW_TABLE} TO rebates")
+
+            for name, timing, event, statement in triggers:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"CREATE TRIGGER {name} {timing} {event} ON rebates FOR EACH ROW {statement}")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {CASCADE_TRIGGER}")
+            cursor.execute(
+                f"CREATE TRIGGER {CASCADE_TRIGGER} AFTER DELETE ON students FOR EACH ROW "
+                f"DELETE FROM rebates WHERE roll_no = OLD.roll_no"
+            )
+        finally:
+            cursor.execute("UNLOCK TABLES")
+        return final, [trigger[0] for trigger in triggers]
+    finally:
+        cursor.close()
+
+
+def migrate(first_year=None, years_ahead=1, chunk_size=5000, pause=0.0, max_chunk_seconds=2.0,
+            max_lag=1000, max_passes=10, lag_seconds=60, restart=False):
+    """Convert rebates to a table partitioned by academic year without blocking writers.
+
+    Steps: install the delete log and the unique key side tables, take the
+    updated_at watermark, build the partitioned shadow table, copy in
+    resumable chunks, catch up until a
+    pass changes fewer than max_lag rows, then lock, catch up once more and
+    swap. The original table is kept as rebates_unpartitioned until
+    --cleanup. Returns a summary dict.
+    """
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if list_partitions(cursor):
+            raise SystemExit("rebates is already partitioned; use --add-years or --drop-before")
+        if _table_exists(cursor, OLD_TABLE):
+            raise SystemExit(f"{OLD_TABLE} is left over from an earlier migration; run --cleanup first")
+
+        if restart:
+            clear_checkpoint(STATE_FILE)
+            cursor.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+        state = load_checkpoint(STATE_FILE)
+        if state is None and _table_exists(cursor, SHADOW_TABLE):
+            raise SystemExit(f"{SHADOW_TABLE} exists but no migration state was saved; run again with --restart")
+
+        unique_keys = _unique_keys_without_start_date(cursor, "rebates")
+        if state is None:
+            if ensure_updated_at(conn, "rebates"):
+                print("Added updated_at column to rebates for change tracking")
+            # Everything changed from here on is picked up by the catch-up passes
+            install_delete_log(conn)
+            install_unique_tables(conn, unique_keys)
+            watermark = max_updated_at(cursor, "rebates") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            cursor.execute("SELECT MIN(start_date), MAX(start_date) FROM rebates")
+            oldest, newest = cursor.fetchone()
+            today = date.today()
+            if first_year is None:
+                first_year = academic_year(oldest or today)
+            last_year = max(academic_year(newest or today), academic_year(today)) + years_ahead
+            relaxed = create_shadow_table(conn, first_year, last_year)
+            for name, columns in relaxed.items():
+                print(f"Unique key {name} ({', '.join(columns)}) is enforced through {UNIQUE_TABLE_PREFIX + name}")
+
+            state = {
+                'watermark': watermark,
+                'first_year': first_year,
+                'last_year': last_year,
+                'started_at': datetime.now().isoformat(timespec="seconds"),
+            }
+            save_checkpoint(STATE_FILE, state)
+        print(f"Partitions p{state['first_year']} to p{state['last_year']} and {FUTURE_PARTITION}")
+
+        columns = copy_columns(cursor)
+        copy = copy_rows(columns, unique_keys, chunk_size, pause, max_chunk_seconds, restart)
+
+        passes = 0
+        while True:
+            passes += 1
+            started = time.perf_counter()
+            changed = catch_up(cursor, columns, state, lag_seconds)
+            conn.commit()
+            save_checkpoint(STATE_FILE, state)
+            print(f"Catch-up pass {passes}: {changed} rows in {time.perf_counter() - started:.2f}s")
+            if changed < max_lag or passes >= max_passes:
+                break
+
+        started = time.perf_counter()
+        final, triggers = swap_tables(conn, columns, state, lag_seconds)
+        print(f"Swapped tables after a final catch-up of {final} rows "
+              f"({time.perf_counter() - started:.2f}s with writes blocked)")
+        if triggers:
+            print(f"Moved triggers to the new rebates table: {', '.join(triggers)}")
+
+        cursor.execute("SELECT COUNT(*) FROM rebates")
+        rows = cursor.fetchone()[0]
+        cursor.execute(f"SELECT COUNT(*) FROM {OLD_TABLE}")
+        old_rows = cursor.fetchone()[0]
+        clear_checkpoint(STATE_FILE)
+        return {'copied': copy['rows'], 'catch_up_passes': passes, 'rows': rows, 'old_rows': old_rows}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def add_partitions(conn, through_year):
+    """Split pfuture so every academic year up to through_year has its own partition.
+
+    REORGANIZE only rewrites pfuture, which is empty or small as long as
+    this runs before each year starts. Returns the partitions added.
+    """
+    cursor = conn.cursor()
+    try:
+        years = [_year_of(name) for name, _, _ in list_partitions(cursor)]
+        if not years:
+            raise SystemExit("rebates is not partitioned; run --migrate first")
+        last_year = max(year for year in years if year is not None)
+        new_years = list(range(last_year + 1, through_year + 1))
+        if new_years:
+            partitions = _year_partitions(new_years)
+            partitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+            cursor.execute(
+                f"ALTER TABLE rebates REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({', '.join(partitions)})"
+            )
+        return [f"p{year}" for year in new_years]
+    finally:
+        cursor.close()
+
+
+def drop_partitions(conn, before_year, archive_format="csv", archive=True, fetch_size=10000):
+    """Drop the partitions of academic years before before_year, archiving each one first.
+
+    DROP PARTITION discards a year without touching other rows, but it does
+    not fire delete triggers, so the unique key side tables are pruned of
+    the dropped keys afterwards. Returns {partition: rows archived}.
+    """
+    cursor = conn.cursor()
+    dropped = {}
+    try:
+        columns = copy_columns(cursor)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for name, _, _ in list_partitions(cursor):
+            year = _year_of(name)
+            if year is None or year >= before_year:
+                continue
+            rows = 0
+            if archive:
+                path = archive_path(f"rebates_{name}_{stamp}", archive_format)
+                with ArchiveWriter(path, columns) as writer:
+                    cursor.execute(
+                        f"SELECT {', '.join(columns)} FROM rebates PARTITION ({name}) ORDER BY roll_no, start_date"
+                    )
+                    while True:
+                        chunk = cursor.fetchmany(fetch_size)
+                        if not chunk:
+                            break
+                        writer.write_rows(chunk)
+                    rows = writer.rows
+                print(f"Archived {rows} rebates of {name} to {path}")
+            cursor.execute(f"ALTER TABLE rebates DROP PARTITION {name}")
+            dropped[name] = rows
+
+        if dropped:
+            for table, key_columns in _unique_tables(cursor).items():
+                match = " AND ".join(f"rebates.{column} = {table}.{column}" for column in key_columns)
+                cursor.execute(f"DELETE FROM {table} WHERE NOT EXISTS (SELECT 1 FROM rebates WHERE {match})")
+            conn.commit()
+        return dropped
+    finally:
+        cursor.close()
+
+
+def cleanup(conn):
+    """Drop the original table (with the delete log triggers) and the delete log"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {OLD_TABLE}")
+        for name in _DELETE_LOG_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {DELETE_LOG}")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def print_partitions(conn):
+    cursor = conn.cursor()
+    partitions = list_partitions(cursor)
+    cursor.close()
+    if not partitions:
+        print("rebates is not partitioned")
+        return
+    print(f"{'partition':<12} {'starts before':<14} {'rows (estimate)':>16}")
+    for name, bound, rows in partitions:
+        print(f"{name:<12} {bound.strip(chr(39)):<14} {rows:>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition rebates by academic year and maintain the partitions (MySQL only)")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--migrate", action="store_true",
+                        help="Convert rebates to a partitioned table with an online copy and an atomic swap")
+    action.add_argument("--add-years", type=int, metavar="N",
+                        help="Make sure partitions exist up to N academic years after the current one")
+    action.add_argument("--drop-before", type=int, metavar="YEAR",
+                        help="Archive and drop the partitions of academic years before YEAR")
+    action.add_argument("--cleanup", action="store_true",
+                        help=f"Drop {OLD_TABLE} and the migration delete log once the new table is verified")
+    parser.add_argument("--first-year", type=int,
+                        help="First academic year with its own partition (default: that of the oldest rebate)")
+    parser.add_argument("--years-ahead", type=int, default=1,
+                        help="Academic years after the current one to create partitions for")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows copied per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to pause between copy chunks")
+    parser.add_argument("--max-chunk-seconds", type=float, default=2.0,
+                        help="Halve the chunk size when a chunk takes longer than this")
+    parser.add_argument("--max-lag", type=int, default=1000,
+                        help="Swap once a catch-up pass changes fewer rows than this")
+    parser.add_argument("--lag-seconds", type=int, default=60,
+                        help="Re-copy rows stamped this long before the last catch-up, for transactions that commit late")
+    parser.add_argument("--restart", action="store_true", help="Discard an interrupted migration and start over")
+    parser.add_argument("--archive-format", choices=FORMATS, default="csv", help="Format of dropped partition archives")
+    parser.add_argument("--no-archive", action="store_true", help="Drop partitions without archiving them")
+    parser.add_argument("--yes", action="store_true", help="Skip the confirmation prompt")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if db.is_sqlite():
+        parser.error("partitioning needs the MySQL backend; SQLite has no table partitions")
+
+    with instrumentation.start_run("partition_rebates", args) as run:
+        if args.migrate:
+            with run.phase("migrate") as phase:
+                summary = migrate(
+                    args.first_year, args.years_ahead, args.chunk_size, args.pause,
+                    args.max_chunk_seconds, args.max_lag, lag_seconds=args.lag_seconds, restart=args.restart
+                )
+                phase.rows = summary['copied']
+            print(f"rebates is now partitioned: {summary['rows']} rows ({summary['old_rows']} in {OLD_TABLE})")
+            print("Run --cleanup once the application has been checked against the new table")
+
+        conn = db.get_db_connection()
+        try:
+            if args.add_years is not None:
+                with run.phase("add_partitions"):
+                    added = add_partitions(conn, academic_year(date.today()) + args.add_years)
+                print(f"Added partitions: {', '.join(added)}" if added else "All partitions already exist")
+
+            elif args.drop_before is not None:
+                cursor = conn.cursor()
+                doomed = [name for name, _, _ in list_partitions(cursor)
+                          if _year_of(name) is not None and _year_of(name) < args.drop_before]
+                cursor.close()
+                if not doomed:
+                    print(f"No partitions before academic year {args.drop_before}")
+                    return
+                if not args.yes:
+                    confirm = input(f"Drop partitions {', '.join(doomed)} and every rebate in them? (y/n): ")
+                    if confirm.lower() != 'y':
+                        print("Operation cancelled")
+                        sys.exit(0)
+                with run.phase("drop_partitions") as phase:
+                    dropped = drop_partitions(conn, args.drop_before, args.archive_format, not args.no_archive)
+                    phase.rows = sum(dropped.values())
+                print(f"Dropped partitions: {', '.join(dropped)}")
+                print("Dropped rows bypass the statistics triggers; run stats_aggregates.py --rebuild if it is in use")
+
+            elif args.cleanup:
+                cleanup(conn)
+                print(f"Dropped {OLD_TABLE} and {DELETE_LOG}")
+
+            print_partitions(conn)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
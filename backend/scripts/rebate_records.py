@@ -0,0 +1,246 @@
+import numpy as np
+
+from date_utils import epoch_days_to_dates, from_epoch_day, to_epoch_day
+from db import column_exists
+from gate_pass import decode_gate_pass, encode_gate_pass
+
+# gate_pass values besides encoded B-0042 style numbers
+GATE_PASS_NULL = -1
+GATE_PASS_OTHER = -2
+
+# 18 bytes per rebate; student indexes the roll number dictionary
+RECORD_DTYPE = np.dtype([
+    ("student", np.int32),
+    ("start_day", np.int32),
+    ("end_day", np.int32),
+    ("rebate_days", np.int16),
+    ("gate_pass", np.int32),
+])
+
+
+def _encode_gate_pass(value):
+    if value is None:
+        return GATE_PASS_NULL
+    code = encode_gate_pass(value)
+    return GATE_PASS_OTHER if code is None else code
+
+
+class RebateRecord:
+    """Row view of one rebate in a RebateRecords array, for code that wants objects"""
+
+    __slots__ = ("_records", "_index")
+
+    def __init__(self, records, index):
+        self._records = records
+        self._index = index
+
+    @property
+    def roll_no(self):
+        return self._records.roll_nos[self._records.data['student'][self._index]]
+
+    @property
+    def start_day(self):
+        return int(self._records.data['start_day'][self._index])
+
+    @property
+    def end_day(self):
+        return int(self._records.data['end_day'][self._index])
+
+    @property
+    def start_date(self):
+        return from_epoch_day(self.start_day)
+
+    @property
+    def end_date(self):
+        return from_epoch_day(self.end_day)
+
+    @property
+    def rebate_days(self):
+        return int(self._records.data['rebate_days'][self._index])
+
+    @property
+    def gate_pass_no(self):
+        """The gate pass number, or None if unset or not in the X-0000 format"""
+        code = int(self._records.data['gate_pass'][self._index])
+        return decode_gate_pass(code) if code >= 0 else None
+
+    def as_row(self):
+        return self.roll_no, self.start_date, self.end_date, self.rebate_days
+
+    def __repr__(self):
+        return f"RebateRecord({self.roll_no!r}, {self.start_date}, {self.end_date}, {self.rebate_days})"
+
+
+class RebateRecords:
+    """Rebates held as one NumPy structured array (RECORD_DTYPE) and a roll number dictionary.
+
+    roll_nos is the dictionary that the student field indexes. Dates are
+    int32 epoch days, and gate passes use gate_pass.encode_gate_pass with
+    GATE_PASS_NULL and GATE_PASS_OTHER for missing and unencodable values.
+    Indexing with an int gives a RebateRecord view. Slices, masks and
+    index arrays give a RebateRecords that shares the dictionary.
+    """
+
+    def __init__(self, roll_nos=(), data=None):
+        self.roll_nos = list(roll_nos)
+        self.positions = {roll_no: i for i, roll_no in enumerate(self.roll_nos)}
+        self.data = np.empty(0, dtype=RECORD_DTYPE) if data is None else data
+
+    def _with_data(self, data):
+        records = object.__new__(RebateRecords)
+        records.roll_nos = self.roll_nos
+        records.positions = self.positions
+        records.data = data
+        return records
+
+    @classmethod
+    def from_rows(cls, rows, roll_nos=None):
+        """Build from (roll_no, start_date, end_date, rebate_days[, gate_pass_no]) rows.
+
+        With roll_nos the dictionary is fixed and rows of other students are
+        dropped; otherwise it grows in the order students are first seen.
+        """
+        records = cls(roll_nos or ())
+        records.append_rows(rows, grow=roll_nos is None)
+        return records
+
+    @classmethod
+    def fetch(cls, cursor, roll_nos=None, where=None, params=(), fetch_size=50000):
+        """Load rebates with one query, streamed into the array fetch_size rows at a time"""
+        records = cls(roll_nos or ())
+        gate_pass = "gate_pass_no" if column_exists(cursor, "rebates", "gate_pass_no") else "NULL"
+        query = f"SELECT roll_no, start_date, end_date, rebate_days, {gate_pass} FROM rebates"
+        if where:
+            query += f" WHERE {where}"
+        cursor.execute(query, params)
+        chunks = [records.data]
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            chunks.append(records._encode(rows, grow=roll_nos is None))
+        records.data = np.concatenate(chunks)
+        return records
+
+    @classmethod
+    def from_entries(cls, entries, roll_nos):
+        """Wrap the student/start_day/end_day/rebate_days arrays of batched_generation"""
+        data = np.empty(len(entries['student']), dtype=RECORD_DTYPE)
+        for field in ("student", "start_day", "end_day", "rebate_days"):
+            data[field] = entries[field]
+        data['gate_pass'] = GATE_PASS_NULL
+        return cls(roll_nos, data)
+
+    def _encode(self, rows, grow):
+        rows = list(rows)
+        if grow:
+            for row in rows:
+                if row[0] not in self.positions:
+                    self.positions[row[0]] = len(self.roll_nos)
+                    self.roll_nos.append(row[0])
+        else:
+            rows = [row for row in rows if row[0] in self.positions]
+
+        chunk = np.empty(len(rows), dtype=RECORD_DTYPE)
+        chunk['student'] = [self.positions[row[0]] for row in rows]
+        chunk['start_day'] = [to_epoch_day(row[1]) for row in rows]
+        chunk['end_day'] = [to_epoch_day(row[2]) for row in rows]
+        chunk['rebate_days'] = [row[3] for row in rows]
+        chunk['gate_pass'] = [_encode_gate_pass(row[4]) if len(row) > 4 else GATE_PASS_NULL for row in rows]
+        return chunk
+
+    def append_rows(self, rows, grow=True):
+        self.data = np.concatenate([self.data, self._encode(rows, grow)])
+        return self
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            index = int(key)
+            if index < 0:
+                index += len(self.data)
+            if not 0 <= index < len(self.data):
+                raise IndexError(f"record index {key} out of range for {len(self.data)} records")
+            return RebateRecord(self, index)
+        return self._with_data(self.data[key])
+
+    def __iter__(self):
+        return (RebateRecord(self, i) for i in range(len(self.data)))
+
+    @property
+    def student(self):
+        return self.data['student']
+
+    @property
+    def start_day(self):
+        return self.data['start_day']
+
+    @property
+    def end_day(self):
+        return self.data['end_day']
+
+    @property
+    def rebate_days(self):
+        return self.data['rebate_days']
+
+    @property
+    def gate_pass(self):
+        return self.data['gate_pass']
+
+    def periods(self):
+        """(owners, starts, ends) int64 arrays, the form batched_generation takes as existing"""
+        return (
+            self.data['student'].astype(np.int64),
+            self.data['start_day'].astype(np.int64),
+            self.data['end_day'].astype(np.int64),
+        )
+
+    def sorted(self):
+        """Copy ordered by student and start day, like ORDER BY roll_no, start_date"""
+        return self._with_data(self.data[np.lexsort((self.data['start_day'], self.data['student']))])
+
+    def starting_between(self, first_day, last_day):
+        starts = self.data['start_day']
+        return self[(starts >= first_day) & (starts <= last_day)]
+
+    def to_rows(self, chunk_size=100000):
+        """Yield (roll_no, start_date, end_date, rebate_days) tuples ready for insert"""
+        roll_nos = np.asarray(self.roll_nos, dtype=object)
+        for offset in range(0, len(self.data), chunk_size):
+            chunk = self.data[offset:offset + chunk_size]
+            yield from zip(
+                roll_nos[chunk['student']].tolist(),
+                epoch_days_to_dates(chunk['start_day']),
+                epoch_days_to_dates(chunk['end_day']),
+                chunk['rebate_days'].tolist(),
+            )
+
+    def overlap_chains(self):
+        """Chains of two or more overlapping rebates per student, like iter_overlap_chains.
+
+        The records must be ordered by student and start day (see sorted()).
+        A running maximum of end days, offset per student so it never carries
+        across students, replaces the row by row sweep.
+        """
+        if not len(self.data):
+            return []
+        students = self.data['student'].astype(np.int64)
+        offsets = students << 32
+        running_end = np.maximum.accumulate(self.data['end_day'] + offsets)
+
+        # A rebate extends the current chain if it starts before the chain has ended
+        linked = np.zeros(len(students), dtype=bool)
+        linked[1:] = (students[1:] == students[:-1]) & (self.data['start_day'][1:] + offsets[1:] <= running_end[:-1])
+        chain_ids = np.cumsum(~linked) - 1
+        members = np.flatnonzero(np.bincount(chain_ids)[chain_ids] > 1)
+
+        chains = []
+        current_chain = None
+        for chain_id, (roll_no, start_date, end_date, _) in zip(chain_ids[members].tolist(), self[members].to_rows()):
+            if chain_id != current_chain:
+                current_chain = chain_id
+                chains.append({'roll_no': roll_no, 'rebates': []})
+            chains[-1]['rebates'].append((start_date, end_date))
+        return chains
@@ -1,61 +1,158 @@
-import mysql.connector
-import time
+import argparse
 import sys
+from datetime import datetime
+import db
+import instrumentation
+from archive import FORMATS, ArchiveWriter, archive_path, restore_archive
+from backfill import run_backfill
+from bulk_loader import REBATE_COLUMNS
 
-# Connect to MySQL database
-conn = mysql.connector.connect(
-    host="127.0.0.1",
-    user="root",
-    password="20122003@Nn",
-    database="mess_rebate"
-)
-cursor = conn.cursor()
-
-start_time = time.time()
-
-# Set cutoff date to April 30, 2025
-cutoff_date = "2025-04-30"
-
-# First count how many entries will be affected
-cursor.execute(
-    "SELECT COUNT(*) FROM rebates WHERE start_date > %s",
-    [cutoff_date]
-)
-count = cursor.fetchone()[0]
-print(f"Found {count} rebate entries with start_date after April 30, 2025")
-
-if count == 0:
-    print("No entries to delete")
-    cursor.close()
-    conn.close()
-    sys.exit(0)
-
-# Confirm before deletion
-confirm = input(f"Are you sure you want to delete {count} rebate entries? (y/n): ")
-if confirm.lower() != 'y':
-    print("Operation cancelled")
-    cursor.close()
-    conn.close()
-    sys.exit(0)
-
-try:
-    # Delete entries
+def count_entries(cursor, cutoff_date):
     cursor.execute(
-        "DELETE FROM rebates WHERE start_date > %s",
+        "SELECT COUNT(*) FROM rebates WHERE start_date > %s",
         [cutoff_date]
     )
-    conn.commit()
-    print(f"Successfully deleted {cursor.rowcount} rebate entries")
-except mysql.connector.Error as err:
-    print(f"Error: {err}")
-    conn.rollback()
+    return cursor.fetchone()[0]
+
+def delete_all(conn, cursor, cutoff_date):
+    """Original behaviour: one DELETE for every entry after the cutoff"""
+    try:
+        cursor.execute(
+            "DELETE FROM rebates WHERE start_date > %s",
+            [cutoff_date]
+        )
+        conn.commit()
+        print(f"Successfully deleted {cursor.rowcount} rebate entries")
+    except db.Error as err:
+        print(f"Error: {err}")
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        sys.exit(1)
+
+def purge_in_chunks(cutoff_date, chunk_size, pause, archive_file, checkpoint_file=None, restart=False):
+    """Delete entries after the cutoff in primary key order, one short transaction per chunk.
+
+    Each chunk is written and flushed to the archive before it is deleted, so
+    an archive always covers everything that was purged. Progress is saved
+    per cutoff, so a resumed purge never continues one for another date.
+    Returns the number of rows deleted.
+    """
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    has_gate_pass = db.column_exists(cursor, "rebates", "gate_pass_no")
     cursor.close()
     conn.close()
-    sys.exit(1)
 
-# Close connection
-cursor.close()
-conn.close()
+    columns = REBATE_COLUMNS + (("gate_pass_no",) if has_gate_pass else ())
+    writer = ArchiveWriter(archive_file, columns) if archive_file else None
+    deleted = 0
+
+    def delete_chunk(chunk_conn, rows):
+        nonlocal deleted
+        if writer is not None:
+            writer.write_rows(rows)
+        chunk_cursor = chunk_conn.cursor()
+        chunk_cursor.executemany(
+            "DELETE FROM rebates WHERE roll_no = %s AND start_date = %s",
+            [(row[0], row[1]) for row in rows]
+        )
+        deleted += chunk_cursor.rowcount
+        chunk_cursor.close()
+
+    try:
+        run_backfill(
+            f"purge_rebates_after_{cutoff_date}",
+            delete_chunk,
+            where="start_date > %s",
+            params=(cutoff_date,),
+            columns=columns[2:],
+            chunk_size=chunk_size,
+            sleep_seconds=pause,
+            checkpoint_file=checkpoint_file,
+            restart=restart
+        )
+    finally:
+        if writer is not None:
+            writer.close()
+            print(f"Archived {writer.rows} rebate entries to {archive_file}")
+    return deleted
+
+def restore(path):
+    conn = db.get_db_connection()
+    try:
+        report = restore_archive(conn, "rebates", path)
+    finally:
+        conn.close()
+    print(f"Restored {report['inserted']} rebate entries from {path} ({report['duplicates']} already present)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove rebate entries that start after a cutoff date")
+    parser.add_argument("--cutoff", default="2025-04-30", help="Delete entries starting after this date")
+    parser.add_argument("--chunk-size", type=int,
+                        help="Purge in primary key ordered chunks of this many rows instead of one DELETE")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to pause between chunks")
+    parser.add_argument("--archive", help="Archive for purged rows (a .csv.gz file or a .parquet directory)")
+    parser.add_argument("--archive-format", choices=FORMATS, default="csv",
+                        help="Format of the default archive file")
+    parser.add_argument("--no-archive", action="store_true", help="Purge chunks without archiving them")
+    parser.add_argument("--restart", action="store_true", help="Ignore progress saved by an interrupted purge")
+    parser.add_argument("--yes", action="store_true", help="Skip the confirmation prompt")
+    parser.add_argument("--restore", metavar="ARCHIVE", help="Re-insert the rows from an archive and exit")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("remove_future_entries", args) as run:
+        if args.restore:
+            with run.phase("restore"):
+                restore(args.restore)
+            return
+
+        # Connect to the database configured in .env
+        conn = db.get_db_connection()
+        cursor = conn.cursor()
+
+        # First count how many entries will be affected
+        count = count_entries(cursor, args.cutoff)
+        print(f"Found {count} rebate entries with start_date after {args.cutoff}")
+
+        if count == 0:
+            print("No entries to delete")
+            cursor.close()
+            conn.close()
+            sys.exit(0)
+
+        # Confirm before deletion
+        if not args.yes:
+            confirm = input(f"Are you sure you want to delete {count} rebate entries? (y/n): ")
+            if confirm.lower() != 'y':
+                print("Operation cancelled")
+                cursor.close()
+                conn.close()
+                sys.exit(0)
+
+        if args.chunk_size is None:
+            with run.phase("delete") as phase:
+                delete_all(conn, cursor, args.cutoff)
+                phase.rows = count
+            cursor.close()
+            conn.close()
+        else:
+            cursor.close()
+            conn.close()
+            archive_file = None
+            if not args.no_archive:
+                stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                archive_file = args.archive or archive_path(f"rebates_after_{args.cutoff}_{stamp}", args.archive_format)
+            with run.phase("purge") as phase:
+                try:
+                    phase.rows = purge_in_chunks(
+                        args.cutoff, args.chunk_size, args.pause, archive_file, restart=args.restart
+                    )
+                except db.Error as err:
+                    print(f"Error: {err}")
+                    sys.exit(1)
+            print(f"Successfully deleted {phase.rows} rebate entries")
 
-total_time = time.time() - start_time
-print(f"Script completed in {total_time:.2f} seconds") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
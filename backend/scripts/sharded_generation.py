@@ -0,0 +1,101 @@
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batched_generation import generate_batched_entries, iter_entry_rows
+
+SHARD_MODES = ("hash", "batch")
+
+# Fixed so a seed maps to the same shards, and so the same data, for any worker count
+DEFAULT_SHARD_COUNT = 16
+
+
+def shard_students(roll_nos, batches, shard_by="hash", shard_count=DEFAULT_SHARD_COUNT):
+    """Split students into shards and return a list of position arrays.
+
+    "hash" assigns students by crc32 of the roll number, "batch" makes one
+    shard per batch in ascending order. Positions keep the input order
+    within each shard.
+    """
+    if shard_by not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode: {shard_by}")
+    if shard_by == "batch":
+        keys = np.asarray(batches)
+        return [np.flatnonzero(keys == batch) for batch in np.unique(keys)]
+    keys = np.array([zlib.crc32(str(roll_no).encode()) % shard_count for roll_no in roll_nos])
+    return [np.flatnonzero(keys == shard) for shard in range(shard_count)]
+
+
+def _generate_shard(task):
+    """Worker: generate one shard's entries from its own child seed"""
+    seed, targets, window_starts, window_ends, max_duration, existing = task
+    rng = np.random.default_rng(seed)
+    return generate_batched_entries(
+        targets, window_starts, window_ends, max_duration, rng=rng, existing=existing
+    )
+
+
+def _shard_existing(existing, positions, student_count):
+    """Re-index (owners, starts, ends) existing periods to a shard's local positions"""
+    if existing is None:
+        return None
+    owners, starts, ends = existing
+    local = np.full(student_count, -1, dtype=np.int64)
+    local[positions] = np.arange(len(positions))
+    mask = local[owners] >= 0
+    return local[owners[mask]], starts[mask], ends[mask]
+
+
+def generate_sharded_entries(roll_nos, batches, targets, window_starts, window_ends, max_duration,
+                             seed=None, shard_by="hash", shard_count=DEFAULT_SHARD_COUNT,
+                             workers=None, existing=None):
+    """Generate entries shard by shard across a process pool.
+
+    Each shard gets a child of SeedSequence(seed) by shard number, so a given
+    seed and shard layout always produce the same rows whatever the number
+    of workers. targets is either a per-student array or a callable
+    (count, rng=...). A callable is drawn once for all students, from one
+    more child of the seed, and then split across the shards, so
+    distributions normalized over the whole draw (like pareto_frequencies,
+    scaled by its maximum) come out the same as without sharding.
+
+    Returns (shards, seed_entropy): shards is a list of (roll_nos, entries)
+    in shard order, and seed_entropy reproduces a run made without a seed.
+    """
+    roll_nos = np.asarray(roll_nos, dtype=object)
+    window_starts = np.asarray(window_starts, dtype=np.int64)
+    window_ends = np.asarray(window_ends, dtype=np.int64)
+    shards = [positions for positions in shard_students(roll_nos, batches, shard_by, shard_count) if len(positions)]
+
+    seed_sequence = np.random.SeedSequence(seed)
+    children = seed_sequence.spawn(len(shards))
+    if callable(targets):
+        targets = targets(len(roll_nos), rng=np.random.default_rng(seed_sequence.spawn(1)[0]))
+    targets = np.asarray(targets)
+    tasks = [
+        (
+            child,
+            targets[positions],
+            window_starts[positions],
+            window_ends[positions],
+            max_duration,
+            _shard_existing(existing, positions, len(roll_nos))
+        )
+        for child, positions in zip(children, shards)
+    ]
+
+    if workers == 1:
+        results = [_generate_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map() keeps shard order, so the merged output is deterministic too
+            results = list(executor.map(_generate_shard, tasks))
+
+    return [(roll_nos[positions], entries) for positions, entries in zip(shards, results)], seed_sequence.entropy
+
+
+def iter_sharded_rows(shards):
+    """Chain every shard's insert-ready rows in shard order for the bulk loader"""
+    for roll_nos, entries in shards:
+        yield from iter_entry_rows(entries, roll_nos)
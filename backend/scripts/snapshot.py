@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+
+import db
+import instrumentation
+from date_utils import epoch_days_to_dates
+from rebate_records import GATE_PASS_OTHER, RECORD_DTYPE, RebateRecords
+
+SNAPSHOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "snapshot"))
+
+MANIFEST = "manifest.json"
+# Names the complete version readers open; replaced in one rename
+POINTER = "CURRENT"
+VERSION_PATTERN = re.compile(r"v\d{8}_\d{6}_\d{6}")
+
+STUDENT_COLUMNS = ("roll_no", "name", "branch", "branch_names", "batch")
+REBATE_COLUMNS = RECORD_DTYPE.names
+
+
+def _write_column(directory, table, column, values):
+    np.save(os.path.join(directory, f"{table}.{column}.npy"), values, allow_pickle=False)
+
+
+def _current_version(directory):
+    try:
+        with open(os.path.join(directory, POINTER), encoding="utf-8") as handle:
+            return handle.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _publish(directory, version):
+    """Point readers at a complete version with one atomic rename"""
+    pointer = os.path.join(directory, POINTER)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as handle:
+        handle.write(version)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(pointer + ".tmp", pointer)
+
+
+def export_snapshot(conn, directory=SNAPSHOT_DIR, fetch_size=50000):
+    """Dump students and rebates to one .npy file per column.
+
+    roll_no is the dictionary for both tables: students are stored in roll
+    number order and rebates refer to them by position (int32), ordered by
+    student and start date. Branches are dictionary encoded (int16 codes
+    into branch_names). Rebates are one rebates.npy array of
+    rebate_records.RECORD_DTYPE, so they map straight into a RebateRecords.
+    Each export goes to a new version directory and is published by
+    rewriting the CURRENT pointer, so readers always open one complete,
+    consistent version. The previous version is kept for readers still
+    using it. Returns the manifest.
+    """
+    started = time.perf_counter()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT roll_no, name, branch, batch FROM students")
+    # Sorted here rather than by the server so the order never depends on its collation
+    students = sorted(cursor.fetchall(), key=lambda row: str(row[0]))
+    roll_nos = np.array([str(row[0]) for row in students])
+    branch_names, branch_codes = np.unique(np.array([str(row[2]) for row in students]), return_inverse=True)
+
+    cursor.execute("SELECT COUNT(*) FROM rebates")
+    total_rebates = cursor.fetchone()[0]
+    # The foreign key rules out unknown students on MySQL; SQLite copies may not enforce it
+    records = RebateRecords.fetch(cursor, roll_nos=roll_nos.tolist(), fetch_size=fetch_size).sorted()
+    cursor.close()
+
+    version = "v" + datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    staging = os.path.join(directory, version)
+    os.makedirs(staging)
+
+    _write_column(staging, "students", "roll_no", roll_nos)
+    _write_column(staging, "students", "name", np.array([str(row[1]) for row in students]))
+    _write_column(staging, "students", "branch", branch_codes.astype(np.int16))
+    _write_column(staging, "students", "branch_names", branch_names)
+    _write_column(staging, "students", "batch", np.array([row[3] for row in students], dtype=np.int16))
+    np.save(os.path.join(staging, "rebates.npy"), records.data, allow_pickle=False)
+
+    manifest = {
+        'created_at': datetime.now().isoformat(timespec="seconds"),
+        'backend': db.BACKEND,
+        'students': len(roll_nos),
+        'rebates': len(records),
+        'branches': len(branch_names),
+        'orphan_rebates': total_rebates - len(records),
+        'unencoded_gate_passes': int((records.gate_pass == GATE_PASS_OTHER).sum()),
+    }
+    with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2)
+
+    previous = _current_version(directory)
+    _publish(directory, version)
+    # Older versions, and any left half written by a failed export, have no readers
+    for name in os.listdir(directory):
+        # Only names export_snapshot generates: --output may be a directory holding other things
+        if VERSION_PATTERN.fullmatch(name) and name not in (version, previous):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    manifest['seconds'] = time.perf_counter() - started
+    return manifest
+
+
+class Snapshot:
+    """Read-only view of an exported snapshot.
+
+    Columns are memory-mapped by default, so opening a snapshot only reads
+    the manifest and .npy headers; pages are loaded as they are touched.
+    The version CURRENT names is resolved once, so a snapshot published
+    while this one is open does not mix in.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, mmap=True):
+        version = _current_version(directory)
+        if version is not None:
+            directory = os.path.join(directory, version)
+        manifest_path = os.path.join(directory, MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No snapshot in {directory} (run snapshot.py first)")
+        with open(manifest_path, encoding="utf-8") as handle:
+            self.manifest = json.load(handle)
+        self.directory = directory
+        mmap_mode = "r" if mmap else None
+
+        def load(table, column):
+            return np.load(os.path.join(directory, f"{table}.{column}.npy"), mmap_mode=mmap_mode)
+
+        self.students = {column: load("students", column) for column in STUDENT_COLUMNS}
+        self._rebates = np.load(os.path.join(directory, "rebates.npy"), mmap_mode=mmap_mode)
+        # Field views into the one mapped array
+        self.rebates = {column: self._rebates[column] for column in REBATE_COLUMNS}
+
+    @property
+    def created_at(self):
+        return self.manifest['created_at']
+
+    def batch_students(self, batch):
+        """Student positions of a batch ordered by branch and roll number"""
+        positions = np.flatnonzero(self.students['batch'] == batch)
+        # Both dictionaries are sorted, so codes order like the strings they encode
+        return positions[np.lexsort((positions, self.students['branch'][positions]))]
+
+    def rebates_starting_between(self, first_day, last_day):
+        """Indices of rebates whose start_date falls in [first_day, last_day]"""
+        starts = self.rebates['start_day']
+        return np.flatnonzero((starts >= first_day) & (starts <= last_day))
+
+    def records(self):
+        """RebateRecords over the mapped rebates, ordered by student and start day, without copying"""
+        return RebateRecords(self.students['roll_no'].tolist(), self._rebates)
+
+    def rebate_rows(self, indices=None):
+        """(roll_no, start_date, end_date) tuples, like a rebates cursor"""
+        if indices is None:
+            indices = slice(None)
+        roll_nos = self.students['roll_no'][self.rebates['student'][indices]].tolist()
+        starts = epoch_days_to_dates(self.rebates['start_day'][indices])
+        ends = epoch_days_to_dates(self.rebates['end_day'][indices])
+        return list(zip(roll_nos, starts, ends))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export students and rebates to a memory-mappable columnar snapshot")
+    parser.add_argument("--output", default=SNAPSHOT_DIR, help="Snapshot directory")
+    parser.add_argument("--fetch-size", type=int, default=50000, help="Rebate rows fetched per round trip")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("snapshot", args) as run:
+        conn = db.get_db_connection()
+        try:
+            with run.phase("export") as phase:
+                manifest = export_snapshot(conn, args.output, args.fetch_size)
+                phase.rows = manifest['students'] + manifest['rebates']
+        finally:
+            conn.close()
+
+        print(f"Wrote {manifest['students']} students and {manifest['rebates']} rebates "
+              f"to {args.output} in {manifest['seconds']:.2f} seconds")
+        if manifest['orphan_rebates']:
+            print(f"Skipped {manifest['orphan_rebates']} rebates of unknown students")
+        if manifest['unencoded_gate_passes']:
+            print(f"{manifest['unencoded_gate_passes']} gate pass numbers are not in the X-0000 format "
+                  f"and are stored as {GATE_PASS_OTHER}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import time
+from collections import defaultdict
+from datetime import date
+import instrumentation
+from db import get_db_connection
+from change_tracking import STATS_CHANGE_LOG, ensure_stats_change_log
+
+SUMMARY_TABLE = "rebate_stats_monthly"
+
+# Groups by the month a rebate starts in, like the dashboard's monthly trends
+AGGREGATE_SELECT = """
+SELECT YEAR(r.start_date), MONTH(r.start_date), s.branch, s.batch,
+       COUNT(*), SUM(r.rebate_days), COUNT(DISTINCT r.roll_no)
+FROM rebates r
+JOIN students s ON r.roll_no = s.roll_no
+"""
+AGGREGATE_GROUP_BY = " GROUP BY YEAR(r.start_date), MONTH(r.start_date), s.branch, s.batch"
+
+INSERT_SUMMARY = f"""
+INSERT INTO {SUMMARY_TABLE} (year, month, branch, batch, rebate_count, total_days, distinct_students)
+"""
+
+def ensure_summary_table(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+        year INT NOT NULL,
+        month INT NOT NULL,
+        branch VARCHAR(50) NOT NULL,
+        batch INT NOT NULL,
+        rebate_count INT NOT NULL,
+        total_days INT NOT NULL,
+        distinct_students INT NOT NULL,
+        PRIMARY KEY (year, month, branch, batch)
+    )
+    """)
+    conn.commit()
+    cursor.close()
+
+def _change_ids(cursor):
+    cursor.execute(f"SELECT id FROM {STATS_CHANGE_LOG}")
+    return [change_id for (change_id,) in cursor.fetchall()]
+
+def _delete_changes(cursor, ids, batch_size=1000):
+    # By id, not up to a maximum: an entry can commit after higher ids were read
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
+        cursor.execute(f"DELETE FROM {STATS_CHANGE_LOG} WHERE id IN ({', '.join(['%s'] * len(batch))})", batch)
+
+def rebuild(conn):
+    """Recompute every group from scratch in one INSERT ... SELECT"""
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        # Changes visible now are covered by the rebuild; later ones stay for the next refresh
+        ids = _change_ids(cursor)
+        cursor.execute(f"DELETE FROM {SUMMARY_TABLE}")
+        cursor.execute(INSERT_SUMMARY + AGGREGATE_SELECT + AGGREGATE_GROUP_BY)
+        groups = cursor.rowcount
+        _delete_changes(cursor, ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return {'groups': groups, 'seconds': time.perf_counter() - started}
+
+def refresh(conn):
+    """Recompute only the groups recorded in the change log since the last run.
+
+    Affected groups are recomputed a month at a time with a start_date range,
+    replacing their summary rows, and the processed log entries are removed
+    in the same transaction. Only the entries read here are removed, so one
+    that commits while the refresh runs is applied next time.
+    """
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT id, year, month, branch, batch FROM {STATS_CHANGE_LOG}")
+        entries = cursor.fetchall()
+        if not entries:
+            return {'changes': 0, 'groups': 0, 'months': 0, 'seconds': time.perf_counter() - started}
+
+        groups_by_month = defaultdict(set)
+        for _, year, month, branch, batch in entries:
+            if year is not None and branch is not None:
+                groups_by_month[(year, month)].add((branch, batch))
+
+        for (year, month), groups in groups_by_month.items():
+            groups = list(groups)
+            cursor.executemany(
+                f"DELETE FROM {SUMMARY_TABLE} WHERE year = %s AND month = %s AND branch = %s AND batch = %s",
+                [(year, month, branch, batch) for branch, batch in groups]
+            )
+            month_start = date(year, month, 1)
+            next_month = date(year + month // 12, month % 12 + 1, 1)
+            group_filter = " OR ".join(["(s.branch = %s AND s.batch = %s)"] * len(groups))
+            cursor.execute(
+                INSERT_SUMMARY + AGGREGATE_SELECT
+                + f" WHERE r.start_date >= %s AND r.start_date < %s AND ({group_filter})"
+                + AGGREGATE_GROUP_BY,
+                [month_start, next_month] + [value for group in groups for value in group]
+            )
+
+        _delete_changes(cursor, [entry[0] for entry in entries])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return {
+        'changes': len(entries),
+        'groups': sum(len(groups) for groups in groups_by_month.values()),
+        'months': len(groups_by_month),
+        'seconds': time.perf_counter() - started
+    }
+
+def refresh_loop(conn, run, interval):
+    try:
+        while True:
+            with run.phase("refresh") as phase:
+                stats = refresh(conn)
+                phase.rows = stats['changes']
+            if stats['changes']:
+                print(f"Applied {stats['changes']} changes: recomputed {stats['groups']} groups "
+                      f"across {stats['months']} months in {stats['seconds']:.2f} seconds")
+            elif interval is None:
+                print("Summary table is up to date")
+            if interval is None:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the monthly rebate statistics summary table")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every group instead of only changed ones")
+    parser.add_argument("--interval", type=float,
+                        help="Keep running, refreshing every this many seconds")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("stats_aggregates", args) as run:
+        conn = get_db_connection()
+        ensure_summary_table(conn)
+        if ensure_stats_change_log(conn) or args.rebuild:
+            # New triggers only see future writes, so start from a full rebuild
+            with run.phase("rebuild") as phase:
+                stats = rebuild(conn)
+                phase.rows = stats['groups']
+            print(f"Rebuilt {SUMMARY_TABLE}: {stats['groups']} groups in {stats['seconds']:.2f} seconds")
+
+        refresh_loop(conn, run, args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import queue
+import threading
+
+from bulk_loader import bulk_insert, iter_chunks
+from db import get_db_connection
+
+# Marks the end of the rows handed to the writer thread
+_DONE = object()
+
+
+def counted(rows, counts, key="rows"):
+    """Pass rows through unchanged, counting them into counts[key]"""
+    counts.setdefault(key, 0)
+    for row in rows:
+        counts[key] += 1
+        yield row
+
+
+def background_insert(rows, table, columns, chunk_size=1000, max_pending=2, **options):
+    """Insert rows with bulk_insert on a writer thread while the caller keeps producing them.
+
+    rows is pulled in chunks on the calling thread, so a generator pipeline
+    keeps running while earlier chunks are written. At most max_pending
+    chunks wait for the writer; when it falls behind the producer blocks,
+    which keeps memory at a few chunks however many rows there are. The
+    writer uses its own connection and bulk_insert options (mode, method,
+    commit_per_chunk, ...). Returns the bulk_insert summary and re-raises
+    an error from the writer.
+    """
+    handoff = queue.Queue(maxsize=max_pending)
+    result = {}
+    drained = threading.Event()
+
+    def drain():
+        while True:
+            chunk = handoff.get()
+            if chunk is _DONE:
+                drained.set()
+                return
+            yield from chunk
+
+    def write():
+        try:
+            conn = get_db_connection()
+            try:
+                result['summary'] = bulk_insert(conn, table, columns, drain(), chunk_size=chunk_size, **options)
+            finally:
+                conn.close()
+        except BaseException as err:
+            result['error'] = err
+            # Keep taking chunks so the producer is never left blocked on a full queue,
+            # unless the failure came after the last chunk (e.g. the final commit)
+            while not drained.is_set() and handoff.get() is not _DONE:
+                pass
+
+    writer = threading.Thread(target=write, name=f"{table}-writer", daemon=True)
+    writer.start()
+    try:
+        for chunk in iter_chunks(rows, chunk_size):
+            if 'error' in result:
+                break
+            handoff.put(chunk)
+    finally:
+        handoff.put(_DONE)
+        writer.join()
+
+    if 'error' in result:
+        raise result['error']
+    return result['summary']
@@ -1,109 +1,332 @@
-import pandas as pd
-import mysql.connector
+import argparse
+import glob
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env
-load_dotenv()
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import instrumentation
+from db import get_db_connection
+from bulk_loader import STUDENT_COLUMNS, bulk_insert
 
 # Path to the CSV file
-excel_path = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "Processed_2nd_Year_2023_Batch.csv"))
-print(f"Looking for file at: {excel_path}")
-
-# Load the CSV
-df = pd.read_csv(excel_path)
-
-# Replace real NaN and string "nan"/"NaN" with None
-df = df.where(pd.notna(df), None)
-for col in df.columns:
-    df[col] = df[col].apply(lambda x: None if str(x).strip().lower() == "nan" else x)
-
-# Connect to DB
-conn = mysql.connector.connect(
-    host=os.getenv("DB_HOST"),
-    port=3306,
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASS"),
-    database=os.getenv("DB_NAME")
-)
-cursor = conn.cursor()
-
-# Initial student count
-cursor.execute("SELECT COUNT(*) FROM students")
-initial_count = cursor.fetchone()[0]
-print(f"Initial student count: {initial_count}")
-
-# Get existing roll numbers
-cursor.execute("SELECT roll_no FROM students")
-existing_roll_nos = {row[0] for row in cursor.fetchall()}
-
-# Track results
-skipped_students = []
-added_students = []
-failed_inserts = []
-
-for _, row in df.iterrows():
-    roll_no = row["Roll No"]
-    name = row["Name"]
-    mobile = row["Phone Number"]
-    email = row["Email"]
-    branch = row["Branch"]
-    batch = row["Batch"]
-
-    # Validate required fields
-    if not roll_no or not name:
-        failed_inserts.append((roll_no, "Missing roll_no or name"))
-        continue
-
-    # Skip already present
-    if roll_no in existing_roll_nos:
-        skipped_students.append(roll_no)
-        continue
-
-    sql = """
-    INSERT IGNORE INTO students (roll_no, name, mobile_no, email, branch, batch)
-    VALUES (%s, %s, %s, %s, %s, %s)
+DEFAULT_CSV_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "Processed_2nd_Year_2023_Batch.csv"))
+
+# CSV header -> students column
+CSV_COLUMNS = {
+    "Roll No": "roll_no",
+    "Name": "name",
+    "Phone Number": "mobile_no",
+    "Email": "email",
+    "Branch": "branch",
+    "Batch": "batch"
+}
+
+# Read identifiers as text so roll numbers and phone numbers keep leading zeros
+CSV_DTYPES = {"Roll No": str, "Phone Number": str, "Email": str}
+
+def read_roster(path, **kwargs):
+    return pd.read_csv(path, usecols=list(CSV_COLUMNS), dtype=CSV_DTYPES, **kwargs)
+
+def clean_roster(df):
+    """Rename columns and replace real NaN and "nan"/"NaN" strings with None"""
+    df = df[list(CSV_COLUMNS)].rename(columns=CSV_COLUMNS).astype(object)
+    nan_strings = df.apply(lambda column: column.astype(str).str.strip().str.lower().eq("nan"))
+    return df.mask(df.isna() | nan_strings, None)
+
+def _key(column):
+    # MySQL's default collation compares roll numbers and emails case-insensitively
+    return column.astype(str).str.strip().str.lower()
+
+def load_existing_keys(cursor):
+    """Load existing roll numbers and emails once as lower-cased hash sets"""
+    cursor.execute("SELECT roll_no, email FROM students")
+    roll_nos, emails = set(), set()
+    for roll_no, email in cursor.fetchall():
+        roll_nos.add(str(roll_no).strip().lower())
+        if email:
+            emails.add(str(email).strip().lower())
+    return roll_nos, emails
+
+def split_roster(df, existing_roll_nos, existing_emails):
+    """Validate a cleaned roster with column operations.
+
+    Returns (rows, skipped, failed): insert-ready tuples for students that
+    pass every check, roll numbers already in the database, and
+    (roll_no, reason) pairs for rows that cannot be inserted.
+    """
+    roll_keys = _key(df["roll_no"])
+    email_keys = _key(df["email"])
+    has_email = df["email"].notna()
+
+    missing = df["roll_no"].isna() | df["name"].isna() | roll_keys.eq("") | _key(df["name"]).eq("")
+    existing = ~missing & roll_keys.isin(existing_roll_nos)
+    remaining = ~missing & ~existing
+
+    email_taken = remaining & has_email & email_keys.isin(existing_emails)
+    remaining &= ~email_taken
+    duplicate_roll = remaining & roll_keys.where(remaining).duplicated()
+    remaining &= ~duplicate_roll
+    duplicate_email = remaining & has_email & email_keys.where(remaining & has_email).duplicated()
+    remaining &= ~duplicate_email
+
+    failed = []
+    for mask, reason in (
+        (missing, "Missing roll_no or name"),
+        (email_taken, "Email already registered to another student"),
+        (duplicate_roll, "Duplicate roll_no in file"),
+        (duplicate_email, "Duplicate email in file")
+    ):
+        failed.extend((roll_no, reason) for roll_no in df.loc[mask, "roll_no"])
+
+    rows = list(df.loc[remaining, list(STUDENT_COLUMNS)].itertuples(index=False, name=None))
+    skipped = df.loc[existing, "roll_no"].tolist()
+    return rows, skipped, failed
+
+def insert_students(conn, rows):
+    """Write validated rows in one bulk INSERT IGNORE and return (added, failed)"""
+    if not rows:
+        return [], []
+
+    report = bulk_insert(conn, "students", STUDENT_COLUMNS, rows, mode="ignore", commit_per_chunk=False)
+    if report['duplicates'] == 0:
+        return [row[0] for row in rows], []
+
+    # Rows were pre-checked, so skips only happen if the table changed meanwhile
+    cursor = conn.cursor()
+    added, failed = [], []
+    for i in range(0, len(rows), 1000):
+        batch = [row[0] for row in rows[i:i + 1000]]
+        cursor.execute(
+            f"SELECT roll_no, name FROM students WHERE roll_no IN ({', '.join(['%s'] * len(batch))})",
+            batch
+        )
+        stored = {roll_no: name for roll_no, name in cursor.fetchall()}
+        for row in rows[i:i + 1000]:
+            if stored.get(row[0]) == row[1]:
+                added.append(row[0])
+            else:
+                failed.append((row[0], "INSERT IGNORE skipped (duplicate or constraint)"))
+    cursor.close()
+    return added, failed
+
+def print_summary(final_count, new_students, skipped_students, added_students, failed_inserts):
+    print(f"\nData import completed successfully!")
+    print(f"Total students in database: {final_count}")
+    print(f"New students added (confirmed): {new_students}")
+    print(f"\nSkipped {len(skipped_students)} already existing students")
+    print(f"Added {len(added_students)} new students")
+    print(f"Failed inserts: {len(failed_inserts)}")
+
+    if skipped_students:
+        print("\nFirst 5 skipped students:")
+        for roll_no in skipped_students[:5]:
+            print(f"- {roll_no}")
+
+    if added_students:
+        print("\nFirst 5 added students:")
+        for roll_no in added_students[:5]:
+            print(f"- {roll_no}")
+
+    if failed_inserts:
+        print("\nFirst 5 failed inserts:")
+        for roll_no, reason in failed_inserts[:5]:
+            print(f"- {roll_no}: {reason}")
+
+def expand_paths(patterns):
+    """Resolve files, directories (all *.csv inside) and glob patterns"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, "*.csv"))))
+        else:
+            paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return list(dict.fromkeys(paths))
+
+# Existing keys shipped once to each worker process by the pool initializer
+_worker_keys = None
+
+def _init_worker(existing_roll_nos, existing_emails):
+    global _worker_keys
+    _worker_keys = (existing_roll_nos, existing_emails)
+
+def _validate_chunk(chunk):
+    return split_roster(clean_roster(chunk), *_worker_keys)
+
+def iter_validated_chunks(paths, chunksize, executor, max_pending):
+    """Read every file in chunks and validate them in the pool, in input order.
+
+    At most max_pending chunks are read ahead, so memory stays bounded by
+    the chunk size rather than the file size.
     """
-    values = (roll_no, name, mobile, email, branch, batch)
-    try:
-        cursor.execute(sql, values)
-        if cursor.rowcount > 0:  # Actually inserted
-            added_students.append(roll_no)
+    pending = deque()
+    for path in paths:
+        for chunk in read_roster(path, chunksize=chunksize):
+            pending.append((path, executor.submit(_validate_chunk, chunk)))
+            if len(pending) >= max_pending:
+                done_path, future = pending.popleft()
+                yield done_path, future.result()
+    while pending:
+        done_path, future = pending.popleft()
+        yield done_path, future.result()
+
+def import_rosters(conn, paths, chunksize=10000, workers=None, insert_chunk_size=1000):
+    """Import several roster files through a process pool and a single bulk writer.
+
+    Returns a combined report with per-file counts, totals and a few
+    sample roll numbers per outcome.
+    """
+    cursor = conn.cursor()
+    existing_roll_nos, existing_emails = load_existing_keys(cursor)
+    cursor.close()
+
+    report = {
+        'files': {path: {'added': 0, 'skipped': 0, 'failed': 0} for path in paths},
+        'samples': {'added': [], 'skipped': [], 'failed': []}
+    }
+    samples = report['samples']
+    seen_roll_nos, seen_emails = set(), set()
+
+    def sample(kind, values):
+        room = 5 - len(samples[kind])
+        if room > 0:
+            samples[kind].extend(values[:room])
+
+    def accepted_rows(executor):
+        for path, (rows, skipped, failed) in iter_validated_chunks(paths, chunksize, executor, workers * 2):
+            counts = report['files'][path]
+            counts['skipped'] += len(skipped)
+            sample('skipped', skipped)
+
+            # Duplicates across chunks and files can only be seen here
+            for row in rows:
+                roll_key = str(row[0]).strip().lower()
+                email_key = str(row[3]).strip().lower() if row[3] is not None else None
+                if roll_key in seen_roll_nos:
+                    failed.append((row[0], "Duplicate roll_no in input files"))
+                elif email_key is not None and email_key in seen_emails:
+                    failed.append((row[0], "Duplicate email in input files"))
+                else:
+                    seen_roll_nos.add(roll_key)
+                    if email_key is not None:
+                        seen_emails.add(email_key)
+                    counts['added'] += 1
+                    sample('added', [row[0]])
+                    yield row
+
+            counts['failed'] += len(failed)
+            sample('failed', failed)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(existing_roll_nos, existing_emails)
+    ) as executor:
+        load = bulk_insert(
+            conn, "students", STUDENT_COLUMNS, accepted_rows(executor),
+            chunk_size=insert_chunk_size, mode="ignore", verbose=False
+        )
+
+    report['added'] = load['inserted']
+    report['skipped'] = sum(counts['skipped'] for counts in report['files'].values())
+    report['failed'] = sum(counts['failed'] for counts in report['files'].values()) + load['duplicates']
+    report['server_skipped'] = load['duplicates']
+    report['rows_per_sec'] = load['rows_per_sec']
+    return report
+
+def print_combined_report(report, final_count, new_students):
+    print(f"\nData import completed successfully!")
+    print(f"Total students in database: {final_count}")
+    print(f"New students added (confirmed): {new_students}")
+
+    print("\nPer file:")
+    for path, counts in report['files'].items():
+        print(f"- {path}: {counts['added']} added, {counts['skipped']} skipped, {counts['failed']} failed")
+
+    print(f"\nSkipped {report['skipped']} already existing students")
+    print(f"Added {report['added']} new students ({report['rows_per_sec']:.0f} rows/sec)")
+    print(f"Failed inserts: {report['failed']}")
+    if report['server_skipped']:
+        print(f"  including {report['server_skipped']} rows skipped by INSERT IGNORE (duplicate or constraint)")
+
+    for kind, title in (('skipped', "skipped students"), ('added', "added students"), ('failed', "failed inserts")):
+        if report['samples'][kind]:
+            print(f"\nFirst 5 {title}:")
+            for value in report['samples'][kind]:
+                if kind == 'failed':
+                    print(f"- {value[0]}: {value[1]}")
+                else:
+                    print(f"- {value}")
+
+def main_multi(patterns, chunksize, workers, run):
+    paths = expand_paths(patterns)
+    print(f"Importing {len(paths)} roster files")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM students")
+    initial_count = cursor.fetchone()[0]
+    print(f"Initial student count: {initial_count}")
+
+    with run.phase("import") as phase:
+        report = import_rosters(conn, paths, chunksize, workers)
+        phase.rows = report['added']
+
+    cursor.execute("SELECT COUNT(*) FROM students")
+    final_count = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+
+    print_combined_report(report, final_count, final_count - initial_count)
+
+def main(run):
+    print(f"Looking for file at: {DEFAULT_CSV_PATH}")
+    with run.phase("read") as phase:
+        df = clean_roster(read_roster(DEFAULT_CSV_PATH))
+        phase.rows = len(df)
+
+    # Connect to DB
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Initial student count
+    cursor.execute("SELECT COUNT(*) FROM students")
+    initial_count = cursor.fetchone()[0]
+    print(f"Initial student count: {initial_count}")
+
+    with run.phase("validate") as phase:
+        existing_roll_nos, existing_emails = load_existing_keys(cursor)
+        rows, skipped_students, failed_inserts = split_roster(df, existing_roll_nos, existing_emails)
+        phase.rows = len(df)
+
+    with run.phase("insert") as phase:
+        try:
+            added_students, insert_failures = insert_students(conn, rows)
+        except Exception as e:
+            added_students, insert_failures = [], [(row[0], str(e)) for row in rows]
+        phase.rows = len(added_students)
+    failed_inserts.extend(insert_failures)
+
+    # Final count
+    cursor.execute("SELECT COUNT(*) FROM students")
+    final_count = cursor.fetchone()[0]
+
+    cursor.close()
+    conn.close()
+
+    print_summary(final_count, final_count - initial_count, skipped_students, added_students, failed_inserts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import student rosters from CSV")
+    parser.add_argument("paths", nargs="*",
+                        help="CSV files, directories or glob patterns (default: the 2023 batch file)")
+    parser.add_argument("--chunksize", type=int, default=10000, help="Rows read per chunk")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.start_run("students", args) as run:
+        if args.paths:
+            main_multi(args.paths, args.chunksize, args.workers, run)
         else:
-            failed_inserts.append((roll_no, "INSERT IGNORE skipped (duplicate or constraint)"))
-    except Exception as e:
-        failed_inserts.append((roll_no, str(e)))
-
-# Commit changes
-conn.commit()
-
-# Final count
-cursor.execute("SELECT COUNT(*) FROM students")
-final_count = cursor.fetchone()[0]
-new_students = final_count - initial_count
-
-cursor.close()
-conn.close()
-
-# ✅ Summary
-print(f"\nData import completed successfully!")
-print(f"Total students in database: {final_count}")
-print(f"New students added (confirmed): {new_students}")
-print(f"\nSkipped {len(skipped_students)} already existing students")
-print(f"Added {len(added_students)} new students")
-print(f"Failed inserts: {len(failed_inserts)}")
-
-if skipped_students:
-    print("\nFirst 5 skipped students:")
-    for roll_no in skipped_students[:5]:
-        print(f"- {roll_no}")
-
-if added_students:
-    print("\nFirst 5 added students:")
-    for roll_no in added_students[:5]:
-        print(f"- {roll_no}")
-
-if failed_inserts:
-    print("\nFirst 5 failed inserts:")
-    for roll_no, reason in failed_inserts[:5]:
-        print(f"- {roll_no}: {reason}")
+            main(run)
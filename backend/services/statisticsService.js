@@ -47,8 +47,8 @@ const getStatistics = async (filters = {}) => {
   // Calculate student rebate statistics
   const studentRebateStats = calculateStudentRebateStats(allStudents, allRebates);
   
-  // Calculate monthly trends
-  const monthlyTrends = calculateMonthlyTrends(allRebates);
+  // Calculate monthly trends, from the pre-aggregated summary when it is up to date
+  const monthlyTrends = await getMonthlyTrends(filters, allRebates);
 
   // Calculate branch and batch statistics
   const branchStats = calculateBranchStats(allRebates, studentMap, branches);
@@ -181,6 +181,46 @@ const calculateMonthlyTrends = (rebates) => {
   })).sort((a, b) => new Date(a.month) - new Date(b.month));
 };
 
+/**
+ * Monthly trends from rebate_stats_monthly, maintained by scripts/stats_aggregates.py
+ * The summary only lags the rebates table while rebate_stats_changes holds unapplied
+ * entries, so trends fall back to calculateMonthlyTrends on the live rows then, and
+ * while either table is missing or the summary is empty. Trends therefore always
+ * match the other figures in the response.
+ */
+const getMonthlyTrends = async (filters, rebates) => {
+  let aggregates;
+  try {
+    const [rows, pending] = await Promise.all([
+      RebateRepository.fetchMonthlyStatsAggregates(filters),
+      RebateRepository.hasPendingStatsChanges(filters)
+    ]);
+    aggregates = pending ? [] : rows;
+  } catch (error) {
+    if (error.code !== 'ER_NO_SUCH_TABLE') {
+      throw error;
+    }
+    aggregates = [];
+  }
+  if (aggregates.length === 0) {
+    return calculateMonthlyTrends(rebates);
+  }
+
+  // A student is in one branch and batch, so distinct students add up across groups
+  const monthlyTrends = {};
+  aggregates.forEach(row => {
+    const month = new Date(row.year, row.month - 1).toLocaleString('default', { month: 'long', year: 'numeric' });
+    if (!monthlyTrends[month]) {
+      monthlyTrends[month] = { month, totalRebates: 0, totalDays: 0, uniqueStudents: 0 };
+    }
+    monthlyTrends[month].totalRebates += Number(row.totalRebates);
+    monthlyTrends[month].totalDays += Number(row.totalDays);
+    monthlyTrends[month].uniqueStudents += Number(row.uniqueStudents);
+  });
+
+  return Object.values(monthlyTrends).sort((a, b) => new Date(a.month) - new Date(b.month));
+};
+
 /**
  * Calculate statistics by branch
  */